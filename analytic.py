@@ -0,0 +1,125 @@
+from schedule_cache import load_schedule
+from simulation import DEFAULT_POLICY
+
+ACTION_DEPARTED, ACTION_DELAYED, ACTION_CANCELLED = 0, 1, 2
+ACTIONS = ("DEPARTED", "DELAYED", "CANCELLED")
+
+
+def outcomes(time, passengers, capacity, policy=DEFAULT_POLICY):
+    """
+    Computes every event of every bus without a heap.
+
+    Parameters:
+    time (array): Scheduled times in absolute minutes.
+    passengers (array): Passengers on each bus.
+    capacity (array): Capacity of each bus.
+    policy (simulation.Policy): Operating policy, as for simulation().
+
+    Returns:
+    dict: Per-event arrays in processing order: ``row`` (index of the bus in
+          the schedule), ``action`` (ACTION_DEPARTED, ACTION_DELAYED or
+          ACTION_CANCELLED, indexes into ACTIONS),
+          ``time`` (absolute minutes shown in the record: the new time for
+          a delay),
+          ``passengers`` (load when the event happened) and ``capacity``.
+    """
+    import numpy as np
+
+    time = np.asarray(time, dtype=np.int64)
+    capacity = np.asarray(capacity, dtype=np.int64)
+    n = len(time)
+    steps = policy.max_delays + 1
+
+    # Passenger load at each step: p[k + 1] = p[k] + ceil(growth * p[k])
+    load = np.empty((n, steps), dtype=np.int64)
+    load[:, 0] = passengers
+    for k in range(1, steps):
+        load[:, k] = load[:, k - 1] + np.ceil(policy.growth * load[:, k - 1]).astype(np.int64)
+    low = load < policy.threshold * capacity[:, None]
+
+    # Step k happens if every earlier step was a delay
+    happens = np.ones((n, steps), dtype=bool)
+    for k in range(1, steps):
+        happens[:, k] = happens[:, k - 1] & low[:, k - 1]
+    action = np.where(low, ACTION_DELAYED, ACTION_DEPARTED)
+    action[:, -1] = np.where(low[:, -1], ACTION_CANCELLED, ACTION_DEPARTED)
+
+    # Absolute event times; a delay shows the time it moves the bus to
+    k = np.arange(steps)
+    minutes = time[:, None] + policy.delay_minutes * k
+    shown = minutes.copy()
+    shown[:, :-1] = np.where(action[:, :-1] == ACTION_DELAYED, minutes[:, 1:], minutes[:, :-1])
+
+    # Heap order is event time, ties falling back to schedule order
+    mask = happens.ravel()
+    order = np.argsort(minutes.ravel()[mask], kind="stable")
+    rows = np.repeat(np.arange(n), steps)[mask][order]
+    return {
+        "row": rows,
+        "action": action.ravel()[mask][order],
+        "time": shown.ravel()[mask][order],
+        "passengers": load.ravel()[mask][order],
+        "capacity": capacity[rows],
+    }
+
+
+def to_records(events, bus_number, locations):
+    """
+    Converts analytic events into the structured records of simulation().
+
+    Parameters:
+    events (dict): Output of outcomes().
+    bus_number (sequence): Bus number of each schedule row.
+    locations (sequence): City code of each schedule row.
+
+    Returns:
+    list of tuples: (action, bus_number, location, time, passengers, capacity)
+    """
+    return [(ACTIONS[action], bus_number[row], locations[row], time, passengers, capacity)
+            for row, action, time, passengers, capacity in zip(
+                events["row"].tolist(), events["action"].tolist(), events["time"].tolist(),
+                events["passengers"].tolist(), events["capacity"].tolist())]
+
+
+def analytic_simulation(filename, policy=DEFAULT_POLICY):
+    """
+    Runs the closed-form engine over a schedule file.
+
+    A bus's fate depends only on its own passengers and capacity, so every
+    outcome is computed at once with array operations and the heap is
+    replaced by one stable sort on event time. Delays are counted per trip
+    (schedule row), as in simulation(), so bus numbers need not be unique.
+
+    Parameters:
+    filename (str): Path to the file containing bus schedule data.
+    policy (simulation.Policy): Operating policy, as for simulation().
+
+    Returns:
+    list of tuples: The same records simulation() returns, in the same order.
+    """
+    schedule = load_schedule(filename)
+    events = outcomes(schedule.time, schedule.passengers, schedule.capacity, policy)
+    names = schedule.locations
+    locations = [names[location] for location in schedule.location]
+    return to_records(events, list(schedule.bus_number), locations)
+
+
+def verify_against_heap(filename, policy=DEFAULT_POLICY):
+    """
+    Checks the analytic engine against simulation() record for record.
+
+    Returns:
+    None
+
+    Raises:
+    AssertionError: Naming the first record where the engines disagree.
+    """
+    from simulation import SILENT, simulation
+
+    expected = simulation(filename, SILENT, policy=policy)
+    actual = analytic_simulation(filename, policy)
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        if want != got:
+            raise AssertionError(f"record {i}: heap engine {want!r}, analytic engine {got!r}")
+    if len(expected) != len(actual):
+        raise AssertionError(f"heap engine produced {len(expected)} records, analytic engine {len(actual)}")
@@ -0,0 +1,293 @@
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time as clock
+import tracemalloc
+
+from synth import generate_schedule
+
+SIZES = (1000, 10000, 100000, 1000000, 10000000)
+
+# Largest size each phase is run at; the pure-Python loops are skipped beyond
+PHASE_LIMITS = {
+    "read": 10000000,
+    "read_columns": 10000000,
+    "compile": 10000000,
+    "load": 10000000,
+    "build": 10000000,
+    "heap_list": 1000000,
+    "heap_indexed": 1000000,
+    "simulate": 1000000,
+    "simulate_calendar": 1000000,
+    "analytic": 10000000,
+    "draw_heap": 1000000,
+}
+
+# A phase counts as regressed when it is this much slower than its baseline
+# and also at least NOISE_FLOOR seconds slower, so timer jitter on the
+# fastest phases is not reported
+TOLERANCE = 0.25
+NOISE_FLOOR = 0.005
+
+# Each phase is timed this many times and its fastest run kept
+REPEATS = 5
+
+
+def _phases(path):
+    """
+    Returns (name, setup) pairs; setup() prepares inputs and returns the
+    callable to time, so only the phase itself is measured. A callable with
+    a ``close`` attribute has it called once the phase is done.
+    """
+    import input
+    import schedule_cache
+    from heap_helperfunctions import IndexedHeap
+    from simulation import SILENT, simulation
+
+    def read():
+        return lambda: input.read(path, [])
+
+    def read_columns():
+        return lambda: input.read_columns(path, [])
+
+    def compile_():
+        return lambda: schedule_cache.compile_schedule(path, [])
+
+    def load():
+        schedule_cache.load_schedule(path, [])
+        return lambda: schedule_cache.load_schedule(path, []).records()
+
+    def build():
+        records = schedule_cache.load_records(path, [])
+        return lambda: IndexedHeap(list(records))
+
+    def _replay(heap_type):
+        # The event sequence of a real run, replayed on a bare heap: pop the
+        # top, or re-queue it 30 minutes later for a delay
+        from heap_helperfunctions import build_min_heap, delay_min, delete_min
+
+        records = schedule_cache.load_records(path, [])
+        delays = [record[0] == "DELAYED" for record in simulation(path, SILENT)]
+
+        def run():
+            if heap_type == "list":
+                heap = list(records)
+                build_min_heap(heap)
+            else:
+                heap = IndexedHeap(list(records))
+            for delayed in delays:
+                if delayed:
+                    _, _, time, passengers, _ = heap[0]
+                    delay_min(heap, time + 30, passengers + 1)
+                else:
+                    delete_min(heap)
+        return run
+
+    def heap_list():
+        return _replay("list")
+
+    def heap_indexed():
+        return _replay("indexed")
+
+    def simulate():
+        schedule_cache.load_schedule(path, [])
+        return lambda: simulation(path, SILENT)
+
+    def simulate_calendar():
+        schedule_cache.load_schedule(path, [])
+        return lambda: simulation(path, SILENT, scheduler="calendar")
+
+    def analytic():
+        from analytic import outcomes
+
+        schedule = schedule_cache.load_schedule(path, [])
+        return lambda: outcomes(schedule.time, schedule.passengers, schedule.capacity)
+
+    def draw_heap():
+        import tkinter as tk
+        from display2 import BusSimulationGUI
+
+        root = tk.Tk()
+        try:
+            root.withdraw()
+            gui = BusSimulationGUI(root)
+            heap = IndexedHeap(schedule_cache.load_records(path, []))
+        except BaseException:
+            root.destroy()
+            raise
+
+        def run():
+            gui.draw_heap(heap)
+        run.close = root.destroy
+        return run
+
+    return [("read", read), ("read_columns", read_columns), ("compile", compile_),
+            ("load", load), ("build", build), ("heap_list", heap_list),
+            ("heap_indexed", heap_indexed), ("simulate", simulate),
+            ("simulate_calendar", simulate_calendar), ("analytic", analytic),
+            ("draw_heap", draw_heap)]
+
+
+def _measure(setup, memory, repeats=REPEATS):
+    """
+    Times one phase as the fastest of ``repeats`` runs; with ``memory`` also
+    records its peak allocation over one more run.
+    """
+    run = setup()
+    try:
+        seconds = None
+        for _ in range(max(1, repeats)):
+            gc.collect()
+            start = clock.perf_counter()
+            run()
+            elapsed = clock.perf_counter() - start
+            if seconds is None or elapsed < seconds:
+                seconds = elapsed
+        peak = None
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    finally:
+        close = getattr(run, "close", None)
+        if close is not None:
+            close()
+    return seconds, peak
+
+
+def run_benchmarks(sizes=SIZES, phases=None, seed=0, memory=True, workdir=None, log=print,
+                   repeats=REPEATS):
+    """
+    Times every phase at every schedule size.
+
+    Each size gets a fresh synthetic schedule (see synth.generate_schedule).
+    Phases whose optional dependency is missing (NumPy, tkinter or a
+    display) are skipped, as are phases above their PHASE_LIMITS size.
+
+    Parameters:
+    sizes (iterable of int): Number of buses per run.
+    phases (iterable of str or None): Phase names to run; all by default.
+    seed (int): Seed for the synthetic schedules.
+    memory (bool): Also measure peak traced memory (one more run per phase).
+    workdir (str or None): Where schedules are written; a temp dir by default.
+    log (callable): Progress reporter, print by default.
+    repeats (int): Timed runs per phase; the fastest is reported.
+
+    Returns:
+    dict: {size: {phase: {"seconds", "rows_per_second", "peak_bytes"}}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"synthetic_{size}.txt")
+            generate_schedule(path, size, seed=seed)
+            results[str(size)] = row = {}
+            for name, setup in _phases(path):
+                if phases is not None and name not in phases:
+                    continue
+                if size > PHASE_LIMITS.get(name, size):
+                    continue
+                try:
+                    seconds, peak = _measure(setup, memory, repeats)
+                except ImportError as e:
+                    log(f"{size:>10} {name:<18} skipped ({e})")
+                    continue
+                except Exception as e:  # e.g. tkinter without a display
+                    if name != "draw_heap":
+                        raise
+                    log(f"{size:>10} {name:<18} skipped ({e})")
+                    continue
+                row[name] = {
+                    "seconds": seconds,
+                    "rows_per_second": size / seconds if seconds else None,
+                    "peak_bytes": peak,
+                }
+                mem = f"{peak / 2**20:9.1f} MiB" if peak is not None else ""
+                log(f"{size:>10} {name:<18} {seconds:10.4f} s {size / seconds:14.0f} rows/s {mem}")
+            if os.path.exists(path + ".busc"):
+                os.remove(path + ".busc")
+            os.remove(path)
+    return results
+
+
+def save_baseline(results, path):
+    """Saves benchmark results as a JSON baseline."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance=TOLERANCE, noise_floor=NOISE_FLOOR):
+    """
+    Lists phases that got slower than a saved baseline.
+
+    Returns:
+    list of tuples: (size, phase, baseline_seconds, seconds) for every phase
+                    more than ``tolerance`` and more than ``noise_floor``
+                    seconds slower than its baseline.
+    """
+    regressions = []
+    for size, row in results.items():
+        for phase, numbers in row.items():
+            before = baseline.get(size, {}).get(phase)
+            if (before and numbers["seconds"] > before["seconds"] * (1 + tolerance)
+                    and numbers["seconds"] - before["seconds"] > noise_floor):
+                regressions.append((size, phase, before["seconds"], numbers["seconds"]))
+    return regressions
+
+
+def heap_speedups(results):
+    """
+    Compares the two heap replays (see _phases) at every size run.
+
+    Returns:
+    list of tuples: (size, list heap seconds, IndexedHeap seconds, speedup).
+    """
+    speedups = []
+    for size, row in results.items():
+        if "heap_list" in row and "heap_indexed" in row:
+            before, now = row["heap_list"]["seconds"], row["heap_indexed"]["seconds"]
+            speedups.append((size, before, now, before / now if now else None))
+    return speedups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the schedule pipeline phase by phase.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--phases", nargs="+", choices=sorted(PHASE_LIMITS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--save", metavar="JSON", help="write results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="report regressions against a baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR,
+                        help="seconds a phase may slow down by before it counts as a regression")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed runs per phase (fastest kept)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.phases, args.seed, not args.no_memory, repeats=args.repeats)
+    slower = False
+    for size, before, now, speedup in heap_speedups(results):
+        print(f"IndexedHeap at {size}: {speedup:.2f}x the list heap ({before:.4f} s -> {now:.4f} s)")
+        slower |= now > before
+    if slower:
+        print("IndexedHeap is slower than the list heap it replaces")
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.noise_floor)
+        for size, phase, before, now in regressions:
+            print(f"REGRESSION {phase} at {size}: {before:.4f} s -> {now:.4f} s")
+        return 1 if regressions or slower else 0
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+from array import array
+
+
+class LocationTable:
+    """
+    Interns city codes as small integer ids.
+
+    One table can be shared by every structure that stores locations (bus
+    columns, record stores), so a location id means the same city in each
+    and every code is held once.
+    """
+
+    def __init__(self, codes=()):
+        self.codes = []   # location id -> city code
+        self.ids = {}     # city code -> location id
+        for code in codes:
+            self.intern(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, location):
+        return self.codes[location]
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __contains__(self, code):
+        return code in self.ids
+
+    def intern(self, code):
+        """Returns the id of a city code, adding it to the table if new."""
+        location = self.ids.get(code)
+        if location is None:
+            location = self.ids[code] = len(self.codes)
+            self.codes.append(code)
+        return location
+
+
+class BusColumns:
+    """
+    Bus records stored as typed columns, one row per payload id.
+
+    A record costs 36 bytes of columns instead of a tuple and its boxed
+    integers, and locations are ids into a LocationTable. Reading row i
+    builds the (bus_number, city_code, time, passengers, capacity) tuple
+    the engines expect, and assigning a tuple writes it back into the
+    columns, so an IndexedHeap can keep BusColumns as its ``payloads`` and
+    re-key a record without storing a new object.
+
+    Parameters:
+    records (iterable): Bus records to start with.
+    locations (LocationTable or None): Table to intern city codes in; a new
+                                       one if None.
+    """
+
+    def __init__(self, records=(), locations=None):
+        self.locations = locations if locations is not None else LocationTable()
+        self.bus_number = array('q')
+        self.location = array('i')
+        self.time = array('q')
+        self.passengers = array('q')
+        self.capacity = array('q')
+        self.extend(records)
+
+    @classmethod
+    def from_schedule(cls, schedule, locations=None):
+        """
+        Copies a Schedule's columns (see schedule_cache) without building a
+        tuple per bus.
+        """
+        buses = cls(locations=locations)
+        for name in ("bus_number", "time", "passengers", "capacity"):
+            getattr(buses, name).extend(getattr(schedule, name))
+        ids = [buses.locations.intern(code) for code in schedule.locations]
+        if ids == list(range(len(ids))):
+            buses.location.extend(schedule.location)
+        else:
+            buses.location.extend(ids[location] for location in schedule.location)
+        return buses
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, i):
+        return (self.bus_number[i], self.locations.codes[self.location[i]], self.time[i],
+                self.passengers[i], self.capacity[i])
+
+    def __setitem__(self, i, record):
+        bus_number, city_code, time, passengers, capacity = record
+        self.bus_number[i] = bus_number
+        self.location[i] = self.locations.intern(city_code)
+        self.time[i] = time
+        self.passengers[i] = passengers
+        self.capacity[i] = capacity
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def append(self, record):
+        bus_number, city_code, time, passengers, capacity = record
+        self.bus_number.append(bus_number)
+        self.location.append(self.locations.intern(city_code))
+        self.time.append(time)
+        self.passengers.append(passengers)
+        self.capacity.append(capacity)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
@@ -0,0 +1,170 @@
+from bisect import insort
+from operator import neg
+
+from heap_helperfunctions import _ID_BITS, _ID_MASK
+
+
+# Buckets of a queue built empty; one built from records gets one per slot
+# its records span, at most one per record, rounded up to a power of two
+DEFAULT_BUCKETS = 64
+
+
+class CalendarQueue:
+    """
+    Calendar queue (timing wheel) of bus records ordered by time.
+
+    Records are bucketed by ``width``-minute slot of their absolute time,
+    on a ring: slot s goes in bucket s mod the bucket count, so the buckets
+    are reused as the queue moves on and their number does not grow with
+    the span of the schedule. Pushing appends to the slot's bucket; a
+    bucket is sorted once, when the queue reaches it, and then popped from
+    the end, so insert and pop are O(1) amortized for schedules with dense
+    departures. Keys are packed (time, payload id) exactly as in
+    IndexedHeap, so both schedulers pop records in the same order.
+
+    It offers the subset of the IndexedHeap interface the simulation uses:
+    ``peek``, ``peek_id``, ``push``, ``pop``, ``replace_top``, ``len`` and
+    iteration.
+
+    Parameters:
+    records (iterable): Bus records (bus_number, location, time, passengers, capacity).
+    width (int): Minutes per slot.
+    buckets (int or None): Buckets on the ring (rounded up to a power of
+                           two); sized from ``records`` if None.
+    """
+
+    def __init__(self, records=(), width=30, buckets=None):
+        self.width = width
+        self.payloads = []
+        self.slot = 0           # slot being served: no queued key is in an earlier one
+        self.limit = 0          # packed key where the next slot starts
+        self.sorted_index = -1  # bucket currently sorted in descending order
+        self.size = 0
+        self.counters = None    # HeapCounters while counted (see heap_helperfunctions.count)
+        records = list(records)
+        if records:
+            first = min(record[2] for record in records) // width
+            last = max(record[2] for record in records) // width
+            if buckets is None:
+                buckets = min(last - first + 1, len(records))
+        elif buckets is None:
+            buckets = DEFAULT_BUCKETS
+        self.mask = (1 << (max(1, buckets) - 1).bit_length()) - 1
+        self.buckets = [[] for _ in range(self.mask + 1)]   # slot & mask -> list of packed keys
+        if records:
+            self._serve(first)
+            for record in records:
+                self.push(record)
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __iter__(self):
+        """Yields the queued records in time order."""
+        payloads = self.payloads
+        for key in sorted(key for bucket in self.buckets for key in bucket):
+            yield payloads[key & _ID_MASK]
+
+    def entries(self):
+        """Returns the queued (packed key, record) pairs in time order."""
+        payloads = self.payloads
+        return [(key, payloads[key & _ID_MASK])
+                for key in sorted(key for bucket in self.buckets for key in bucket)]
+
+    def push(self, record):
+        """Adds a record to the queue and returns its payload id."""
+        pid = len(self.payloads)
+        if pid > _ID_MASK:
+            raise OverflowError("CalendarQueue holds at most 2**32 records")
+        self.payloads.append(record)
+        self._insert((record[2] << _ID_BITS) | pid, record[2])
+        return pid
+
+    def peek(self):
+        """Returns the earliest record without removing it, or None."""
+        bucket = self._current()
+        if bucket is None:
+            return None
+        return self.payloads[bucket[-1] & _ID_MASK]
+
+    def peek_id(self):
+        """Returns the payload id of the earliest record, or None if empty."""
+        bucket = self._current()
+        if bucket is None:
+            return None
+        return bucket[-1] & _ID_MASK
+
+    def pop(self):
+        """Removes and returns the earliest record, or None if empty."""
+        bucket = self._current()
+        if bucket is None:
+            return None
+        self.size -= 1
+        return self.payloads[bucket.pop() & _ID_MASK]
+
+    def replace_top(self, record):
+        """
+        Replaces the earliest record with ``record`` under the same payload
+        id, re-queueing it at its new time.
+
+        Returns:
+        tuple: The record that was at the top.
+        """
+        bucket = self._current()
+        if bucket is None:
+            raise IndexError("replace_top on an empty queue")
+        pid = bucket.pop() & _ID_MASK
+        self.size -= 1
+        old = self.payloads[pid]
+        self.payloads[pid] = record
+        self._insert((record[2] << _ID_BITS) | pid, record[2])
+        return old
+
+    def _insert(self, key, time):
+        slot = time // self.width
+        if slot < self.slot or not self.size:
+            self._serve(slot)
+        index = slot & self.mask
+        if index == self.sorted_index:
+            insort(self.buckets[index], key, key=neg)
+        else:
+            self.buckets[index].append(key)
+        self.size += 1
+
+    def _serve(self, slot):
+        self.slot = slot
+        self.limit = ((slot + 1) * self.width) << _ID_BITS
+
+    def _current(self):
+        """
+        Returns the bucket holding the earliest key, sorted descending, or
+        None. A bucket can hold keys of later turns of the ring, so the
+        earliest is only taken once it is in the slot being served.
+        """
+        if not self.size:
+            return None
+        index = self.slot & self.mask
+        bucket = self.buckets[index]
+        if bucket and index == self.sorted_index and bucket[-1] < self.limit:
+            return bucket
+        buckets, mask = self.buckets, self.mask
+        empty = 0
+        while True:
+            if bucket:
+                if index != self.sorted_index:
+                    bucket.sort(reverse=True)
+                    self.sorted_index = index
+                if bucket[-1] < self.limit:
+                    return bucket
+            empty += 1
+            if empty > mask:
+                # A whole turn without a due key: jump to the earliest one
+                self._serve((min(min(bucket) for bucket in buckets if bucket) >> _ID_BITS) // self.width)
+                empty = 0
+            else:
+                self._serve(self.slot + 1)
+            index = self.slot & mask
+            bucket = buckets[index]
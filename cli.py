@@ -0,0 +1,142 @@
+# Command-line entry point: run, batch, watch, bench and gui subcommands. Only
+# argparse is imported up front; each subcommand imports what it needs
+# (tkinter for gui, NumPy only through the analytic engine).
+import argparse
+import sys
+
+
+def _policy(args):
+    from simulation import Policy
+
+    return Policy(args.threshold, args.max_delays, args.delay_minutes, args.growth)
+
+
+def _add_policy_arguments(parser):
+    parser.add_argument("--threshold", type=float, default=0.7, help="minimum load factor to depart")
+    parser.add_argument("--max-delays", type=int, default=2)
+    parser.add_argument("--delay-minutes", type=int, default=30)
+    parser.add_argument("--growth", type=float, default=0.2, help="passenger growth per delay")
+
+
+def run(args):
+    from simulation import simulation
+
+    policy = _policy(args)
+    if args.shards:
+        from sharded import sharded_simulation
+        from simulation import BufferedWriter, format_record, print_summary
+
+        records = sharded_simulation(args.schedule, args.shards, args.shard_by, policy)
+        out = BufferedWriter(sys.stdout)
+        if args.output == "events":
+            for record in records:
+                out.write_line(format_record(record, policy.max_delays))
+        elif args.output == "summary":
+            print_summary(records, out, policy)
+        out.flush()
+    else:
+        records = simulation(args.schedule, args.output, scheduler=args.scheduler, policy=policy,
+                             report=args.report, event_log=args.event_log)
+    if args.store:
+        from run_store import RunStore
+
+        with RunStore(args.store) as store:
+            store.add_run(args.schedule, records, policy)
+    return 0
+
+
+def batch(args):
+    import glob
+
+    from sweep import METRICS, run_sweep, write_table
+
+    schedules = sorted({path for pattern in args.patterns for path in glob.glob(pattern)})
+    if not schedules:
+        print("no schedules match " + " ".join(args.patterns), file=sys.stderr)
+        return 1
+    rows = run_sweep(schedules, [_policy(args)], args.engine, args.workers)
+    if args.csv:
+        write_table(rows, args.csv)
+    else:
+        print(",".join(METRICS))
+        for row in rows:
+            print(",".join(str(row[name]) for name in METRICS))
+    return 0
+
+
+def watch(args):
+    from incremental import watch as watch_schedule
+    from simulation import BufferedWriter
+
+    out = BufferedWriter(sys.stdout)
+    try:
+        watch_schedule(args.schedule, out, args.interval, _policy(args))
+    except KeyboardInterrupt:
+        out.flush()
+    return 0
+
+
+def bench(args):
+    import bench
+
+    return bench.main(args.options)
+
+
+def gui(args):
+    import display2
+
+    display2.main(args.schedule)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bus scheduling simulation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("run", help="simulate one schedule")
+    command.add_argument("schedule")
+    command.add_argument("--output", choices=("silent", "events", "summary", "trace"), default="trace")
+    command.add_argument("--scheduler", choices=("heap", "calendar", "compact"), default="heap")
+    command.add_argument("--report", metavar="JSON", help="write a timing and heap-counter report")
+    command.add_argument("--event-log", metavar="PATH", help="record the run for replay")
+    command.add_argument("--shards", type=int, metavar="N",
+                         help="split the schedule over N worker processes (see sharded.py)")
+    command.add_argument("--shard-by", choices=("location", "trip"), default="location")
+    command.add_argument("--store", metavar="DB", help="add the run to a SQLite history (see run_store.py)")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=run)
+
+    command = commands.add_parser("batch", help="summarize every schedule matching glob patterns")
+    command.add_argument("patterns", nargs="+", metavar="GLOB")
+    command.add_argument("--engine", choices=("analytic", "heap"), default="heap")
+    command.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    command.add_argument("--csv", metavar="PATH", help="write the results here instead of stdout")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=batch)
+
+    command = commands.add_parser("watch", help="re-simulate a schedule incrementally as it is edited")
+    command.add_argument("schedule")
+    command.add_argument("--interval", type=float, default=1.0, help="seconds between checks of the file")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=watch)
+
+    command = commands.add_parser("bench", help="run the phase benchmarks (options as for bench.py)",
+                                  add_help=False)
+    command.set_defaults(handler=bench)
+
+    command = commands.add_parser("gui", help="open the dashboard")
+    command.add_argument("schedule", nargs="?")
+    command.set_defaults(handler=gui)
+
+    # bench passes its options through to bench.py untouched
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "run" and args.shards and (args.output == "trace" or args.report or args.event_log):
+        parser.error("--shards supports --output silent, events or summary, without --report or --event-log")
+    if extra and args.handler is not bench:
+        parser.error("unrecognized arguments: " + " ".join(extra))
+    args.options = extra
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,38 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from simulation import Policy
+from synth import generate_schedule
+
+HERE = Path(__file__).parent
+
+# Shared bus numbers, equal times and rows out of time order
+SMALL = """\
+7 LHE 0600 10 20
+7 LHE 0600 10 20
+3 ISB 0545 1 50
+9 KHI 0600 30 30
+7 ISB 2430 0 10
+2 HYD 0000 5 5
+3 ISB 0545 40 50
+"""
+
+
+@pytest.fixture(params=["BUS.txt", "BUS2.txt", "synthetic", "small"])
+def schedule(request, tmp_path):
+    """A schedule file in a temporary directory, so its cache lands there too."""
+    path = tmp_path / "schedule.txt"
+    if request.param == "synthetic":
+        generate_schedule(str(path), 2000, seed=3, days=2, occupancy="beta", time_distribution="peaks")
+    elif request.param == "small":
+        path.write_text(SMALL)
+    else:
+        shutil.copy(HERE / request.param, path)
+    return str(path)
+
+
+@pytest.fixture(params=[Policy(), Policy(0.5, 0, 15, 0.5), Policy(0.9, 3, 45, 0.1)], ids=repr)
+def policy(request):
+    return request.param
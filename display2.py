@@ -1,12 +1,63 @@
-import tkinter as tk
-from tkinter import scrolledtext, ttk, Canvas, Frame, Scale
-import sys
-from io import StringIO
-import math
-from input import read
-from heap_helperfunctions import insert_min, delete_min, min_heapify, heapify_up
+import collections
+import itertools
+import os
+import queue
+import threading
+from schedule_cache import load_columns
+from simulation import DEFAULT_POLICY, RECORD_FIELDS, BufferedWriter, format_record, print_summary, process_next
+from input import hhmm_to_minutes, minutes_to_hhmm
+from record_store import ACTIONS, RecordStore
+from event_log import SUFFIX as EVENT_LOG_SUFFIX, EventLog, EventLogWriter
+import heap_helperfunctions
+from heap_helperfunctions import IndexedHeap
+
+# tkinter is imported on first use (see load_tk), so importing this module
+# for its heap view helpers costs no GUI toolkit and needs no display
+tk = ttk = scrolledtext = filedialog = Canvas = Frame = Scale = None
+
+
+def load_tk():
+    """Imports tkinter into the module names the widget code uses."""
+    global tk, ttk, scrolledtext, filedialog, Canvas, Frame, Scale
+    if tk is None:
+        import tkinter
+        from tkinter import filedialog as dialogs, scrolledtext as scrolled, ttk as themed
+
+        tk, ttk, scrolledtext, filedialog = tkinter, themed, scrolled, dialogs
+        Canvas, Frame, Scale = tkinter.Canvas, tkinter.Frame, tkinter.Scale
+
+
+# How often the UI drains the engine's event queue and redraws (about 30 frames/s)
+FRAME_MS = 33
+
+# Most engine steps applied in one frame, and most the engine may be ahead
+# of the UI; a full queue makes the engine wait for the next frame
+STEPS_PER_FRAME = 2048
+EVENT_QUEUE_SIZE = 2 * STEPS_PER_FRAME
+
+# Seconds between checks for a stop request while the engine waits on a full queue
+POST_WAIT = 0.1
+
+# Default number of lines the Simulation Log tab keeps
+LOG_LINES = 5000
+
+# Heap view geometry, in screen pixels
+LEVEL_HEIGHT = 90    # vertical distance between tree levels
+TOP_MARGIN = 70      # room above the root for the hint
+DETAIL_SPACING = 60  # levels whose nodes would be closer than this are folded into aggregates
+ZOOM_STEP = 1.25     # zoom factor per mouse-wheel notch
+MAX_ZOOM = 2.0 ** 20
+DRAG_THRESHOLD = 4   # pointer travel that turns a click into a pan
+
+# Final Records table line geometry, in screen pixels
+RECORD_ROW_HEIGHT = 20
+RECORD_HEADING_HEIGHT = 25
 
 class TreeNode:
+    # Slots keep each of the (view-bounded) nodes to its canvas items and
+    # geometry; the tooltip text is built from ``value`` when asked for.
+    __slots__ = ("canvas", "x", "y", "value", "radius", "circle", "text", "line")
+    
     def __init__(self, canvas, x, y, value, radius=30):
         self.canvas = canvas
         self.x = x
@@ -15,6 +66,14 @@ class TreeNode:
         self.radius = radius
         self.circle = None
         self.text = None
+        self.line = None
+        
+    def labels(self):
+        """Returns the node text and the tooltip text for the current value."""
+        bus_number, location, time, passengers, capacity = self.value
+        time = minutes_to_hhmm(time)
+        return (f"{bus_number}\n{time}",
+                f"Bus: {bus_number}\nTo: {location}\nTime: {time}\nPassengers: {passengers}/{capacity}")
         
     def draw(self):
         # Draw circle with thicker outline
@@ -25,24 +84,571 @@ class TreeNode:
         )
         
         # Draw text (bus number and time) with larger, bolder font
-        bus_number, _, time, passengers, capacity = self.value
-        display_text = f"{bus_number}\n{time}"
+        display_text = self.labels()[0]
         self.text = self.canvas.create_text(
             self.x, self.y, text=display_text, font=("Arial", 11, "bold"), fill="white"  # Increased font size
         )
         
-        # Draw tooltip with full info
-        self.tooltip_text = f"Bus: {bus_number}\nTo: {self.value[1]}\nTime: {time}\nPassengers: {passengers}/{capacity}"
-        
     def draw_connection(self, parent_x, parent_y):
-        self.canvas.create_line(
+        self.line = self.canvas.create_line(
             parent_x, parent_y,
             self.x, self.y,
             fill="black", width=3  # Changed to black and increased width
         )
+        self.canvas.tag_lower(self.line)  # keep edges under nodes drawn earlier
+        
+    def set_value(self, value):
+        """Shows another bus in this node without recreating its items."""
+        self.value = value
+        display_text = self.labels()[0]
+        self.canvas.itemconfig(self.text, text=display_text)
+        
+    def move(self, x, y, radius, parent=None):
+        """Moves the node (and its edge to the ``parent`` point) without recreating its items."""
+        self.x, self.y, self.radius = x, y, radius
+        self.canvas.coords(self.circle, x - radius, y - radius, x + radius, y + radius)
+        self.canvas.coords(self.text, x, y)
+        if self.line is not None and parent is not None:
+            self.canvas.coords(self.line, parent[0], parent[1], x, y)
+        
+    def items(self):
+        return [item for item in (self.circle, self.text, self.line) if item is not None]
+
+
+class AggregateNode(TreeNode):
+    """
+    A collapsed subtree: drawn as a box labelled with how many buses it
+    holds and their earliest and latest times. ``value`` is the
+    (count, earliest, latest) summary and ``radius`` half the box width.
+    """
+    __slots__ = ()
+    
+    def labels(self):
+        count, earliest, latest = self.value
+        earliest, latest = minutes_to_hhmm(earliest), minutes_to_hhmm(latest)
+        return (f"{count}\n{earliest}\n{latest}",
+                f"{count} buses in this subtree\nEarliest: {earliest}\nLatest: {latest}\n(zoom in for details)")
+        
+    def draw(self):
+        self.circle = self.canvas.create_rectangle(
+            self.x - self.radius, self.y - 25, self.x + self.radius, self.y + 25,
+            fill="#9E9E9E", outline="black", width=2
+        )
+        display_text = self.labels()[0]
+        self.text = self.canvas.create_text(
+            self.x, self.y, text=display_text, font=("Arial", 8), fill="white"
+        )
+        
+    def move(self, x, y, radius, parent=None):
+        self.x, self.y, self.radius = x, y, radius
+        self.canvas.coords(self.circle, x - radius, y - 25, x + radius, y + 25)
+        self.canvas.coords(self.text, x, y)
+        if self.line is not None and parent is not None:
+            self.canvas.coords(self.line, parent[0], parent[1], x, y)
+
+
+def sift_path(heap, pid):
+    """
+    Returns the slots a sift from the root can have changed: the path from
+    where payload ``pid`` of an IndexedHeap came to rest up to the root
+    (empty if it is no longer in the heap).
+    """
+    slot = heap.slot(pid)
+    if slot < 0:
+        return []
+    path = [slot]
+    while slot > 0:
+        slot = (slot - 1) >> 1
+        path.append(slot)
+    return path
+
+
+def subtree_size(size, slot):
+    """
+    Returns how many slots of a heap of ``size`` buses lie in the subtree
+    under ``slot``. Each level of the subtree is a contiguous run of slots,
+    so this costs one step per level.
+    """
+    count = 0
+    first, width = slot, 1
+    while first < size:
+        count += min(first + width, size) - first
+        first, width = 2 * first + 1, 2 * width
+    return count
+
+
+class HeapRenderer:
+    """
+    Level-of-detail, retained-mode drawing of a heap as a binary tree.
+
+    The tree is laid out on a virtual plane the canvas views through a
+    zoom and a pan. A level is drawn node by node while its nodes are at
+    least DETAIL_SPACING apart; the first level that would be tighter is
+    drawn as aggregate boxes summarizing whole subtrees, and nothing below
+    it is drawn. Only nodes inside the viewport get canvas items, so a
+    frame costs about the same at any heap size.
+
+    Items are kept per visible node and reused between frames: a frame
+    moves (coords) or relabels (itemconfig) what changed and creates or
+    deletes only nodes entering or leaving the view. An aggregate's count
+    follows from the heap size and its earliest time is its root's (the
+    heap property); the latest time in every subtree is kept in ``latest``
+    and repaired bottom-up along the paths the last steps touched, so a
+    frame never rescans a subtree.
+
+    Mouse: click a node for details, drag to pan, wheel to zoom.
+    """
+
+    def __init__(self, canvas, on_select):
+        self.canvas = canvas
+        self.on_select = on_select  # called with the clicked TreeNode or AggregateNode
+        self.nodes = {}             # (slot, aggregate) -> node
+        self.slots = {}             # canvas item id -> node key
+        self.latest = None          # slot -> latest time in its subtree; None until an aggregate needs it
+        self.heap = []
+        self.size = 0               # len(self.heap) when it was last rendered
+        self.hint = None
+        self.drag = None
+        self.zoom = 1.0
+        self.pan_x = 0.0
+        self.pan_y = 0.0
+        canvas.bind("<ButtonPress-1>", self.on_press)
+        canvas.bind("<B1-Motion>", self.on_drag)
+        canvas.bind("<ButtonRelease-1>", self.on_release)
+        canvas.bind("<MouseWheel>", lambda event: self.zoom_at(event.x, event.y, event.delta > 0))
+        canvas.bind("<Button-4>", lambda event: self.zoom_at(event.x, event.y, True))
+        canvas.bind("<Button-5>", lambda event: self.zoom_at(event.x, event.y, False))
+        canvas.bind("<Configure>", lambda event: self.refresh())
+
+    def clear(self):
+        """Removes every item."""
+        self.canvas.delete("all")
+        self.nodes = {}
+        self.slots = {}
+        self.latest = None
+        self.hint = None
+
+    def reset(self):
+        """Removes every item and goes back to the whole-tree view, e.g. before a new run."""
+        self.clear()
+        self.heap = []
+        self.size = 0
+        self.zoom = 1.0
+        self.pan_x = self.pan_y = 0.0
+
+    def viewport(self):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        
+        # Ensure we have dimensions (wait for canvas to be rendered)
+        if width <= 1:
+            width = 1000
+        if height <= 1:
+            height = 600
+        return width, height
+
+    def visible(self, size, width, height):
+        """
+        Lays out the part of a heap of ``size`` buses that is in view.
+
+        Returns:
+        dict: (slot, aggregate) -> (x, y, radius, parent_point or None)
+        """
+        plane = width * self.zoom
+        visible = {}
+        level = 0
+        while 2 ** level - 1 < size:
+            first = 2 ** level - 1
+            spacing = plane / 2 ** level
+            aggregate = spacing < DETAIL_SPACING
+            y = TOP_MARGIN + level * LEVEL_HEIGHT - self.pan_y
+            if y > height + LEVEL_HEIGHT:
+                break
+            if y > -LEVEL_HEIGHT:
+                radius = spacing * 0.45 if aggregate else min(35, spacing / 2.5)
+                lo = max(0, int(self.pan_x // spacing))
+                hi = min(2 ** level, size - first, int((self.pan_x + width) // spacing) + 1)
+                for j in range(lo, hi):
+                    x = (j + 0.5) * spacing - self.pan_x
+                    parent = ((j // 2 + 0.5) * 2 * spacing - self.pan_x, y - LEVEL_HEIGHT) if level else None
+                    visible[(first + j, aggregate)] = (x, y, radius, parent)
+            if aggregate:
+                break
+            level += 1
+        return visible
+
+    def summary(self, slot):
+        """Returns (count, earliest time, latest time) of the subtree under ``slot``."""
+        heap = self.heap
+        if self.latest is None:
+            # First aggregate since the heap was replaced: one bottom-up pass
+            size = len(heap)
+            self.latest = latest = [heap[i][2] for i in range(size)]
+            for i in range(size // 2 - 1, -1, -1):
+                child = 2 * i + 1
+                latest[i] = max(latest[i], latest[child], latest[child + 1] if child + 1 < size else latest[child])
+        return subtree_size(len(heap), slot), heap[slot][2], self.latest[slot]
+
+    def invalidate(self, touched, old_size, size):
+        """Repairs ``latest`` for every subtree a step changed, children before parents."""
+        latest = self.latest
+        if touched is None:
+            self.latest = None
+            return
+        if latest is None:
+            return
+        dirty = set()
+        for slot in itertools.chain(touched, range(min(size, old_size), max(size, old_size))):
+            while slot not in dirty:
+                dirty.add(slot)
+                if slot == 0:
+                    break
+                slot = (slot - 1) >> 1
+        del latest[size:]
+        latest.extend(itertools.repeat(0, size - len(latest)))
+        heap = self.heap
+        for slot in sorted(dirty, reverse=True):
+            if slot >= size:
+                continue
+            value = heap[slot][2]
+            child = 2 * slot + 1
+            if child < size:
+                value = max(value, latest[child])
+                if child + 1 < size:
+                    value = max(value, latest[child + 1])
+            latest[slot] = value
+
+    def render(self, heap, touched=None):
+        """
+        Brings the canvas up to date with the heap.
+
+        Parameters:
+        heap (IndexedHeap or list): The heap to show.
+        touched (iterable of int or None): Slots whose bus may have changed
+                                           since the last frame; None means
+                                           any slot may have.
+
+        Returns:
+        None
+        """
+        if heap is not self.heap:
+            touched = None
+        self.heap = heap
+        size = len(heap)
+        self.invalidate(touched, self.size, size)
+        self.size = size
+        if size == 0:
+            self.clear()
+            return
+        width, height = self.viewport()
+        visible = self.visible(size, width, height)
+        
+        for key in [key for key in self.nodes if key not in visible]:
+            self.remove(key)
+        for key, (x, y, radius, parent) in visible.items():
+            slot, aggregate = key
+            value = self.summary(slot) if aggregate else heap[slot]
+            node = self.nodes.get(key)
+            if node is None:
+                self.add(key, x, y, radius, parent, value)
+                continue
+            if node.x != x or node.y != y or node.radius != radius:
+                node.move(x, y, radius, parent)
+            if node.value != value:
+                node.set_value(value)
+        
+        if self.hint is None:
+            # Add instructions
+            self.hint = self.canvas.create_text(
+                width / 2, 30, 
+                text="Click on a bus node to see details (drag to pan, scroll to zoom)", 
+                font=("Arial", 10, "italic"), 
+                fill="#666666"
+            )
+        else:
+            self.canvas.coords(self.hint, width / 2, 30)
+
+    def refresh(self):
+        """Redraws the current heap after a change of view."""
+        if len(self.heap):
+            self.render(self.heap, ())
+
+    def add(self, key, x, y, radius, parent, value):
+        node = (AggregateNode if key[1] else TreeNode)(self.canvas, x, y, value, radius)
+        if parent is not None:
+            node.draw_connection(*parent)
+        node.draw()
+        self.nodes[key] = node
+        self.slots[node.circle] = key
+        self.slots[node.text] = key
+
+    def remove(self, key):
+        node = self.nodes.pop(key)
+        self.canvas.delete(*node.items())
+        self.slots.pop(node.circle, None)
+        self.slots.pop(node.text, None)
+
+    def zoom_at(self, x, y, zoom_in):
+        """Zooms in or out one step, keeping the point under (x, y) in place."""
+        zoom = self.zoom * ZOOM_STEP if zoom_in else self.zoom / ZOOM_STEP
+        zoom = min(MAX_ZOOM, max(1.0, zoom))
+        self.pan_x = (x + self.pan_x) * zoom / self.zoom - x
+        self.zoom = zoom
+        self.refresh()
+
+    def on_press(self, event):
+        self.drag = (event.x, event.y, self.pan_x, self.pan_y, False)
+
+    def on_drag(self, event):
+        if self.drag is None:
+            return
+        x, y, pan_x, pan_y, moved = self.drag
+        if not moved and abs(event.x - x) + abs(event.y - y) < DRAG_THRESHOLD:
+            return
+        self.drag = (x, y, pan_x, pan_y, True)
+        self.pan_x = pan_x - (event.x - x)
+        self.pan_y = pan_y - (event.y - y)
+        self.refresh()
+
+    def on_release(self, event):
+        drag, self.drag = self.drag, None
+        if drag is not None and drag[4]:
+            return  # that was a pan
+        for item in self.canvas.find_withtag("current"):
+            key = self.slots.get(item)
+            if key is not None:
+                self.on_select(self.nodes[key])
+                return
+
+
+class RecordTable:
+    """
+    Virtual list view of a RecordStore in a ttk.Treeview.
+
+    The Treeview only ever holds one item per visible line; scrolling,
+    sorting and filtering rewrite those items' values from the store's
+    columns. ``rows`` is the current view as store row numbers, or None
+    for every record in order, which needs no list at all.
+    """
+
+    columns = ("Action", "Bus", "Destination", "Departing Time", "Passengers", "Capacity")
+
+    def __init__(self, parent, store):
+        load_tk()
+        self.store = store
+        self.rows = None
+        self.seen = 0               # store rows the filter has looked at
+        self.top = 0                # view position of the first visible line
+        self.items = []             # Treeview item per visible line
+        self.sort_field = None
+        self.reverse = False
+        self.filters = {}
+        
+        # Filter bar
+        filter_frame = tk.Frame(parent, bg="#ffffff")
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        self.action_filter = tk.StringVar(value="All")
+        self.location_filter = tk.StringVar(value="All")
+        self.start_filter = tk.StringVar()
+        self.end_filter = tk.StringVar()
+        tk.Label(filter_frame, text="Action:", bg="#ffffff", font=("Arial", 10)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Combobox(filter_frame, textvariable=self.action_filter, values=("All",) + ACTIONS,
+                     width=11, state="readonly").pack(side=tk.LEFT)
+        tk.Label(filter_frame, text="Destination:", bg="#ffffff", font=("Arial", 10)).pack(side=tk.LEFT, padx=(15, 5))
+        self.location_box = ttk.Combobox(filter_frame, textvariable=self.location_filter, values=("All",),
+                                         width=10, postcommand=self.list_locations)
+        self.location_box.pack(side=tk.LEFT)
+        tk.Label(filter_frame, text="From (HHMM):", bg="#ffffff", font=("Arial", 10)).pack(side=tk.LEFT, padx=(15, 5))
+        tk.Entry(filter_frame, textvariable=self.start_filter, width=6).pack(side=tk.LEFT)
+        tk.Label(filter_frame, text="To:", bg="#ffffff", font=("Arial", 10)).pack(side=tk.LEFT, padx=(10, 5))
+        tk.Entry(filter_frame, textvariable=self.end_filter, width=6).pack(side=tk.LEFT)
+        ttk.Button(filter_frame, text="Filter", command=self.apply_filters).pack(side=tk.LEFT, padx=(15, 5))
+        ttk.Button(filter_frame, text="Clear", command=self.clear_filters).pack(side=tk.LEFT)
+        self.match_count = tk.Label(filter_frame, text="", bg="#ffffff", font=("Arial", 10))
+        self.match_count.pack(side=tk.RIGHT)
+        
+        table_frame = tk.Frame(parent, bg="#ffffff")
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Scrollbar for treeview; it scrolls the view, not the Treeview
+        self.scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(table_frame, columns=self.columns, show='headings', height=1)
+        
+        # Define headings; clicking one sorts by it
+        for col, field in zip(self.columns, RECORD_FIELDS):
+            self.tree.heading(col, text=col, command=lambda field=field: self.sort_by(field))
+            self.tree.column(col, width=100)
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        table_frame.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, "units"))
+
+    def set_store(self, store):
+        """Shows another store (e.g. a new run), keeping the sort and filters."""
+        self.store = store
+        self.rows = None if not self.filters and self.sort_field is None else []
+        self.seen = 0
+        self.top = 0
+        self.refresh()
+
+    def view_size(self):
+        return len(self.store) if self.rows is None else len(self.rows)
+
+    def refresh(self):
+        """Takes in records added to the store since the last call and redraws."""
+        if self.rows is not None and self.seen < len(self.store):
+            new_rows = self.store.select(first=self.seen, **self.filters)
+            self.seen = len(self.store)
+            if new_rows:
+                if self.sort_field is None:
+                    self.rows.extend(new_rows)
+                else:
+                    # The view was sorted when the sort last changed; only the new rows need placing
+                    self.store.merge(self.rows, new_rows, self.sort_field, self.reverse)
+        self.redraw()
+
+    def redraw(self):
+        """Writes the visible slice of the view into the Treeview items."""
+        total = self.view_size()
+        page = len(self.items)
+        self.top = max(0, min(self.top, total - page))
+        store = self.store
+        for line, item in enumerate(self.items):
+            position = self.top + line
+            if position < total:
+                row = position if self.rows is None else self.rows[position]
+                action, bus_number, location, time, passengers, capacity = store[row]
+                self.tree.item(item, values=(action, bus_number, location, minutes_to_hhmm(time),
+                                             passengers, capacity))
+            else:
+                self.tree.item(item, values=())
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + page) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.match_count.config(text=f"{total} of {len(store)} records")
+
+    def on_resize(self, event):
+        """Keeps one Treeview item per line that fits."""
+        lines = max(1, (event.height - RECORD_HEADING_HEIGHT) // RECORD_ROW_HEIGHT)
+        if lines == len(self.items):
+            return
+        while len(self.items) < lines:
+            self.items.append(self.tree.insert("", "end", values=()))
+        while len(self.items) > lines:
+            self.tree.delete(self.items.pop())
+        self.tree.configure(height=lines)
+        self.redraw()
+
+    def scroll(self, amount, unit):
+        step = 1 if unit == "units" else max(1, len(self.items) - 1)
+        self.top += amount * step
+        self.redraw()
+
+    def on_scroll(self, command, *args):
+        if command == "moveto":
+            self.top = int(float(args[0]) * self.view_size())
+            self.redraw()
+        else:  # "scroll", n, "units" or "pages"
+            self.scroll(int(args[0]), args[1])
+
+    def sort_by(self, field):
+        """Sorts by a field; choosing the same field again reverses the order."""
+        self.reverse = not self.reverse if field == self.sort_field else False
+        self.sort_field = field
+        if self.rows is None:
+            self.rows = list(range(len(self.store)))
+            self.seen = len(self.store)
+        self.store.sort(self.rows, field, self.reverse)
+        self.top = 0
+        self.redraw()
+
+    def list_locations(self):
+        self.location_box.configure(values=["All"] + sorted(self.store.locations))
+
+    def apply_filters(self):
+        """Rebuilds the view from the filter bar."""
+        filters = {}
+        if self.action_filter.get() != "All":
+            filters["actions"] = (self.action_filter.get(),)
+        location = self.location_filter.get().strip()
+        if location and location != "All":
+            filters["locations"] = (location,)
+        for name, var in (("start", self.start_filter), ("end", self.end_filter)):
+            text = var.get().strip()
+            if not text:
+                continue
+            if not text.isdigit() or int(text) % 100 >= 60:
+                self.match_count.config(text=f"Invalid time {text!r}")
+                return
+            filters[name] = hhmm_to_minutes(int(text))
+        self.filters = filters
+        self.rows = self.store.select(**filters)
+        self.seen = len(self.store)
+        if self.sort_field is not None:
+            self.store.sort(self.rows, self.sort_field, self.reverse)
+        self.top = 0
+        self.redraw()
+
+    def clear_filters(self):
+        self.action_filter.set("All")
+        self.location_filter.set("All")
+        self.start_filter.set("")
+        self.end_filter.set("")
+        self.filters = {}
+        self.sort_field = None
+        self.reverse = False
+        self.rows = None
+        self.top = 0
+        self.redraw()
+
+
+class LogChannel:
+    """
+    Engine-side log writer with the BufferedWriter interface.
+
+    Lines are handed to the UI thread through a deque capped at the log
+    view's line limit: lines the view would trim anyway are dropped before
+    they ever reach Tk. With a spool path every line is also written to
+    that file, so nothing is lost.
+    """
+
+    def __init__(self, max_lines, spool=None):
+        self.pending = collections.deque(maxlen=max_lines)  # engine appends, UI drains
+        self.written = 0
+        self.spool = BufferedWriter(open(spool, "w")) if spool else None
+
+    def write_line(self, line):
+        self.pending.append(line)
+        self.written += 1
+        if self.spool is not None:
+            self.spool.write_line(line)
+
+    def flush(self):
+        if self.spool is not None:
+            self.spool.flush()
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.flush()
+            self.spool.stream.close()
+
+    def drain(self):
+        """Returns (and forgets) the lines written since the last call."""
+        lines = []
+        pending = self.pending
+        while pending:
+            lines.append(pending.popleft())
+        return lines
+
 
 class BusSimulationGUI:
     def __init__(self, root):
+        load_tk()
         self.root = root
         self.root.title("Bus Simulation Dashboard")
         self.root.geometry("1200x800")
@@ -50,7 +656,23 @@ class BusSimulationGUI:
         
         # Simulation control variables
         self.paused = False
-        self.simulation_speed = 1000  # Default delay in milliseconds
+        self.simulation_speed = 1000  # Default delay in milliseconds; 0 runs flat out
+        self.policy = DEFAULT_POLICY
+        
+        # Engine thread and its controls; the engine only talks to the UI through self.events
+        self.worker = None
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.running = threading.Event()  # cleared while paused
+        self.running.set()
+        self.stop_requested = threading.Event()
+        self.poll_job = None
+        self.heap_mirror = []  # the UI's copy of the engine's heap, slot by slot
+        self.log = None        # LogChannel of the current run
+        self.event_log = None  # EventLog being scrubbed, once a run has finished
+        self.recording = None  # temporary file the current run is recorded to
+        self.position = 0      # events of event_log shown
+        self.log_limit = LOG_LINES
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         
         # Create styles
         style = ttk.Style()
@@ -58,6 +680,7 @@ class BusSimulationGUI:
         style.configure('TButton', font=('Arial', 10), borderwidth=1)
         style.configure('TNotebook', background="#f5f5f5")
         style.configure('TNotebook.Tab', padding=[12, 6], font=('Arial', 10))
+        style.configure('Treeview', rowheight=RECORD_ROW_HEIGHT)
         
         # Create main frame
         main_frame = tk.Frame(root, bg="#f5f5f5")
@@ -107,6 +730,16 @@ class BusSimulationGUI:
         )
         self.pause_button.grid(row=0, column=3, padx=15, pady=10, sticky="w")
         
+        # Log options: how many lines the log tab keeps, and an optional file for the full log
+        tk.Label(input_frame, text="Log lines:", bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=4, padx=5, pady=10, sticky="w")
+        self.log_lines = tk.Spinbox(input_frame, from_=100, to=1000000, increment=1000, width=8, font=("Arial", 10))
+        self.log_lines.delete(0, tk.END)
+        self.log_lines.insert(0, str(LOG_LINES))
+        self.log_lines.grid(row=0, column=5, padx=5, pady=10, sticky="w")
+        tk.Label(input_frame, text="Spool log to:", bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=6, padx=5, pady=10, sticky="w")
+        self.spool_entry = tk.Entry(input_frame, width=20, font=("Arial", 10))
+        self.spool_entry.grid(row=0, column=7, padx=5, pady=10, sticky="w")
+        
         # Speed control slider
         speed_frame = tk.Frame(control_frame, bg="#e0e0e0")
         speed_frame.pack(fill=tk.X, pady=(5, 0))
@@ -115,7 +748,7 @@ class BusSimulationGUI:
         
         self.speed_slider = Scale(
             speed_frame,
-            from_=500,
+            from_=0,  # no delay: steps are coalesced into frames
             to=3000,
             orient="horizontal",
             resolution=100,
@@ -137,11 +770,13 @@ class BusSimulationGUI:
         self.buses_departed = tk.StringVar(value="Departed: 0")
         self.buses_delayed = tk.StringVar(value="Delayed: 0")
         self.buses_cancelled = tk.StringVar(value="Cancelled: 0")
+        self.heap_work = tk.StringVar(value="Heap: 0 ops, 0 comparisons, 0 swaps")
         
         tk.Label(self.stats_frame, textvariable=self.buses_processed, bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=0, padx=15, pady=5, sticky="w")
         tk.Label(self.stats_frame, textvariable=self.buses_departed, bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=1, padx=15, pady=5, sticky="w")
         tk.Label(self.stats_frame, textvariable=self.buses_delayed, bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=2, padx=15, pady=5, sticky="w")
         tk.Label(self.stats_frame, textvariable=self.buses_cancelled, bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=3, padx=15, pady=5, sticky="w")
+        tk.Label(self.stats_frame, textvariable=self.heap_work, bg="#e0e0e0", font=("Arial", 10)).grid(row=0, column=4, padx=15, pady=5, sticky="w")
         
         # Content frame with tabs
         content_frame = tk.Frame(main_frame, bg="#ffffff")
@@ -161,12 +796,29 @@ class BusSimulationGUI:
         self.heap_info = tk.Label(self.heap_info_frame, text="Current Heap: 0 buses", font=("Arial", 12), bg="#ffffff")
         self.heap_info.pack(pady=10)
         
+        # Timeline over the recorded run: scrub, or step one event at a time
+        timeline_frame = tk.Frame(self.heap_tab, bg="#ffffff")
+        timeline_frame.pack(fill=tk.X, padx=10)
+        self.step_back_button = ttk.Button(timeline_frame, text="◀", width=3, command=lambda: self.seek(self.position - 1))
+        self.step_back_button.pack(side=tk.LEFT)
+        self.timeline = Scale(timeline_frame, from_=0, to=0, orient="horizontal", showvalue=False,
+                              command=lambda value: self.seek(int(value)))
+        self.timeline.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.step_forward_button = ttk.Button(timeline_frame, text="▶", width=3, command=lambda: self.seek(self.position + 1))
+        self.step_forward_button.pack(side=tk.LEFT)
+        self.timeline_label = tk.Label(timeline_frame, text="No recorded run", font=("Arial", 10), bg="#ffffff", width=22)
+        self.timeline_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(timeline_frame, text="Open Log...", command=self.open_event_log).pack(side=tk.LEFT, padx=5)
+        ttk.Button(timeline_frame, text="Save Log...", command=self.save_event_log).pack(side=tk.LEFT)
+        self.set_timeline(None)
+        
         # Canvas for heap visualization
         self.heap_canvas_frame = tk.Frame(self.heap_tab, bg="#ffffff")
         self.heap_canvas_frame.pack(fill=tk.BOTH, expand=True)
         
         self.heap_canvas = Canvas(self.heap_canvas_frame, bg="#ffffff", highlightthickness=0)
         self.heap_canvas.pack(fill=tk.BOTH, expand=True)
+        self.heap_view = HeapRenderer(self.heap_canvas, self.show_node_details)
         
         # Bus details panel
         self.bus_details_frame = tk.Frame(self.heap_tab, bg="#f0f0f0", height=150, pady=10, padx=10)
@@ -191,21 +843,9 @@ class BusSimulationGUI:
         self.records_frame = tk.Frame(self.records_tab, bg="#ffffff")
         self.records_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Create a treeview for records
-        columns = ("Action", "Bus", "Destination", "Departing Time", "Passengers", "Capacity")
-        self.records_tree = ttk.Treeview(self.records_frame, columns=columns, show='headings')
-        
-        # Define headings
-        for col in columns:
-            self.records_tree.heading(col, text=col)
-            self.records_tree.column(col, width=100)
-        
-        self.records_tree.pack(fill=tk.BOTH, expand=True)
-        
-        # Scrollbar for treeview
-        tree_scroll = ttk.Scrollbar(self.records_frame, orient="vertical", command=self.records_tree.yview)
-        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.records_tree.configure(yscrollcommand=tree_scroll.set)
+        # Virtual table over the run's record store
+        self.record_store = RecordStore()
+        self.records_table = RecordTable(self.records_frame, self.record_store)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -227,171 +867,332 @@ class BusSimulationGUI:
         self.departed_count = 0
         self.delayed_count = 0
         self.cancelled_count = 0
+        self.heap_counters = None  # heap_helperfunctions.HeapCounters of the current run
     
     def toggle_pause(self):
         """Toggle the pause state of the simulation"""
         self.paused = not self.paused
         
         if self.paused:
+            self.running.clear()
             self.pause_button.config(text="Resume")
             self.status_var.set("Simulation paused")
         else:
+            self.running.set()
             self.pause_button.config(text="Pause")
             self.status_var.set("Simulation resumed")
-            # Continue the simulation if it was paused
-            self.root.event_generate("<<ContinueSimulation>>")
     
     def update_speed(self, value):
         """Update the simulation speed based on slider value"""
         self.simulation_speed = int(value)
         
-    def time_add_30(self, time):
-        """Adds 30 minutes to a time in HHMM format."""
-        hours = time // 100
-        minutes = time % 100
-        minutes += 30
-        if minutes >= 60:
-            minutes -= 60
-            hours += 1
-        if hours >= 24:
-            hours -= 24
-        return hours * 100 + minutes
-    
     def passengers_increase(self, passengers):
-        increase = 0.2*(passengers)
-        new = passengers + math.ceil(increase)
-        return new
-
-    def build_min_heap(self, heap):
-        """Builds a min-heap by successive insertions."""
-        temp = []
-        for bus in heap:
-            insert_min(temp, bus)
-        heap.clear()
-        heap.extend(temp)
-
-    def draw_heap(self, heap):
-        """Draw the heap as a binary tree on the canvas"""
-        self.heap_canvas.delete("all")
-        
-        if not heap:
-            self.heap_info.config(text="Current Heap: 0 buses")
-            return
-        
+        return self.policy.passengers_increase(passengers)
+
+    def draw_heap(self, heap, touched=None):
+        """
+        Draw the heap as a binary tree on the canvas.
+
+        Only the slots in ``touched`` (all slots if None) are relabelled;
+        see HeapRenderer.
+        """
         self.heap_info.config(text=f"Current Heap: {len(heap)} buses")
-        
-        # Calculate dimensions
-        canvas_width = self.heap_canvas.winfo_width()
-        canvas_height = self.heap_canvas.winfo_height()
-        
-        # Ensure we have dimensions (wait for canvas to be rendered)
-        if canvas_width <= 1:
-            canvas_width = 1000
-        if canvas_height <= 1:
-            canvas_height = 600
-            
-        # Calculate number of levels in the heap
-        levels = math.ceil(math.log2(len(heap) + 1))
-        
-        # Node radius - make nodes slightly larger
-        radius = min(35, canvas_width / (2 ** levels) / 2.5)
-        
-        # Vertical spacing between levels
-        level_height = canvas_height / (levels + 1)
-        
-        # Draw nodes
-        nodes = []
-        for i, bus in enumerate(heap):
-            # Calculate position
-            level = math.floor(math.log2(i + 1))
-            nodes_in_level = 2 ** level
-            position_in_level = i - (2 ** level - 1)
-            
-            # Horizontal position calculations
-            section_width = canvas_width / (nodes_in_level + 1)
-            x = section_width * (position_in_level + 1)
-            
-            # Vertical position
-            y = level_height * (level + 1)
-            
-            # Create and draw node
-            node = TreeNode(self.heap_canvas, x, y, bus, radius)
-            nodes.append(node)
-            
-            # Draw connection to parent if not root
-            if i > 0:
-                parent_index = (i - 1) // 2
-                parent_node = nodes[parent_index]
-                node.draw_connection(parent_node.x, parent_node.y)
-            
-            node.draw()
-            
-            # Add tooltip behavior
-            def create_tooltip(node_index):
-                def show_tooltip(event):
-                    self.current_bus_info.delete(1.0, tk.END)
-                    self.current_bus_info.insert(tk.END, nodes[node_index].tooltip_text)
-                return show_tooltip
-            
-            self.heap_canvas.tag_bind(node.circle, "<Button-1>", create_tooltip(i))
-            self.heap_canvas.tag_bind(node.text, "<Button-1>", create_tooltip(i))
-        
-        # Add instructions
-        self.heap_canvas.create_text(
-            canvas_width/2, 30, 
-            text="Click on a bus node to see details", 
-            font=("Arial", 10, "italic"), 
-            fill="#666666"
-        )
-        
-        self.heap_canvas.update()
+        self.heap_view.render(heap, touched)
+        self.heap_canvas.update_idletasks()
+    
+    def show_node_details(self, node):
+        """Shows the full details of a clicked heap node."""
+        self.current_bus_info.delete(1.0, tk.END)
+        self.current_bus_info.insert(tk.END, node.labels()[1])
 
     def run_simulation(self):
+        import tempfile
+
+        self.stop_worker()
+        
         # Clear previous results
         self.output_text.delete(1.0, tk.END)
-        self.heap_canvas.delete("all")
+        self.heap_view.reset()
         self.current_bus_info.delete(1.0, tk.END)
         
         # Reset pause button state
         self.paused = False
+        self.running.set()
+        self.stop_requested = threading.Event()  # per run: a stale engine thread stays stopped
         self.pause_button.config(text="Pause")
         
-        # Clear the treeview
-        for item in self.records_tree.get_children():
-            self.records_tree.delete(item)
+        # Start an empty record store and recording
+        self.record_store = RecordStore()
+        self.set_timeline(None)
+        self.discard_recording()
+        self.records_table.set_store(self.record_store)
         
         # Reset counters
         self.processed_count = 0
         self.departed_count = 0
         self.delayed_count = 0
         self.cancelled_count = 0
+        self.heap_counters = heap_helperfunctions.HeapCounters()
         self.update_stats()
         
+        filename = self.file_entry.get()
         try:
-            filename = self.file_entry.get()
-            self.status_var.set(f"Running simulation with file: {filename}")
-            self.root.update()
-            
-            # Capture print outputs
-            old_stdout = sys.stdout
-            output_capture = StringIO()
-            sys.stdout = output_capture
-            
-            # Run simulation but with customized functions to update GUI
-            self.simulation(filename)
-            
-            # Restore stdout
-            sys.stdout = old_stdout
-            
-            # Display output
-            output_text = output_capture.getvalue()
-            self.output_text.insert(tk.END, output_text)
-            
-            self.status_var.set("Simulation completed successfully")
-            
+            self.log_limit = max(1, int(self.log_lines.get()))
+            self.log = LogChannel(self.log_limit, self.spool_entry.get().strip() or None)
+            fd, self.recording = tempfile.mkstemp(suffix=EVENT_LOG_SUFFIX)
+            os.close(fd)
+        except (ValueError, OSError) as e:
+            self.status_var.set(f"Error: {str(e)}")
+            return
+        self.status_var.set(f"Running simulation with file: {filename}")
+        
+        # Run the engine on its own thread; poll_events shows what it posts
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.heap_mirror = []
+        self.worker = threading.Thread(target=self.run_engine, daemon=True,
+                                       args=(filename, self.events, self.log, self.recording,
+                                             self.record_store.locations, self.heap_counters,
+                                             self.stop_requested))
+        self.worker.start()
+        self.poll_job = self.root.after(FRAME_MS, self.poll_events)
+    
+    def run_engine(self, filename, events, log, recording, locations, counters, stop):
+        """
+        Engine thread body: runs the simulation, recording it, and posts how
+        it ended. Everything it writes to belongs to this run alone, so a
+        thread outliving stop_worker's join cannot disturb the next run.
+        """
+        recorder = None
+        try:
+            recorder = EventLogWriter(recording)
+            self.simulation(filename, log, events, recorder, locations, counters, stop)
+            recorder.close()
+            recorder = None
+            self.post(events, ("done",), stop)
         except Exception as e:
+            self.post(events, ("error", str(e)), stop)
+        finally:
+            if recorder is not None:
+                recorder.close()
+            log.close()
+    
+    def post(self, events, event, stop):
+        """
+        Hands an event to the UI from the engine thread, waiting while the
+        queue is full.
+
+        Returns:
+        bool: False if the run was stopped before the event could be posted.
+        """
+        while not stop.is_set():
+            try:
+                events.put(event, timeout=POST_WAIT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def poll_events(self):
+        """
+        Applies up to STEPS_PER_FRAME events the engine posted since the
+        last frame, then redraws once. At full speed many steps land in one
+        frame, so drawing rarely holds the engine back, and the bounded
+        queue keeps a fast engine from running away from the UI.
+        """
+        self.poll_job = None
+        touched = set()
+        current_bus = None
+        finished = None
+        try:
+            for _ in range(STEPS_PER_FRAME):
+                if finished is not None:
+                    break
+                event = self.events.get_nowait()
+                if event[0] == "step":
+                    _, record, current_bus, size, changes = event
+                    self.apply_step(record, size, changes)
+                    if touched is not None:
+                        touched.update(slot for slot, _ in changes)
+                elif event[0] == "start":
+                    self.heap_mirror = event[1]
+                    touched = None
+                else:
+                    finished = event
+        except queue.Empty:
+            pass
+        
+        if current_bus is not None:
+            bus_number, location, time, passengers, capacity = current_bus
+            # Update current bus details
+            self.current_bus_info.delete(1.0, tk.END)
+            self.current_bus_info.insert(tk.END, 
+                f"Bus: {bus_number}\nTo: {location}\nTime: {minutes_to_hhmm(time)}\n" +
+                f"Passengers: {passengers}/{capacity}\n" +
+                f"Load Factor: {passengers/capacity:.2f}"
+            )
+        if touched is None or touched or current_bus is not None:
+            self.update_stats()
+            self.draw_heap(self.heap_mirror, touched)
+            self.records_table.refresh()
+        self.append_log(self.log.drain())
+        
+        if finished is None:
+            self.poll_job = self.root.after(FRAME_MS, self.poll_events)
+        elif finished[0] == "done":
+            self.status_var.set("Simulation completed successfully")
+            self.load_event_log(self.recording)
+        else:
+            self.status_var.set(f"Error: {finished[1]}")
+            self.output_text.insert(tk.END, f"Error: {finished[1]}")
+    
+    def append_log(self, lines):
+        """
+        Adds lines to the log tab in one insert, then trims the oldest so
+        it keeps at most log_limit lines. Follows the end unless the user
+        has scrolled up.
+        """
+        if not lines:
+            return
+        text = self.output_text
+        following = text.yview()[1] >= 1.0
+        text.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(text.index("end-1c").split(".")[0]) - 1 - self.log_limit
+        if excess > 0:
+            text.delete("1.0", f"{excess + 1}.0")
+        if following:
+            text.see(tk.END)
+    
+    def apply_step(self, record, size, changes):
+        """Applies one engine step to the counters, the records table and the heap mirror."""
+        self.processed_count += 1
+        action = record[0]
+        if action == "DEPARTED":
+            self.departed_count += 1
+        elif action == "DELAYED":
+            self.delayed_count += 1
+        else:
+            self.cancelled_count += 1
+        self.record_store.append(record)
+        
+        mirror = self.heap_mirror
+        del mirror[size:]
+        for slot, bus in changes:
+            mirror[slot] = bus
+    
+    def stop_worker(self):
+        """Stops a running engine thread and the UI polling."""
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        if self.worker is not None and self.worker.is_alive():
+            self.stop_requested.set()
+            self.running.set()  # wake it if paused
+            self.worker.join(timeout=1.0)
+        self.worker = None
+    
+    def close(self):
+        """Window close: stop the engine before tearing down Tk."""
+        self.stop_worker()
+        self.discard_recording()
+        self.root.destroy()
+    
+    def discard_recording(self):
+        """Deletes the temporary recording of the last run."""
+        if self.recording is not None:
+            try:
+                os.remove(self.recording)
+            except OSError:
+                pass
+            self.recording = None
+    
+    def set_timeline(self, log):
+        """Points the timeline at an EventLog, or disables it (None)."""
+        self.event_log = log
+        state = tk.NORMAL if log is not None else tk.DISABLED
+        for widget in (self.timeline, self.step_back_button, self.step_forward_button):
+            widget.configure(state=state)
+        if log is None:
+            self.timeline_label.config(text="No recorded run")
+            return
+        self.position = len(log)
+        self.timeline.configure(to=len(log))
+        self.timeline.set(len(log))
+        self.timeline_label.config(text=f"Event {len(log)} of {len(log)}")
+    
+    def load_event_log(self, path):
+        """Loads a recorded run for scrubbing; the view starts at its end."""
+        try:
+            log = EventLog(path)
+        except (OSError, ValueError) as e:
             self.status_var.set(f"Error: {str(e)}")
-            self.output_text.insert(tk.END, f"Error: {str(e)}")
+            return
+        if path != self.recording:
+            # An opened log: its records replace whatever the last run left
+            self.discard_recording()
+            self.record_store = RecordStore(log.records())
+            self.records_table.set_store(self.record_store)
+        self.set_timeline(log)
+        self.heap_mirror = list(log.heap_at(len(log)))
+        self.seek(len(log), force=True)
+    
+    def open_event_log(self):
+        path = filedialog.askopenfilename(filetypes=[("Event logs", "*" + EVENT_LOG_SUFFIX), ("All files", "*")])
+        if not path:
+            return
+        self.stop_worker()
+        self.load_event_log(path)
+        if self.event_log is not None:
+            self.status_var.set(f"Loaded event log: {path}")
+    
+    def save_event_log(self):
+        if self.recording is None or self.event_log is None:
+            self.status_var.set("No recorded run to save")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=EVENT_LOG_SUFFIX,
+                                            filetypes=[("Event logs", "*" + EVENT_LOG_SUFFIX)])
+        if path:
+            import shutil
+
+            shutil.copyfile(self.recording, path)
+            self.status_var.set(f"Saved event log: {path}")
+    
+    def seek(self, position, force=False):
+        """
+        Shows the recorded run as it was after ``position`` events.
+
+        The heap comes from EventLog.seek (nearest keyframe plus replay),
+        which also names the slots that changed since the last seek; only
+        those are copied into the mirror and redrawn.
+        """
+        log = self.event_log
+        if log is None:
+            return
+        position = max(0, min(position, len(log)))
+        if position == self.position and not force:
+            return
+        self.position = position
+        heap, touched = log.seek(position)
+        mirror = self.heap_mirror
+        if touched is None:
+            mirror[:] = heap
+        else:
+            del mirror[len(heap):]
+            mirror.extend(heap[slot] for slot in range(len(mirror), len(heap)))
+            for slot in touched:
+                mirror[slot] = heap[slot]
+        
+        counts = log.counts_at(position)
+        self.processed_count = position
+        self.departed_count = counts["DEPARTED"]
+        self.delayed_count = counts["DELAYED"]
+        self.cancelled_count = counts["CANCELLED"]
+        self.update_stats()
+        self.timeline.set(position)
+        self.timeline_label.config(text=f"Event {position} of {len(log)}")
+        self.current_bus_info.delete(1.0, tk.END)
+        if position:
+            self.current_bus_info.insert(tk.END, f"Event {position}: " + format_record(log.record(position - 1), self.policy.max_delays))
+        self.draw_heap(mirror, touched)
     
     def update_stats(self):
         """Update the statistics display"""
@@ -399,138 +1200,98 @@ class BusSimulationGUI:
         self.buses_departed.set(f"Departed: {self.departed_count}")
         self.buses_delayed.set(f"Delayed: {self.delayed_count}")
         self.buses_cancelled.set(f"Cancelled: {self.cancelled_count}")
+        counters = self.heap_counters
+        if counters is not None:
+            ops = sum(counters.calls[name] for name in ("insert_min", "delete_min", "replace_min"))
+            self.heap_work.set(f"Heap: {ops} ops, {counters.comparisons} comparisons, {counters.swaps} swaps")
     
-    def add_record_to_tree(self, action, bus_number, location, time, passengers, capacity):
-        """Add a record to the treeview"""
-        self.records_tree.insert(
-            "", "end", 
-            values=(action, bus_number, location, time, passengers, capacity)
-        )
-    
-    def wait_if_paused(self):
-        """Wait if the simulation is paused"""
-        if self.paused:
-            self.status_var.set("Simulation paused - waiting to resume")
-            # Create a variable to track if we should continue
-            self.root.wait_variable_or_event = True
-            
-            # Setup event handler to exit waiting
-            def continue_handler(event):
-                self.root.wait_variable_or_event = False
-            
-            self.root.bind("<<ContinueSimulation>>", continue_handler)
-            
-            # Wait until no longer paused
-            while self.paused and self.root.wait_variable_or_event:
-                self.root.update()
-                self.root.after(100)  # Short delay to prevent CPU hogging
+    def wait_if_paused(self, stop):
+        """
+        Blocks the engine thread while paused (without polling).
+
+        Returns:
+        bool: False once the run has been asked to stop.
+        """
+        self.running.wait()
+        return not stop.is_set()
     
-    def simulation(self, filename):
+    def simulation(self, filename, out, events, recorder=None, locations=None, counters=None, stop=None):
+        """
+        Runs the simulation step by step on the engine thread, writing the
+        log to out (a LogChannel). Never touches Tk: each step is posted
+        to ``events`` as ("step", record, bus, heap_size, changed_slots)
+        for poll_events to show. Buses are held as typed columns, with city
+        codes interned in ``locations`` (the record store's table), and the
+        heap's work is counted into ``counters`` if given. The run ends
+        early once ``stop`` (the run's stop event) is set.
+        """
+        if stop is None:
+            stop = self.stop_requested
         # Step 1: Read data
-        buses = read(filename)  # (bus_number, location, time, passengers, capacity)
+        buses = load_columns(filename, locations=locations)  # (bus_number, location, time, passengers, capacity)
         
         # Step 2: Build a min-heap based on current time
-        self.build_min_heap(buses)
+        buses = IndexedHeap(buses)
+        buses.counters = counters
         
-        # Track delays: bus_number -> number of delays
-        delay_count = {}
+        # Track delays: trip id (schedule row) -> number of delays
+        delay_count = [0] * len(buses)
         
         # Log what happens with each bus
         records = []
         
         # Initial heap visualization
-        self.root.update()
-        self.draw_heap(buses)
-        self.root.update()
+        if not self.post(events, ("start", list(buses)), stop):
+            return records
+        if recorder is not None:
+            recorder.keyframe(buses)
         
-        print("Simulation started with file:", filename)
-        print("Initial heap built with", len(buses), "buses.")
+        out.write_line(f"Simulation started with file: {filename}")
+        out.write_line(f"Initial heap built with {len(buses)} buses.")
         
         # Step 3: Simulation loop
         while buses:
-            # Check if simulation is paused
-            self.wait_if_paused()
-            
-            self.processed_count += 1
-            self.update_stats()
-            
-            current_bus = buses[0]  # Peek at the first bus (root)
-            bus_number, location, time, passengers, capacity = current_bus
-            
-            # Update current bus details
-            self.current_bus_info.delete(1.0, tk.END)
-            self.current_bus_info.insert(tk.END, 
-                f"Bus: {bus_number}\nTo: {location}\nTime: {time}\n" +
-                f"Passengers: {passengers}/{capacity}\n" +
-                f"Load Factor: {passengers/capacity:.2f}"
-            )
-            self.root.update()
+            # Check if simulation is paused (or stopped)
+            if not self.wait_if_paused(stop):
+                out.write_line("Simulation stopped.")
+                break
             
-            if passengers < 0.7 * capacity:
-                # Check delay count
-                if bus_number not in delay_count:
-                    delay_count[bus_number] = 1
-                else:
-                    delay_count[bus_number] += 1
-                
-                if delay_count[bus_number] > 2:
-                    # Cancel the bus
-                    delete_min(buses)
-                    record = f"Bus {bus_number} to {location} at {time} CANCELLED after 2 delays."
-                    records.append(record)
-                    print(record)
-                    
-                    self.cancelled_count += 1
-                    self.update_stats()
-                    
-                    # Add to records tree
-                    self.add_record_to_tree("CANCELLED", bus_number, location, time, passengers, capacity)
-                else:
-                    # Delay the bus by 30 minutes
-                    new_time = self.time_add_30(time)
-                    new_passengers = self.passengers_increase(passengers)
-                    delayed_bus = (bus_number, location, new_time, new_passengers, capacity)
-                    # delayed_bus = (bus_number, location, new_time, passengers, capacity)
-                    
-                    delete_min(buses)
-                    insert_min(buses, delayed_bus)
-                    
-                    record = f"Bus {bus_number} to {location} DELAYED to {new_time} (Passengers: {passengers}, Capacity: {capacity})"
-                    print(record)
-                    records.append(record)
-                    
-                    self.delayed_count += 1
-                    self.update_stats()
-                    
-                    # Add to records tree
-                    self.add_record_to_tree("DELAYED", bus_number, location, new_time, passengers, capacity)
+            current_bus = buses.peek()  # Peek at the first bus (root)
+            # A delayed bus sifts down from the root; otherwise the last bus
+            # moves to the root and sifts down
+            last = buses.slot_id(len(buses) - 1)
+            trip, record, new_passengers = process_next(buses, delay_count, self.policy)
+            touched = sift_path(buses, trip if new_passengers is not None else last)
             
-            else:
-                # Depart the bus
-                delete_min(buses)
-                record = f"Bus {bus_number} to {location} DEPARTED at {time} (Passengers: {passengers}, Capacity: {capacity})"
-                print(record)
-                records.append(record)
-                
-                self.departed_count += 1
-                self.update_stats()
-                
-                # Add to records tree
-                self.add_record_to_tree("DEPARTED", bus_number, location, time, passengers, capacity)
+            out.write_line(format_record(record, self.policy.max_delays))
+            records.append(record)
+            if recorder is not None:
+                recorder.event(record, buses, new_passengers)
             
-            # Update heap visualization
-            self.draw_heap(buses)
-            self.root.update()
+            # Hand the step to the UI with the slots the sift touched
+            step = ("step", record, current_bus, len(buses), [(slot, buses[slot]) for slot in touched])
+            if not self.post(events, step, stop):
+                out.write_line("Simulation stopped.")
+                break
             
-            # Use configurable simulation speed
-            self.root.after(self.simulation_speed)
+            # Use configurable simulation speed (an interruptible sleep)
+            if self.simulation_speed:
+                stop.wait(self.simulation_speed / 1000)
         
-        print("\nSimulation complete.")
-        print("\n=== FINAL RECORDS ===")
-        for record in records:
-            print(record)
+        print_summary(records, out, self.policy)
+        out.flush()
+        return records
 
-if __name__ == "__main__":
+def main(filename=None):
+    """Opens the dashboard, with ``filename`` in the schedule box if given."""
+    load_tk()
     root = tk.Tk()
     app = BusSimulationGUI(root)
-    root.mainloop()
\ No newline at end of file
+    if filename is not None:
+        app.file_entry.delete(0, tk.END)
+        app.file_entry.insert(0, filename)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,294 @@
+import struct
+from array import array
+from bisect import bisect_right
+
+from heap_helperfunctions import _ID_BITS, IndexedHeap
+from record_store import ACTIONS
+
+MAGIC = b"BUSEVLOG"
+VERSION = 2
+SUFFIX = ".buslog"
+
+# Events between queue snapshots. A queue of n buses is snapshotted every
+# n / KEYFRAME_SPREAD events, so recording packs about KEYFRAME_SPREAD queue
+# entries per event, but at least every KEYFRAME_INTERVAL events and at
+# most every MAX_KEYFRAME_INTERVAL, which bounds the events a seek replays.
+# Queues past MAX_KEYFRAME_INTERVAL * KEYFRAME_SPREAD buses pay for that
+# bound in log size.
+KEYFRAME_INTERVAL = 1024
+KEYFRAME_SPREAD = 4
+MAX_KEYFRAME_INTERVAL = 16384
+
+_DELAYED = ACTIONS.index("DELAYED")
+
+# File layout: header, then tagged blocks in the order they were written.
+#   b"L" location:  length, city code (UTF-8); ids count up from 0
+#   b"E" events:    count, then count x _EVENT
+#   b"K" keyframe:  _KEYFRAME, then size x _ENTRY (the queue after ``events`` events)
+_HEADER = struct.Struct("<8sII")        # magic, version, keyframe interval
+_LENGTH = struct.Struct("<I")
+# action, location id, bus number, time, passengers, capacity, passengers after the
+# event; counts are 64-bit like every numeric schedule field (see input.MAX_DIGITS)
+_EVENT = struct.Struct("<BIqqqqq")
+_KEYFRAME = struct.Struct("<QQQ")       # events before it, payload ids handed out, queue size
+_ENTRY = struct.Struct("<qqIqq")        # packed key, bus number, location id, passengers, capacity
+
+
+class EventLogWriter:
+    """
+    Records a run as a compact binary event log.
+
+    Every processed bus becomes one fixed-size event, and every
+    ``keyframe_interval`` events (or every queue size / KEYFRAME_SPREAD
+    events, if that is more, up to MAX_KEYFRAME_INTERVAL) the whole queue
+    is snapshotted, so an EventLog
+    can later rebuild the state after any event by replaying at most one
+    interval. Events are buffered and written between keyframes.
+
+    Parameters:
+    destination (str or binary file): Where the log is written.
+    keyframe_interval (int): Events between queue snapshots.
+    """
+
+    def __init__(self, destination, keyframe_interval=KEYFRAME_INTERVAL):
+        self._owns_file = not hasattr(destination, "write")
+        self.file = open(destination, "wb") if self._owns_file else destination
+        self.keyframe_interval = keyframe_interval
+        self.events = 0
+        self._location_ids = {}
+        self._actions = {name: i for i, name in enumerate(ACTIONS)}
+        self._pending = []
+        self._next_keyframe = 0
+        self.file.write(_HEADER.pack(MAGIC, VERSION, keyframe_interval))
+
+    def _location(self, city_code):
+        location = self._location_ids.get(city_code)
+        if location is None:
+            self._flush_events()
+            location = self._location_ids[city_code] = len(self._location_ids)
+            name = city_code.encode()
+            self.file.write(b"L" + _LENGTH.pack(len(name)) + name)
+        return location
+
+    def _flush_events(self):
+        if self._pending:
+            self.file.write(b"E" + _LENGTH.pack(len(self._pending)) + b"".join(self._pending))
+            self._pending = []
+
+    def keyframe(self, queue):
+        """Snapshots a queue (IndexedHeap or CalendarQueue) as it is now."""
+        entries = queue.entries()
+        self._flush_events()
+        ids = self._location_ids
+        pack = _ENTRY.pack
+        body = []
+        for key, (bus_number, city_code, _, passengers, capacity) in entries:
+            location = ids.get(city_code)
+            if location is None:
+                location = self._location(city_code)
+            body.append(pack(key, bus_number, location, passengers, capacity))
+        self.file.write(b"K" + _KEYFRAME.pack(self.events, len(queue.payloads), len(entries)))
+        self.file.write(b"".join(body))
+        spread = min(len(entries) // KEYFRAME_SPREAD, MAX_KEYFRAME_INTERVAL)
+        self._next_keyframe = self.events + max(self.keyframe_interval, spread)
+
+    def event(self, record, queue, new_passengers=None):
+        """
+        Logs one structured record, after ``queue`` has been updated for it.
+
+        Parameters:
+        record (tuple): (action, bus_number, location, time, passengers, capacity).
+        queue (IndexedHeap or CalendarQueue): The queue, for keyframes.
+        new_passengers (int or None): Passengers on a delayed bus when it is
+                                      re-queued; None if unchanged.
+        """
+        action, bus_number, city_code, time, passengers, capacity = record
+        location = self._location_ids.get(city_code)
+        if location is None:
+            location = self._location(city_code)
+        self._pending.append(_EVENT.pack(
+            self._actions[action], location, bus_number, time, passengers, capacity,
+            passengers if new_passengers is None else new_passengers))
+        self.events += 1
+        if self.events >= self._next_keyframe:
+            self.keyframe(queue)
+
+    def close(self):
+        self._flush_events()
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class EventLog:
+    """
+    A recorded run, loaded for analysis or replay without re-running the
+    simulation.
+
+    Events are held as typed columns (``action`` as indexes into ACTIONS,
+    ``location`` as ids into ``locations``); keyframes stay as raw bytes and
+    are decoded only when a seek needs them.
+
+    Parameters:
+    source (str or bytes): Path of a log written by EventLogWriter, or its contents.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            data = bytes(source)
+        else:
+            with open(source, "rb") as f:
+                data = f.read()
+        magic, version, interval = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a bus simulation event log (or an unsupported version)")
+        self.keyframe_interval = interval
+        self.locations = []
+        self.action = array("b")
+        self.location = array("i")
+        self.bus_number = array("q")
+        self.time = array("q")
+        self.passengers = array("q")
+        self.capacity = array("q")
+        self.new_passengers = array("q")
+        self._keyframe_events = []   # events before each keyframe
+        self._keyframe_offsets = []  # where each keyframe's _KEYFRAME header starts
+        self._data = data
+        self._cursor = None          # (events applied, heap) of the last seek
+        self._counts = None
+
+        columns = (self.action, self.location, self.bus_number, self.time,
+                   self.passengers, self.capacity, self.new_passengers)
+        offset = _HEADER.size
+        while offset < len(data):
+            tag = data[offset:offset + 1]
+            offset += 1
+            if tag == b"E":
+                (count,) = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                end = offset + count * _EVENT.size
+                for values in _EVENT.iter_unpack(data[offset:end]):
+                    for column, value in zip(columns, values):
+                        column.append(value)
+                offset = end
+            elif tag == b"L":
+                (length,) = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                self.locations.append(data[offset:offset + length].decode())
+                offset += length
+            elif tag == b"K":
+                events, _, size = _KEYFRAME.unpack_from(data, offset)
+                self._keyframe_events.append(events)
+                self._keyframe_offsets.append(offset)
+                offset += _KEYFRAME.size + size * _ENTRY.size
+            else:
+                raise ValueError(f"corrupt event log: unknown block {tag!r} at byte {offset - 1}")
+        if not self._keyframe_events or self._keyframe_events[0] != 0:
+            raise ValueError("event log has no initial keyframe")
+
+    def __len__(self):
+        return len(self.time)
+
+    def record(self, i):
+        """Returns event i as a structured record, like simulation() returns."""
+        return (ACTIONS[self.action[i]], self.bus_number[i], self.locations[self.location[i]],
+                self.time[i], self.passengers[i], self.capacity[i])
+
+    def records(self, start=0, stop=None):
+        """Returns events start..stop-1 as structured records."""
+        return [self.record(i) for i in range(start, len(self) if stop is None else stop)]
+
+    def counts_at(self, position):
+        """
+        Returns how many events of each action the first ``position``
+        events hold, as {action: count}.
+        """
+        if self._counts is None:
+            self._counts = counts = [array("q", [0]) for _ in ACTIONS]
+            for action in self.action:
+                for code, column in enumerate(counts):
+                    column.append(column[-1] + (code == action))
+        return {name: self._counts[code][position] for code, name in enumerate(ACTIONS)}
+
+    def _restore(self, index):
+        """Decodes keyframe ``index`` into an IndexedHeap."""
+        offset = self._keyframe_offsets[index]
+        _, ids, size = _KEYFRAME.unpack_from(self._data, offset)
+        offset += _KEYFRAME.size
+        locations = self.locations
+        entries = [(key, (bus_number, locations[location], key >> _ID_BITS, passengers, capacity))
+                   for key, bus_number, location, passengers, capacity
+                   in _ENTRY.iter_unpack(self._data[offset:offset + size * _ENTRY.size])]
+        return IndexedHeap.from_entries(entries, ids)
+
+    def _apply(self, heap, i, changed=None):
+        """Replays event i on a heap, adding the slots it rewrote to ``changed`` if given."""
+        if self.action[i] == _DELAYED:
+            moved = heap.peek_id()
+            heap.replace_top((self.bus_number[i], self.locations[self.location[i]], self.time[i],
+                              self.new_passengers[i], self.capacity[i]))
+        else:
+            moved = heap.slot_id(len(heap) - 1)
+            heap.pop()
+        if changed is not None:
+            # A sift rewrites the path from the root down to where the moved bus settles
+            slot = heap.slot(moved)
+            while slot >= 0:
+                changed.add(slot)
+                slot = (slot - 1) >> 1 if slot else -1
+
+    def seek(self, position):
+        """
+        Rebuilds the queue as it was after the first ``position`` events,
+        and says which heap slots differ from the queue the previous seek
+        (or heap_at) returned.
+
+        The nearest keyframe at or before ``position`` is restored and the
+        events after it are replayed, unless the previous seek already sits
+        between the two; so stepping forward replays one event and stepping
+        back at most one keyframe interval (see EventLogWriter). Replaying
+        forward from the previous seek collects the sift paths it rewrote;
+        after a restore the packed keys of the two queues are compared.
+        Slots past the end of the shorter queue are not listed.
+
+        Returns:
+        tuple: (IndexedHeap, set of slots or None on the first seek). The
+               queue is owned by the log and valid until the next call.
+        """
+        if not 0 <= position <= len(self):
+            raise IndexError(f"position {position} outside 0..{len(self)}")
+        index = bisect_right(self._keyframe_events, position) - 1
+        start = self._keyframe_events[index]
+        cursor = self._cursor
+        if cursor is not None and start <= cursor[0] <= position:
+            start, heap = cursor
+            changed = set()
+            for i in range(start, position):
+                self._apply(heap, i, changed)
+            size = len(heap)
+            changed = {slot for slot in changed if slot < size}
+        else:
+            heap = self._restore(index)
+            for i in range(start, position):
+                self._apply(heap, i)
+            changed = None
+            if cursor is not None:
+                changed = {slot for slot, (old, new) in enumerate(zip(cursor[1].keys, heap.keys)) if old != new}
+        self._cursor = (position, heap)
+        return heap, changed
+
+    def heap_at(self, position):
+        """
+        Rebuilds the queue as it was after the first ``position`` events
+        (see seek).
+
+        Returns:
+        IndexedHeap: The queue, owned by the log and valid until the next call.
+        """
+        return self.seek(position)[0]
+
+
+def load_event_log(path):
+    """Loads an event log written by simulation(..., event_log=path)."""
+    return EventLog(path)
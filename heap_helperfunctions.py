@@ -1,20 +1,379 @@
+import heapq
+import itertools
+import operator
+
+from bus_columns import BusColumns
+
+# An IndexedHeap key packs (time, payload id) into one 64-bit integer, so a
+# single integer comparison orders by time and breaks ties by insertion order.
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+class IndexedHeap:
+    """
+    Min-heap of bus records ordered by time.
+
+    Heap slots hold packed keys (time, payload id) in a plain list, while
+    the records themselves are kept once in ``payloads`` and never move.
+    Pushes and pops run through heapq, whose sifts are in C; the slot
+    layout is the same as the Python sifts below would produce, since keys
+    are unique.
+
+    ``pos`` maps a payload id back to its heap slot (-1 once removed), so a
+    queued record can be re-keyed in place with one sift instead of a
+    delete followed by an insert. Most runs never re-key anything, so the
+    map is only built the first time a caller needs it (update, remove,
+    queued, slot ...); from then on every operation keeps it current with
+    the Python sifts.
+
+    ``counters`` is None, or the HeapCounters this heap's operations are
+    counted into (see count()). Counting takes the Python sifts.
+
+    The object behaves like the plain list heap for reading: ``heap[0]`` is
+    the earliest bus, ``len(heap)`` and iteration follow heap slot order.
+
+    Passing a list of records bulk-loads it in O(n) (see ``heapify``); the
+    list is adopted as the payload store rather than copied. A BusColumns
+    is adopted the same way, keeping the records in typed columns.
+    """
+
+    def __init__(self, records=()):
+        self.keys = []              # heap slot -> packed (time, payload id)
+        self.pos = None             # payload id -> heap slot, -1 if removed; built on demand
+        self.payloads = []          # payload id -> record tuple
+        self.counters = None        # HeapCounters while counted
+        if records:
+            self.heapify(records)
+
+    def heapify(self, records):
+        """
+        Replaces the heap contents with ``records`` using bottom-up (Floyd)
+        construction. Input already sorted by time is a valid heap and is
+        left in that order.
+
+        Parameters:
+        records (list or BusColumns): Bus records (bus_number, location, time, passengers, capacity).
+
+        Returns:
+        None
+        """
+        if not isinstance(records, (list, BusColumns)):
+            records = list(records)
+        n = len(records)
+        if n - 1 > _ID_MASK:
+            raise OverflowError("IndexedHeap holds at most 2**32 records")
+        self.payloads = records
+        times = records.time if isinstance(records, BusColumns) else (record[2] for record in records)
+        self.keys = keys = [(time << _ID_BITS) | pid for pid, time in enumerate(times)]
+        self.pos = None
+        if not all(map(operator.le, keys, itertools.islice(keys, 1, None))):
+            heapq.heapify(keys)
+
+    def rebuild(self):
+        """
+        Restores the heap order of ``keys`` in place (Floyd), keeping every
+        payload id, for callers that edited keys directly.
+        """
+        heapq.heapify(self.keys)
+        if self.pos is not None:
+            self.pos = None
+            self._positions()
+
+    def _positions(self):
+        """Returns the ``pos`` map, building it in O(n) the first time it is needed."""
+        pos = self.pos
+        if pos is None:
+            self.pos = pos = [-1] * len(self.payloads)
+            for slot, key in enumerate(self.keys):
+                pos[key & _ID_MASK] = slot
+        return pos
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __bool__(self):
+        return len(self.keys) > 0
+
+    def __getitem__(self, i):
+        return self.payloads[self.keys[i] & _ID_MASK]
+
+    def __iter__(self):
+        payloads = self.payloads
+        for key in self.keys:
+            yield payloads[key & _ID_MASK]
+
+    def slot_id(self, i):
+        """Returns the payload id stored in heap slot i."""
+        return self.keys[i] & _ID_MASK
+
+    def slot(self, pid):
+        """Returns the heap slot of payload ``pid``, or -1 if it is not queued."""
+        pos = self._positions()
+        return pos[pid] if 0 <= pid < len(pos) else -1
+
+    def peek(self):
+        """Returns the earliest record without removing it, or None."""
+        if not self.keys:
+            return None
+        return self.payloads[self.keys[0] & _ID_MASK]
+
+    def peek_id(self):
+        """Returns the payload id of the earliest record, or None if empty."""
+        if not self.keys:
+            return None
+        return self.keys[0] & _ID_MASK
+
+    def push(self, record):
+        """Adds a record to the heap and returns its payload id."""
+        pid = len(self.payloads)
+        if pid > _ID_MASK:
+            raise OverflowError("IndexedHeap holds at most 2**32 records")
+        key = (record[2] << _ID_BITS) | pid
+        if self.pos is None and self.counters is None:
+            self.payloads.append(record)
+            heapq.heappush(self.keys, key)
+            return pid
+        pos = self._positions()
+        self.payloads.append(record)
+        pos.append(len(self.keys))
+        self.keys.append(key)
+        self._sift_up(len(self.keys) - 1)
+        return pid
+
+    def pop(self):
+        """Removes and returns the earliest record, or None if empty."""
+        keys = self.keys
+        if not keys:
+            return None
+        if self.pos is None and self.counters is None:
+            return self.payloads[heapq.heappop(keys) & _ID_MASK]
+        pos = self._positions()
+        top = keys[0]
+        last = keys.pop()
+        pos[top & _ID_MASK] = -1
+        if keys:
+            keys[0] = last
+            pos[last & _ID_MASK] = 0
+            self._sift_down(0, len(keys))
+        return self.payloads[top & _ID_MASK]
+
+    def _requeue_root(self, key):
+        """Gives the root a new key and sifts it down."""
+        if self.pos is None and self.counters is None:
+            heapq.heapreplace(self.keys, key)
+        else:
+            self._positions()
+            self.keys[0] = key
+            self._sift_down(0, len(self.keys))
+
+    def replace_top(self, record):
+        """
+        Replaces the earliest record with ``record`` under the same payload
+        id and restores the heap with a single sift-down.
+
+        Returns:
+        tuple: The record that was at the top.
+        """
+        keys = self.keys
+        if not keys:
+            raise IndexError("replace_top on an empty heap")
+        pid = keys[0] & _ID_MASK
+        old = self.payloads[pid]
+        self.payloads[pid] = record
+        self._requeue_root((record[2] << _ID_BITS) | pid)
+        return old
+
+    def requeue_top(self, time, passengers):
+        """
+        Moves the earliest record to ``time`` with ``passengers`` on board
+        (a delay) and sifts it down. Column payloads are updated in place,
+        with no new record object.
+        """
+        keys = self.keys
+        if not keys:
+            raise IndexError("requeue_top on an empty heap")
+        pid = keys[0] & _ID_MASK
+        payloads = self.payloads
+        if isinstance(payloads, BusColumns):
+            payloads.time[pid] = time
+            payloads.passengers[pid] = passengers
+        else:
+            bus_number, location, _, _, capacity = payloads[pid]
+            payloads[pid] = (bus_number, location, time, passengers, capacity)
+        self._requeue_root((time << _ID_BITS) | pid)
+
+    def decrease_key(self, pid, record):
+        """Replaces payload ``pid`` with an earlier (or equal) record and sifts it up."""
+        i = self._slot_of(pid)
+        key = (record[2] << _ID_BITS) | pid
+        if key > self.keys[i]:
+            raise ValueError("decrease_key would move the record later")
+        self.payloads[pid] = record
+        self.keys[i] = key
+        return self._sift_up(i)
+
+    def increase_key(self, pid, record):
+        """Replaces payload ``pid`` with a later (or equal) record and sifts it down."""
+        i = self._slot_of(pid)
+        key = (record[2] << _ID_BITS) | pid
+        if key < self.keys[i]:
+            raise ValueError("increase_key would move the record earlier")
+        self.payloads[pid] = record
+        self.keys[i] = key
+        return self._sift_down(i, len(self.keys))
+
+    def update(self, pid, record):
+        """
+        Replaces payload ``pid`` with ``record``, sifting it whichever way
+        its new time needs (no sift if the time is unchanged).
+
+        Returns:
+        int: The record's heap slot afterwards.
+        """
+        i = self._slot_of(pid)
+        key = (record[2] << _ID_BITS) | pid
+        old_key = self.keys[i]
+        self.payloads[pid] = record
+        if key == old_key:
+            return i
+        self.keys[i] = key
+        if key < old_key:
+            return self._sift_up(i)
+        return self._sift_down(i, len(self.keys))
+
+    def remove(self, pid):
+        """
+        Removes payload ``pid`` from anywhere in the heap: the last key
+        takes its slot and is sifted into place.
+
+        Returns:
+        tuple: The removed record.
+        """
+        i = self._slot_of(pid)
+        keys, pos = self.keys, self.pos
+        last = keys.pop()
+        pos[pid] = -1
+        if i < len(keys):
+            keys[i] = last
+            pos[last & _ID_MASK] = i
+            if self._sift_up(i) == i:
+                self._sift_down(i, len(keys))
+        return self.payloads[pid]
+
+    def queued(self, pid):
+        """True if payload ``pid`` is still in the heap."""
+        return self.slot(pid) >= 0
+
+    def entries(self):
+        """Returns the queued (packed key, record) pairs in heap slot order."""
+        payloads = self.payloads
+        return [(key, payloads[key & _ID_MASK]) for key in self.keys]
+
+    @classmethod
+    def from_entries(cls, entries, ids):
+        """
+        Rebuilds a heap from (packed key, record) pairs, as returned by
+        entries(), keeping every payload id. Pairs in heap slot order are
+        restored slot for slot.
+
+        Parameters:
+        entries (iterable): (key, record) pairs of the queued records.
+        ids (int): Number of payload ids the original heap had handed out.
+
+        Returns:
+        IndexedHeap: A heap that pops, and re-keys, exactly like the original.
+        """
+        heap = cls()
+        heap.payloads = payloads = [None] * ids
+        heap.keys = keys = []
+        for key, record in entries:
+            keys.append(key)
+            payloads[key & _ID_MASK] = record
+        heapq.heapify(keys)
+        return heap
+
+    def _slot_of(self, pid):
+        pos = self._positions()
+        if pid < 0 or pid >= len(pos) or pos[pid] < 0:
+            raise KeyError(f"payload {pid} is not in the heap")
+        return pos[pid]
+
+    def _sift_up(self, i):
+        """Moves the key at slot i towards the root; returns its final slot."""
+        if self.counters is not None:
+            return _counted_sift_up(self, i, self.counters)
+        keys, pos = self.keys, self.pos
+        item = keys[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            parent_key = keys[parent]
+            if item >= parent_key:
+                break
+            keys[i] = parent_key
+            pos[parent_key & _ID_MASK] = i
+            i = parent
+        keys[i] = item
+        pos[item & _ID_MASK] = i
+        return i
+
+    def _sift_down(self, i, n):
+        """Moves the key at slot i towards the leaves; returns its final slot."""
+        if self.counters is not None:
+            return _counted_sift_down(self, i, n, self.counters)
+        keys, pos = self.keys, self.pos
+        item = keys[i]
+        child = 2 * i + 1
+        while child < n:
+            right = child + 1
+            if right < n and keys[right] < keys[child]:
+                child = right
+            child_key = keys[child]
+            if item <= child_key:
+                break
+            keys[i] = child_key
+            pos[child_key & _ID_MASK] = i
+            i = child
+            child = 2 * i + 1
+        keys[i] = item
+        pos[item & _ID_MASK] = i
+        return i
+
+
 def min_heapify(heap, i, n):
     """Maintains the min-heap property for the heap at index i."""
-    smallest = i
-    left = 2 * i + 1
-    right = 2 * i + 2
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["min_heapify"] += 1
+        if isinstance(heap, list):
+            _counted_min_heapify(heap, i, n, counters)
+            return
+    if isinstance(heap, IndexedHeap):
+        heap._positions()
+        heap._sift_down(i, n)
+        return
+    while True:
+        smallest = i
+        left = 2 * i + 1
+        right = 2 * i + 2
 
-    if left < n and heap[left][2] < heap[smallest][2]:  # compare by time
-        smallest = left
-    if right < n and heap[right][2] < heap[smallest][2]:  # compare by time
-        smallest = right
+        if left < n and heap[left][2] < heap[smallest][2]:  # compare by time
+            smallest = left
+        if right < n and heap[right][2] < heap[smallest][2]:  # compare by time
+            smallest = right
 
-    if smallest != i:
+        if smallest == i:
+            return
         heap[i], heap[smallest] = heap[smallest], heap[i]
-        min_heapify(heap, smallest, n)
+        i = smallest
 
 def delete_min(heap):
     """Removes the minimum (root) element from the heap."""
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["delete_min"] += 1
+    if not isinstance(heap, list):  # IndexedHeap or another scheduler object
+        return heap.pop()
     n = len(heap)
     if n == 0:
         return None
@@ -26,13 +385,227 @@ def delete_min(heap):
 
 def insert_min(heap, element):
     """Inserts a new element into the min-heap."""
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["insert_min"] += 1
+    if not isinstance(heap, list):
+        heap.push(element)
+        return
     heap.append(element)
     heapify_up(heap, len(heap) - 1)
 
 def heapify_up(heap, i):
     """Traverses an element at index i up the heap to maintain the min-heap property."""
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["heapify_up"] += 1
+        if isinstance(heap, list):
+            _counted_heapify_up(heap, i, counters)
+            return
+    if isinstance(heap, IndexedHeap):
+        heap._positions()
+        heap._sift_up(i)
+        return
     parent = (i - 1) // 2
     while i > 0 and heap[i][2] < heap[parent][2]:  # compare by time
         heap[i], heap[parent] = heap[parent], heap[i]
         i = parent
         parent = (i - 1) // 2
+
+def replace_min(heap, element):
+    """Replaces the minimum element with a new one using a single sift-down."""
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["replace_min"] += 1
+    if not isinstance(heap, list):
+        return heap.replace_top(element)
+    min_element = heap[0]
+    heap[0] = element
+    min_heapify(heap, 0, len(heap))
+    return min_element
+
+def delay_min(heap, time, passengers):
+    """
+    Re-queues the minimum element at ``time`` with ``passengers``, as
+    replace_min does with a new record (and counted as one), but without
+    building one for an IndexedHeap.
+    """
+    counters = getattr(heap, "counters", None)
+    if counters is not None:
+        counters.calls["replace_min"] += 1
+    if isinstance(heap, IndexedHeap):
+        heap.requeue_top(time, passengers)
+        return
+    if not isinstance(heap, list):  # another scheduler object
+        bus_number, location, _, _, capacity = heap.peek()
+        heap.replace_top((bus_number, location, time, passengers, capacity))
+        return
+    bus_number, location, _, _, capacity = heap[0]
+    heap[0] = (bus_number, location, time, passengers, capacity)
+    min_heapify(heap, 0, len(heap))
+
+def is_sorted_by_time(heap):
+    """Returns True if the list of bus records is in non-decreasing time order."""
+    return all(heap[i][2] <= heap[i + 1][2] for i in range(len(heap) - 1))
+
+def build_min_heap(heap):
+    """
+    Converts a list of bus records into a valid min-heap in place.
+
+    Uses bottom-up (Floyd) construction, which is O(n) and needs no
+    temporary list. A list already sorted by time is a valid heap and is
+    returned untouched. An IndexedHeap is re-ordered in place on its keys,
+    so every record keeps its payload id.
+
+    Parameters:
+    heap (list or IndexedHeap): Bus records (bus_number, location, time, passengers, capacity).
+
+    Returns:
+    None: The input is transformed into a min-heap in-place.
+    """
+    if isinstance(heap, IndexedHeap):
+        heap.rebuild()
+        return
+    if is_sorted_by_time(heap):
+        return
+    n = len(heap)
+    for i in range(n // 2 - 1, -1, -1):
+        min_heapify(heap, i, n)
+
+
+class HeapCounters:
+    """
+    Work done on one heap since count() attached these counters.
+
+    ``calls`` counts each public helper plus every sift ("sift_down",
+    "sift_up"). A plain list carries no counters, so list heaps are only
+    counted as a list subclass with a ``counters`` attribute. ``swaps`` counts element moves,
+    ``max_depth`` is the most levels a single sift moved an element and
+    ``levels`` the total over all sifts.
+    """
+
+    def __init__(self):
+        self.calls = dict.fromkeys(("insert_min", "delete_min", "replace_min", "min_heapify",
+                                    "heapify_up", "sift_down", "sift_up"), 0)
+        self.comparisons = 0
+        self.swaps = 0
+        self.levels = 0
+        self.max_depth = 0
+
+    def as_dict(self):
+        return {"calls": dict(self.calls), "comparisons": self.comparisons, "swaps": self.swaps,
+                "levels": self.levels, "max_depth": self.max_depth}
+
+    def _sift_done(self, depth):
+        self.levels += depth
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+
+def count(heap):
+    """
+    Starts counting the work done on ``heap`` and returns the fresh
+    HeapCounters.
+
+    The counters belong to that heap alone, so concurrent runs (or a run
+    that fails half way) never touch each other's counts, and there is
+    nothing to switch off: an uncounted heap pays one attribute check.
+
+    Parameters:
+    heap (IndexedHeap or CalendarQueue): The run's queue.
+
+    Returns:
+    HeapCounters: The counters, also set as ``heap.counters``.
+    """
+    heap.counters = HeapCounters()
+    return heap.counters
+
+
+def _counted_min_heapify(heap, i, n, c):
+    c.calls["sift_down"] += 1
+    depth = 0
+    while True:
+        smallest = i
+        left = 2 * i + 1
+        right = 2 * i + 2
+        if left < n:
+            c.comparisons += 1
+            if heap[left][2] < heap[smallest][2]:
+                smallest = left
+        if right < n:
+            c.comparisons += 1
+            if heap[right][2] < heap[smallest][2]:
+                smallest = right
+        if smallest == i:
+            break
+        heap[i], heap[smallest] = heap[smallest], heap[i]
+        c.swaps += 1
+        depth += 1
+        i = smallest
+    c._sift_done(depth)
+
+
+def _counted_heapify_up(heap, i, c):
+    c.calls["sift_up"] += 1
+    depth = 0
+    while i > 0:
+        parent = (i - 1) // 2
+        c.comparisons += 1
+        if not heap[i][2] < heap[parent][2]:
+            break
+        heap[i], heap[parent] = heap[parent], heap[i]
+        c.swaps += 1
+        depth += 1
+        i = parent
+    c._sift_done(depth)
+
+
+def _counted_sift_up(self, i, c):
+    c.calls["sift_up"] += 1
+    start = i
+    keys, pos = self.keys, self.pos
+    item = keys[i]
+    while i > 0:
+        parent = (i - 1) >> 1
+        parent_key = keys[parent]
+        c.comparisons += 1
+        if item >= parent_key:
+            break
+        keys[i] = parent_key
+        pos[parent_key & _ID_MASK] = i
+        i = parent
+    keys[i] = item
+    pos[item & _ID_MASK] = i
+    depth = (start + 1).bit_length() - (i + 1).bit_length()
+    c.swaps += depth
+    c._sift_done(depth)
+    return i
+
+
+def _counted_sift_down(self, i, n, c):
+    c.calls["sift_down"] += 1
+    start = i
+    keys, pos = self.keys, self.pos
+    item = keys[i]
+    child = 2 * i + 1
+    while child < n:
+        right = child + 1
+        if right < n:
+            c.comparisons += 1
+            if keys[right] < keys[child]:
+                child = right
+        child_key = keys[child]
+        c.comparisons += 1
+        if item <= child_key:
+            break
+        keys[i] = child_key
+        pos[child_key & _ID_MASK] = i
+        i = child
+        child = 2 * i + 1
+    keys[i] = item
+    pos[item & _ID_MASK] = i
+    depth = (i + 1).bit_length() - (start + 1).bit_length()
+    c.swaps += depth
+    c._sift_done(depth)
+    return i
+
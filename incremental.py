@@ -0,0 +1,603 @@
+import argparse
+import os
+import sys
+import time as clock
+from bisect import bisect_left, bisect_right
+
+from bus_columns import LocationTable
+from input import hhmm_to_minutes, parse_line, report_quarantine
+from schedule_cache import COLUMNS, load_schedule
+from simulation import DELAYED, DEFAULT_POLICY, BufferedWriter, decide, format_record
+
+# An event key packs (minute the bus is processed, trip rank), which is the
+# order simulation() produces records in: by time, ties in schedule order.
+# Ranks start RANK_GAP apart so rows inserted later can take ranks between
+# their neighbours without renumbering the others.
+RANK_BITS = 40
+RANK_GAP = 1 << 16
+
+# Events per chunk of the ordered stream; a splice touches one chunk
+CHUNK = 512
+
+# Lines that must match again after a changed stretch before the diff counts
+# the two schedules as back in step
+SYNC_LINES = 4
+
+# Lines compared at once when the diff first looks for a mismatch
+BLOCK_LINES = 64
+
+# Bytes compared at once when looking for the first and last changed byte
+BLOCK_BYTES = 1 << 16
+
+
+def trip_events(record, rank, policy=DEFAULT_POLICY):
+    """
+    Computes every event of one trip, as simulation() would produce them.
+
+    Returns:
+    list of tuples: (event key, structured record) in processing order.
+    """
+    bus_number, location, time, passengers, capacity = record
+    events = []
+    for delays in range(policy.max_delays + 1):
+        key = (time << RANK_BITS) | rank
+        action = decide((bus_number, location, time, passengers, capacity), delays, policy)
+        if action != DELAYED:
+            events.append((key, (action, bus_number, location, time, passengers, capacity)))
+            break
+        time += policy.delay_minutes
+        events.append((key, (action, bus_number, location, time, passengers, capacity)))
+        passengers = policy.passengers_increase(passengers)
+    return events
+
+
+def split_lines(data):
+    """Splits schedule bytes into raw lines, on newlines as read_columns splits them."""
+    lines = data.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _common_bytes(np, a, b):
+    """Returns how many leading bytes two uint8 arrays share, comparing in growing blocks."""
+    n = min(len(a), len(b))
+    count, block = 0, BLOCK_BYTES
+    while count < n:
+        end = min(count + block, n)
+        differ = np.flatnonzero(a[count:end] != b[count:end])
+        if len(differ):
+            return count + int(differ[0])
+        count, block = end, block * 2
+    return n
+
+
+def changed_span(old, new):
+    """
+    Finds the stretch of whole lines two versions of a schedule differ in.
+
+    The common prefix and suffix are found by comparing the bytes in NumPy
+    blocks and then cut back to line boundaries, so an edit anywhere costs
+    two passes over the bytes rather than splitting and comparing every
+    line.
+
+    Parameters:
+    old (bytes): The previous contents.
+    new (bytes): The new contents.
+
+    Returns:
+    tuple: (start, old stop, new stop) byte offsets with old[:start] ==
+           new[:start] and old[old stop:] == new[new stop:], each cut at
+           the start of a line (or the end of the data).
+    """
+    import numpy as np
+
+    a, b = np.frombuffer(old, dtype=np.uint8), np.frombuffer(new, dtype=np.uint8)
+    start = old.rfind(b"\n", 0, _common_bytes(np, a, b)) + 1
+    same = min(_common_bytes(np, a[::-1], b[::-1]), len(old) - start, len(new) - start)
+    newline = old.find(b"\n", len(old) - same)
+    if newline < 0:
+        return start, len(old), len(new)
+    return start, newline + 1, len(new) - (len(old) - newline - 1)
+
+
+def _common(old, i, new, j):
+    """
+    Returns how many lines match from old[i] and new[j] on.
+
+    Lines are compared a slice at a time, in blocks that double while they
+    match and drop back to BLOCK_LINES once one does not, so a long
+    unchanged stretch costs a few list comparisons done in C.
+    """
+    n = min(len(old) - i, len(new) - j)
+    count, block = 0, BLOCK_LINES
+    while count < n:
+        size = min(block, n - count)
+        if old[i + count:i + count + size] == new[j + count:j + count + size]:
+            count += size
+            block *= 2
+        elif size > BLOCK_LINES:
+            block = BLOCK_LINES
+        else:
+            for k in range(size):
+                if old[i + count + k] != new[j + count + k]:
+                    return count + k
+    return count
+
+
+def _resync(old, i, new, j):
+    """
+    Finds where the schedules are back in step after old[i] and new[j]
+    differ: the fewest lines to skip in both before SYNC_LINES lines match.
+
+    Returns:
+    tuple: (old lines, new lines) in the changed stretch.
+    """
+    n_old, n_new = len(old), len(new)
+    window = 16
+    while i < n_old and j < n_new:
+        positions = {}
+        for dj, line in enumerate(new[j:j + window]):
+            positions.setdefault(line, []).append(dj)
+        best = None
+        for di, line in enumerate(old[i:i + window]):
+            if best is not None and di >= sum(best):
+                break
+            for dj in positions.get(line, ()):
+                if best is not None and di + dj >= sum(best):
+                    break
+                count = min(SYNC_LINES, n_old - i - di, n_new - j - dj)
+                if old[i + di:i + di + count] == new[j + dj:j + dj + count]:
+                    best = (di, dj)
+                    break
+        if best is not None:
+            return best
+        if i + window >= n_old and j + window >= n_new:
+            break
+        window *= 2
+    return n_old - i, n_new - j
+
+
+def diff_lines(old, new):
+    """
+    Diffs two versions of a schedule's lines.
+
+    Returns:
+    list of tuples: (old start, old end, new start, new end) of each
+                    stretch where old lines were replaced by new ones; the
+                    lines between stretches are identical and in order.
+    """
+    n_old, n_new = len(old), len(new)
+    hunks = []
+    i = j = 0
+    while True:
+        count = _common(old, i, new, j)
+        i += count
+        j += count
+        if i == n_old and j == n_new:
+            return hunks
+        di, dj = _resync(old, i, new, j)
+        hunks.append((i, i + di, j, j + dj))
+        i += di
+        j += dj
+
+
+class EventStream:
+    """
+    The ordered record stream of a run, as a list of sorted chunks.
+
+    Each chunk holds up to 2 * CHUNK event keys with their records, so
+    finding, inserting or removing one event costs a bisection over the
+    chunks plus a shift within one chunk rather than across the stream.
+    """
+
+    def __init__(self, keys=(), records=()):
+        keys, records = list(keys), list(records)
+        self.keys = [keys[i:i + CHUNK] for i in range(0, len(keys), CHUNK)]
+        self.records = [records[i:i + CHUNK] for i in range(0, len(records), CHUNK)]
+        self.firsts = [chunk[0] for chunk in self.keys]
+        self.size = len(keys)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for chunk in self.records:
+            yield from chunk
+
+    def _chunk(self, key):
+        return max(bisect_right(self.firsts, key) - 1, 0)
+
+    def position(self, key):
+        """Returns the index of an event in the stream."""
+        c = self._chunk(key)
+        i = bisect_left(self.keys[c], key)
+        if i == len(self.keys[c]) or self.keys[c][i] != key:
+            raise KeyError(key)
+        return sum(map(len, self.keys[:c])) + i
+
+    def insert(self, key, record):
+        if not self.keys:
+            self.keys, self.records, self.firsts = [[key]], [[record]], [key]
+            self.size = 1
+            return
+        c = self._chunk(key)
+        keys, records = self.keys[c], self.records[c]
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        records.insert(i, record)
+        if i == 0:
+            self.firsts[c] = key
+        if len(keys) > 2 * CHUNK:
+            self.keys[c + 1:c + 1] = [keys[CHUNK:]]
+            self.records[c + 1:c + 1] = [records[CHUNK:]]
+            self.firsts.insert(c + 1, keys[CHUNK])
+            del keys[CHUNK:], records[CHUNK:]
+        self.size += 1
+
+    def remove(self, key):
+        """Removes an event and returns its record."""
+        c = self._chunk(key)
+        keys, records = self.keys[c], self.records[c]
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            raise KeyError(key)
+        del keys[i]
+        record = records.pop(i)
+        if not keys:
+            del self.keys[c], self.records[c], self.firsts[c]
+        elif i == 0:
+            self.firsts[c] = keys[0]
+        self.size -= 1
+        return record
+
+
+class Delta:
+    """
+    What an update changed in the record stream.
+
+    ``removed`` holds (position in the old stream, record) pairs and
+    ``added`` (position in the new stream, record) pairs, both in stream
+    order; ``trips`` counts the added, removed and changed schedule rows.
+    """
+
+    def __init__(self, removed, added, trips):
+        self.removed = removed
+        self.added = added
+        self.trips = trips
+
+    def __bool__(self):
+        return bool(self.removed or self.added)
+
+    def __repr__(self):
+        return f"Delta(removed={len(self.removed)}, added={len(self.added)}, trips={self.trips})"
+
+
+class IncrementalSimulation:
+    """
+    Keeps the records of a schedule's last run and updates them when the
+    schedule changes, re-simulating only the rows that changed.
+
+    A bus's events depend only on its own row; what the rows share is the
+    order of the record stream, by processing time and then schedule row.
+    Each row therefore carries a rank that orders it like its row number,
+    and the stream is kept sorted by (time, rank), so a changed row's
+    events are spliced out and back in where a full run would put them.
+
+    An update diffs the file's raw lines against the previous version and
+    parses only the lines that changed, so its cost follows the edit plus
+    one read and comparison of the file. Rows are matched between versions
+    by their trip key, (bus_number, location) and which occurrence of that
+    pair it is: a matched row whose fields changed is re-simulated in
+    place, and unmatched rows are removed or added.
+
+    Parameters:
+    filename (str): Schedule to run first.
+    policy (simulation.Policy): Operating policy, as for simulation().
+    """
+
+    def __init__(self, filename, policy=DEFAULT_POLICY):
+        import numpy as np
+
+        self.policy = policy
+        self.locations = LocationTable()
+        with open(filename, "rb") as f:
+            self.data = f.read()
+        self.lines = split_lines(self.data)
+        quarantine = []
+        self.columns = self._columns(load_schedule(filename, quarantine))
+        # parsed[line] is True where a line gave a schedule row
+        self.parsed = np.ones(len(self.lines), dtype=bool)
+        if len(self.columns["time"]) != len(self.lines):
+            skipped = {line_number - 1 for line_number, _, _ in quarantine}
+            for line, text in enumerate(self.lines):
+                self.parsed[line] = line not in skipped and bool(text.split())
+            if self.parsed.sum() != len(self.columns["time"]):
+                # The file changed between the two reads: parse the lines we have
+                quarantine = []
+                self.columns, self.parsed = self._parse_lines(self.lines, 1, quarantine)
+        report_quarantine(filename, quarantine)
+        self._run()
+
+    def _run(self):
+        """Simulates every row from scratch, ranks spaced RANK_GAP apart."""
+        import numpy as np
+        from analytic import ACTION_DELAYED, outcomes, to_records
+
+        columns = self.columns
+        self.rank = np.arange(len(columns["time"]), dtype=np.int64) * RANK_GAP
+        events = outcomes(columns["time"], columns["passengers"], columns["capacity"], self.policy)
+        # outcomes() shows a delay's new time; the key needs the time it was processed at
+        minutes = events["time"] - np.where(events["action"] == ACTION_DELAYED, self.policy.delay_minutes, 0)
+        keys = (minutes << RANK_BITS) | self.rank[events["row"]]
+        records = to_records(events, columns["bus_number"].tolist(),
+                             [self.locations[location] for location in columns["location"].tolist()])
+        self.stream = EventStream(keys.tolist(), records)
+
+    def _columns(self, schedule):
+        """The schedule's columns as int64 arrays, locations as ids into self.locations."""
+        import numpy as np
+
+        columns = {name: np.asarray(schedule.columns[name], dtype=np.int64) for name in COLUMNS}
+        ids = np.array([self.locations.intern(code) for code in schedule.locations] or [0], dtype=np.int64)
+        columns["location"] = ids[columns["location"]]
+        return columns
+
+    def _parse_lines(self, lines, first_line, quarantine):
+        """
+        Parses raw lines with input.parse_line; malformed ones are appended
+        to ``quarantine`` as (line_number, line, reason).
+
+        Returns:
+        tuple: (columns of the rows, as _columns gives them, bool array of
+               which lines gave a row).
+        """
+        import numpy as np
+
+        rows, parsed = [], np.zeros(len(lines), dtype=bool)
+        for line, raw in enumerate(lines):
+            text = raw.decode(errors="replace")
+            try:
+                record = parse_line(text)
+            except ValueError as e:
+                quarantine.append((first_line + line, text.rstrip("\r"), str(e)))
+                continue
+            if record is not None:
+                bus_number, city_code, time, passengers, capacity = record
+                rows.append((bus_number, self.locations.intern(city_code), hhmm_to_minutes(time),
+                             passengers, capacity))
+                parsed[line] = True
+        columns = {name: np.array(column, dtype=np.int64) for name, column
+                   in zip(COLUMNS, zip(*rows) if rows else [()] * len(COLUMNS))}
+        return columns, parsed
+
+    def _splice(self, lines, line_hunks, quarantine):
+        """
+        Builds the new columns from the old ones and the changed lines.
+
+        Returns:
+        tuple: (columns, parsed flags, row hunks) where each row hunk is
+               (old start, old end, new start, new end) in schedule rows.
+        """
+        import numpy as np
+
+        old = self.columns
+        starts = np.concatenate(([0], np.cumsum(self.parsed)))
+        pieces = {name: [] for name in COLUMNS}
+        flags, hunks = [], []
+        line = rows = 0
+        for old_start, old_end, new_start, new_end in line_hunks + [(len(self.lines), None, None, None)]:
+            first, last = int(starts[line]), int(starts[old_start])
+            for name in COLUMNS:
+                pieces[name].append(old[name][first:last])
+            flags.append(self.parsed[line:old_start])
+            rows += last - first
+            if old_end is None:
+                break
+            columns, parsed = self._parse_lines(lines[new_start:new_end], new_start + 1, quarantine)
+            for name in COLUMNS:
+                pieces[name].append(columns[name])
+            flags.append(parsed)
+            hunk = (last, int(starts[old_end]), rows, rows + len(columns["time"]))
+            rows = hunk[3]
+            line = old_end
+            if hunk[0] == hunk[1] and hunk[2] == hunk[3]:
+                continue
+            if hunks and hunks[-1][1] == hunk[0] and hunks[-1][3] == hunk[2]:
+                # Only lines without rows lie between: one stretch of rows
+                previous = hunks.pop()
+                hunk = (previous[0], hunk[1], previous[2], hunk[3])
+            hunks.append(hunk)
+        return {name: np.concatenate(pieces[name]) for name in COLUMNS}, np.concatenate(flags), hunks
+
+    def __len__(self):
+        return len(self.stream)
+
+    def records(self):
+        """Returns the current record stream, as simulation() returns it."""
+        return list(self.stream)
+
+    def _record(self, columns, row):
+        return (int(columns["bus_number"][row]), self.locations[int(columns["location"][row])],
+                int(columns["time"][row]), int(columns["passengers"][row]), int(columns["capacity"][row]))
+
+    def _match(self, old, new, hunk):
+        """
+        Matches the old and new rows of one changed stretch by trip key, in
+        order.
+
+        Returns:
+        tuple: (matches, removed) where matches[k] is the old row new row
+               hunk[2] + k takes over (-1 if it is a new trip) and removed
+               lists the old rows nothing took over.
+        """
+        old_start, old_end, new_start, new_end = hunk
+        waiting = {}
+        for row, (bus_number, location) in enumerate(zip(old["bus_number"][old_start:old_end].tolist(),
+                                                        old["location"][old_start:old_end].tolist()),
+                                                    old_start):
+            waiting.setdefault((bus_number, location), []).append(row)
+        for rows in waiting.values():
+            rows.reverse()
+        matches = []
+        last = old_start - 1
+        for key in zip(new["bus_number"][new_start:new_end].tolist(), new["location"][new_start:new_end].tolist()):
+            rows = waiting.get(key)
+            # Taking over an old row out of order would reorder ties, so
+            # such a trip is removed and added instead
+            while rows and rows[-1] <= last:
+                rows.pop()
+            if rows:
+                last = rows.pop()
+                matches.append(last)
+            else:
+                matches.append(-1)
+        taken = set(matches)
+        return matches, [row for row in range(old_start, old_end) if row not in taken]
+
+    def update(self, filename):
+        """
+        Brings the records up to date with a new version of the schedule.
+
+        Parameters:
+        filename (str): The edited schedule.
+
+        Returns:
+        Delta: The records removed from and added to the stream.
+        """
+        import numpy as np
+
+        with open(filename, "rb") as f:
+            data = f.read()
+        if data == self.data:
+            return Delta([], [], {"added": 0, "removed": 0, "changed": 0})
+        # Only the lines between the common prefix and suffix are split and diffed
+        start, old_stop, new_stop = changed_span(self.data, data)
+        first = self.data.count(b"\n", 0, start)
+        count = self.data.count(b"\n", start, old_stop) + (old_stop > start and self.data[old_stop - 1] != 10)
+        middle = split_lines(data[start:new_stop])
+        lines = self.lines[:first] + middle + self.lines[first + count:]
+        line_hunks = [(i + first, i_end + first, j + first, j_end + first)
+                      for i, i_end, j, j_end in diff_lines(self.lines[first:first + count], middle)]
+        quarantine = []
+        old = self.columns
+        new, parsed, hunks = self._splice(lines, line_hunks, quarantine)
+        report_quarantine(filename, quarantine)
+        n_new = len(new["time"])
+
+        # source[row] is the old row a new row carries on (-1 for a new trip)
+        source = np.full(n_new, -1, dtype=np.int64)
+        i = j = 0
+        for old_start, old_end, new_start, new_end in hunks + [(len(old["time"]), None, n_new, None)]:
+            source[j:new_start] = np.arange(i, old_start)
+            i, j = old_end, new_end
+        removed_rows, added_rows, changed = [], [], 0
+        for hunk in hunks:
+            matches, gone = self._match(old, new, hunk)
+            removed_rows += gone
+            for row, match in enumerate(matches, hunk[2]):
+                if match < 0:
+                    added_rows.append(row)
+                    continue
+                source[row] = match
+                if self._record(old, match) != self._record(new, row):
+                    changed += 1
+                    removed_rows.append(match)
+                    added_rows.append(row)
+        rank = np.zeros(n_new, dtype=np.int64)
+        kept = source >= 0
+        rank[kept] = self.rank[source[kept]]
+        renumber = not self._fill_ranks(rank, source, hunks)
+
+        gone = [event for row in removed_rows
+                for event in trip_events(self._record(old, row), int(self.rank[row]), self.policy)]
+        removed = sorted((self.stream.position(key), record) for key, record in gone)
+        self.columns, self.data, self.lines, self.parsed = new, data, lines, parsed
+        if renumber:
+            # No room left between neighbouring ranks: run everything again
+            self._run()
+        else:
+            for key, _ in gone:
+                self.stream.remove(key)
+            self.rank = rank
+        fresh = [event for row in added_rows
+                 for event in trip_events(self._record(new, row), int(self.rank[row]), self.policy)]
+        if not renumber:
+            for key, record in fresh:
+                self.stream.insert(key, record)
+        added = sorted((self.stream.position(key), record) for key, record in fresh)
+        trips = {"added": len(added_rows) - changed, "removed": len(removed_rows) - changed, "changed": changed}
+        return Delta(removed, added, trips)
+
+    def _fill_ranks(self, rank, source, hunks):
+        """
+        Gives every new trip a rank between its neighbours' in ``rank``.
+
+        Returns:
+        bool: False if some run of new trips found no room, and the ranks
+              must be spaced out again.
+        """
+        for _, _, start, end in hunks:
+            row = start
+            while row < end:
+                if source[row] >= 0:
+                    row += 1
+                    continue
+                run_end = row
+                while run_end < end and source[run_end] < 0:
+                    run_end += 1
+                count = run_end - row + 1
+                low = int(rank[row - 1]) if row > 0 else -1
+                high = int(rank[run_end]) if run_end < len(rank) else low + count * RANK_GAP
+                step = (high - low) // count
+                if step < 1 or high >= 1 << RANK_BITS:
+                    return False
+                rank[row:run_end] = [low + step * k for k in range(1, count)]
+                row = run_end
+        return True
+
+
+def write_delta(delta, out, max_delays=DEFAULT_POLICY.max_delays):
+    """Writes a Delta as diff lines: "-position record" and "+position record"."""
+    for position, record in delta.removed:
+        out.write_line(f"-{position} {format_record(record, max_delays)}")
+    for position, record in delta.added:
+        out.write_line(f"+{position} {format_record(record, max_delays)}")
+
+
+def watch(filename, out, interval=1.0, policy=DEFAULT_POLICY):
+    """
+    Runs a schedule, then writes the delta every time the file changes.
+    Runs until interrupted.
+    """
+    simulation = IncrementalSimulation(filename, policy)
+    print(f"{len(simulation)} records", file=sys.stderr)
+    seen = os.stat(filename).st_mtime_ns
+    while True:
+        clock.sleep(interval)
+        mtime = os.stat(filename).st_mtime_ns
+        if mtime == seen:
+            continue
+        seen = mtime
+        start = clock.perf_counter()
+        delta = simulation.update(filename)
+        write_delta(delta, out, policy.max_delays)
+        out.flush()
+        print(f"{delta.trips} in {clock.perf_counter() - start:.3f}s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-simulate a schedule incrementally as it is edited.")
+    parser.add_argument("schedule")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks of the file")
+    args = parser.parse_args(argv)
+
+    out = BufferedWriter(sys.stdout)
+    try:
+        watch(args.schedule, out, args.interval)
+    except KeyboardInterrupt:
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,363 @@
-def read(filename):
+import mmap
+import sys
+
+FIELDS = ("bus_number", "city_code", "time", "passengers", "capacity")
+
+# Records per chunk yielded by iter_chunks
+CHUNK_SIZE = 65536
+
+# Bytes of the file parsed per NumPy pass in read_columns
+BLOCK_SIZE = 1 << 24
+
+# Longest location code accepted, in UTF-8 bytes (read_columns stores codes
+# as fixed-width byte strings, so both readers measure bytes)
+MAX_CODE_LENGTH = 16
+
+# Most digits in a numeric field, so every value fits a signed 64-bit column
+MAX_DIGITS = 18
+
+# Latest time accepted, in absolute minutes. Packed keys (see
+# heap_helperfunctions and event_log) hold the time above a 32-bit trip id
+# in a signed 64-bit integer; stopping at 2**30 leaves as much again for
+# delays.
+MAX_MINUTES = 1 << 30
+
+_NUMERIC = (0, 2, 3, 4)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def hhmm_to_minutes(time):
+    """
+    Converts an HHMM time to absolute minutes after midnight of day 0.
+
+    Hours past 23 continue into the following days, as in transit feeds:
+    2430 is 00:30 on day 1 and 16759 is 23:59 on day 6.
+    """
+    return (time // 100) * 60 + time % 100
+
+
+def minutes_to_hhmm(minutes):
+    """Converts absolute minutes back to an HHMM time (hours may exceed 23)."""
+    return (minutes // 60) * 100 + minutes % 60
+
+
+def check_time(time):
+    """
+    Returns the reason an HHMM time is invalid, or None if it is valid.
+
+    Times may not be negative, must have minutes below 60 (hours of 24 and
+    more mean a later day) and must fall before MAX_MINUTES.
+    """
+    if time < 0:
+        return f"time may not be negative, got {time}"
+    if time % 100 >= 60:
+        return f"invalid HHMM time {time}"
+    if hhmm_to_minutes(time) >= MAX_MINUTES:
+        return f"time {time} is past the latest supported time"
+    return None
+
+
+def check_record(bus_number, time, passengers, capacity):
+    """
+    Returns the reason a parsed record is invalid, or None if it is valid.
+
+    Times must pass check_time(), passengers may not be negative and
+    capacity must be positive (the occupancy check divides by it).
+    """
+    reason = check_time(time)
+    if reason is not None:
+        return reason
+    if capacity <= 0:
+        return f"capacity must be positive, got {capacity}"
+    if passengers < 0:
+        return f"passengers may not be negative, got {passengers}"
+    return None
+
+
+def parse_line(line):
+    """
+    Parses one schedule line into a bus record.
+
+    Parameters:
+    line (str): A line holding bus_number, city_code, time, passengers, capacity.
+
+    Returns:
+    tuple: (bus_number, city_code, time, passengers, capacity), or None for a blank line.
+
+    Raises:
+    ValueError: If the line is malformed; the message says why.
+    """
+    fields = line.split()
+    if not fields:
+        return None
+    if len(fields) != 5:
+        raise ValueError(f"expected 5 fields, found {len(fields)}")
+    for i in _NUMERIC:
+        if not (fields[i].isascii() and fields[i].isdigit() and len(fields[i]) <= MAX_DIGITS):
+            raise ValueError(f"{FIELDS[i]} is not a whole number: {fields[i]!r}")
+    if len(fields[1].encode()) > MAX_CODE_LENGTH:
+        raise ValueError(f"city_code longer than {MAX_CODE_LENGTH} bytes")
+    bus_number = int(fields[0])
+    city_code = fields[1]
+    time = int(fields[2])
+    passengers = int(fields[3])
+    capacity = int(fields[4])
+    reason = check_record(bus_number, time, passengers, capacity)
+    if reason:
+        raise ValueError(reason)
+    return (bus_number, city_code, time, passengers, capacity)
+
+
+def iter_chunks(filename, chunk_size=CHUNK_SIZE, quarantine=None):
+    """
+    Streams bus records from a schedule file in lists of at most chunk_size.
+
+    The file is read line by line, so memory stays bounded by the chunk size
+    whatever the file length. Malformed lines are not fatal: they are
+    appended to ``quarantine`` as (line_number, line, reason) and skipped.
+
+    Parameters:
+    filename (str): Path to the text file containing bus data.
+    chunk_size (int): Maximum number of records per yielded list.
+    quarantine (list or None): Receives malformed lines; if None they are
+                               reported on stderr.
+
+    Yields:
+    list of tuples: (bus_number, city_code, time, passengers, capacity)
+    """
+    report = quarantine is None
+    if report:
+        quarantine = []
+    chunk = []
+    with open(filename) as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                record = parse_line(line)
+            except ValueError as e:
+                quarantine.append((line_number, line.rstrip("\r\n"), str(e)))
+                continue
+            if record is None:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+    if report:
+        report_quarantine(filename, quarantine)
+
+
+def iter_records(filename, quarantine=None):
+    """Streams bus records from a schedule file one at a time (see iter_chunks)."""
+    for chunk in iter_chunks(filename, quarantine=quarantine):
+        yield from chunk
+
+
+def report_quarantine(filename, quarantine):
+    """Prints quarantined lines to stderr."""
+    for line_number, line, reason in quarantine:
+        print(f"{filename}:{line_number}: skipped malformed line ({reason}): {line!r}", file=sys.stderr)
+
+
+def read(filename, quarantine=None):
     """
     Reads bus schedule data from a file and returns a list of bus records.
 
     Each line in the input file should contain five values separated by whitespace:
     - bus_number (int): Unique identifier for the bus
     - city_code (str): Destination or location code
-    - time (int): Scheduled time in HHMM format (e.g., 1345 for 1:45 PM)
+    - time (int): Scheduled time in HHMM format (e.g., 1345 for 1:45 PM);
+                  hours of 24 or more fall on later days (2430 is 00:30 next day)
     - passengers (int): Number of passengers currently on the bus
     - capacity (int): Maximum passenger capacity of the bus
 
+    Malformed lines are skipped and collected in ``quarantine`` as
+    (line_number, line, reason); if no list is given they are reported on stderr.
+
     Parameters:
     filename (str): Path to the text file containing bus data.
+    quarantine (list or None): Receives malformed lines.
 
     Returns:
     list of tuples: A list where each element is a tuple containing:
                     (bus_number, city_code, time, passengers, capacity)
     """
     out = []
-    with open(filename) as f:
-        lines = f.readlines()
-        for line in lines:
-            line = line.strip().split()  # Remove whitespace and split by spaces
-            bus_number = int(line[0])
-            city_code = line[1]
-            time = int(line[2])
-            passengers = int(line[3])
-            capacity = int(line[4])
-            out.append((bus_number, city_code, time, passengers, capacity))
+    for chunk in iter_chunks(filename, quarantine=quarantine):
+        out.extend(chunk)
+    return out
+
+
+def read_columns(source, quarantine=None, block_size=BLOCK_SIZE):
+    """
+    Parses a whole schedule into NumPy column arrays.
+
+    Tokenizing and integer conversion are done with array operations over
+    the raw bytes, one block of about ``block_size`` bytes at a time, so
+    the working memory stays flat for any file size. A filename is memory
+    mapped; a bytes object or an existing mmap can be passed directly.
+
+    Parameters:
+    source (str or bytes-like): Schedule file path, or its contents.
+    quarantine (list or None): Receives malformed lines as
+                               (line_number, line, reason); if None they
+                               are reported on stderr.
+    block_size (int): Approximate number of bytes parsed per pass.
+
+    Returns:
+    dict: Column arrays ``bus_number``, ``location`` (int codes into
+          ``locations``), ``time`` (HHMM), ``passengers`` and ``capacity``,
+          plus ``locations``, the list of distinct city codes.
+    """
+    import numpy as np
+
+    report = quarantine is None
+    if report:
+        quarantine = []
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                buf = b""
+        name = source
+    else:
+        buf = source
+        name = "<buffer>"
+
+    parts = []
+    start = 0
+    first_line = 1
+    size = len(buf)
+    while start < size:
+        end = min(start + block_size, size)
+        if end < size:
+            cut = buf.rfind(b"\n", start, end)
+            end = cut + 1 if cut >= start else buf.find(b"\n", end) + 1 or size
+        block = np.frombuffer(buf, dtype=np.uint8, count=end - start, offset=start)
+        parts.append(_parse_block(np, buf, block, start, first_line, quarantine))
+        first_line += int(np.count_nonzero(block == 10))
+        start = end
+
+    if report:
+        report_quarantine(name, quarantine)
+    return _join_blocks(np, parts)
+
+
+def _parse_block(np, buf, a, offset, first_line, quarantine):
+    """Parses one newline-aligned block of schedule bytes into columns."""
+    is_nl = a == 10
+    is_space = (a == 32) | (a == 9) | (a == 13) | is_nl | (a == 11) | (a == 12)
+    solid = ~is_space
+    starts = np.flatnonzero(solid & np.concatenate(([True], is_space[:-1])))
+    ends = np.flatnonzero(solid & np.concatenate((is_space[1:], [True]))) + 1
+    line_starts = np.concatenate(([0], np.flatnonzero(is_nl) + 1))
+    n_lines = len(line_starts) - (1 if len(a) and a[-1] == 10 else 0)
+
+    tok_line = np.cumsum(is_nl, dtype=np.int32)[starts]
+    counts = np.bincount(tok_line, minlength=n_lines)
+    bad = {}
+    for line in np.flatnonzero((counts != 0) & (counts != 5)):
+        bad[int(line)] = f"expected 5 fields, found {counts[line]}"
+
+    # Tokens of well-formed lines, reshaped to one row per record
+    good_lines = np.flatnonzero(counts == 5)
+    keep = counts[tok_line] == 5
+    t_start = starts[keep].reshape(-1, 5)
+    t_end = ends[keep].reshape(-1, 5)
+    lengths = t_end - t_start
+
+    # Integer fields: one vectorized pass per digit position, right to left
+    numeric = np.zeros(lengths.shape, dtype=bool)
+    values = np.zeros(lengths.shape, dtype=np.int64)
+    for col in _NUMERIC:
+        n_len = lengths[:, col]
+        n_end = t_end[:, col]
+        ok = (n_len > 0) & (n_len <= MAX_DIGITS)
+        total = np.zeros(len(n_len), dtype=np.int64)
+        for k in range(min(int(n_len.max()), MAX_DIGITS) if len(n_len) else 0):
+            live = n_len > k
+            if live.all():
+                digit = a[n_end - 1 - k].astype(np.int64) - 48
+                ok &= (digit >= 0) & (digit <= 9)
+                total += digit * 10 ** k
+            else:
+                digit = a[np.where(live, n_end - 1 - k, 0)].astype(np.int64) - 48
+                ok &= ~live | ((digit >= 0) & (digit <= 9))
+                total += np.where(live, digit, 0) * 10 ** k
+        numeric[:, col] = ok
+        values[:, col] = total
+    cols = list(_NUMERIC)
+
+    bus_number, time, passengers, capacity = (values[:, i] for i in _NUMERIC)
+    valid = numeric[:, cols].all(axis=1)
+    for row in np.flatnonzero(~valid):
+        field = cols[int(np.argmin(numeric[row, cols]))]
+        s, e = t_start[row, field], t_end[row, field]
+        text = bytes(buf[offset + s:offset + e]).decode(errors="replace")
+        bad[int(good_lines[row])] = f"{FIELDS[field]} is not a whole number: {text!r}"
+    checks = (
+        (valid & (time % 100 >= 60), "invalid HHMM time {time}"),
+        (valid & ((time // 100) * 60 + time % 100 >= MAX_MINUTES), "time {time} is past the latest supported time"),
+        (valid & (capacity <= 0), "capacity must be positive, got {capacity}"),
+        (valid & (passengers < 0), "passengers may not be negative, got {passengers}"),
+    )
+    for mask, message in checks:
+        for row in np.flatnonzero(mask):
+            line = int(good_lines[row])
+            if line not in bad:
+                bad[line] = message.format(time=time[row], capacity=capacity[row],
+                                           passengers=passengers[row])
+        valid &= ~mask
+    code_len = lengths[:, 1]
+    for row in np.flatnonzero(valid & (code_len > MAX_CODE_LENGTH)):
+        bad[int(good_lines[row])] = f"city_code longer than {MAX_CODE_LENGTH} bytes"
+    valid &= code_len <= MAX_CODE_LENGTH
+
+    for line in sorted(bad):
+        s = line_starts[line]
+        e = line_starts[line + 1] if line + 1 < len(line_starts) else len(a)
+        text = bytes(buf[offset + s:offset + e]).decode(errors="replace").rstrip("\r\n")
+        quarantine.append((first_line + line, text, bad[line]))
+
+    # City codes: gather fixed-width byte strings, then intern with np.unique
+    width = int(code_len[valid].max()) if valid.any() else 1
+    c_start = t_start[valid, 1]
+    c_len = code_len[valid]
+    span = np.arange(width)
+    gather = np.minimum(c_start[:, None] + span, len(a) - 1)
+    chars = np.where(span < c_len[:, None], a[gather], 0).astype(np.uint8)
+    codes = np.ascontiguousarray(chars).view(f"S{width}").ravel()
+    names, location = np.unique(codes, return_inverse=True)
+    return {
+        "bus_number": bus_number[valid],
+        "location": location.ravel(),
+        "time": time[valid],
+        "passengers": passengers[valid],
+        "capacity": capacity[valid],
+        "locations": [name.decode(errors="replace") for name in names],
+    }
+
+
+def _join_blocks(np, parts):
+    """Concatenates per-block columns, remapping location codes to one table."""
+    locations = []
+    index = {}
+    columns = {name: [] for name in ("bus_number", "location", "time", "passengers", "capacity")}
+    for part in parts:
+        remap = []
+        for name in part["locations"]:
+            if name not in index:
+                index[name] = len(locations)
+                locations.append(name)
+            remap.append(index[name])
+        remap = np.array(remap, dtype=np.int64)
+        for name, column in columns.items():
+            column.append(remap[part["location"]] if name == "location" else part[name])
+    out = {}
+    for name, column in columns.items():
+        out[name] = np.concatenate(column).astype(np.int64) if column else np.zeros(0, dtype=np.int64)
+    out["locations"] = locations
     return out
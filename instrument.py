@@ -0,0 +1,84 @@
+import json
+import time as clock
+
+
+class PhaseTimer:
+    """Accumulates wall-clock seconds per named phase of a run."""
+
+    def __init__(self):
+        self.phases = {}
+        self._name = None
+        self._start = 0.0
+
+    def start(self, name):
+        """
+        Stops the running phase, if any, and starts timing ``name``
+        (None just stops). Returns the phase that was running.
+        """
+        now = clock.perf_counter()
+        previous = self._name
+        if previous is not None:
+            self.add(previous, now - self._start)
+        self._name = name
+        self._start = now
+        return previous
+
+    def stop(self):
+        """Stops the running phase."""
+        self.start(None)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+class TimedWriter:
+    """
+    Wraps a BufferedWriter and charges the time spent in it to the
+    "output" phase, so output interleaved with the event loop is not
+    counted as loop time.
+    """
+
+    def __init__(self, writer, timer):
+        self.writer = writer
+        self.timer = timer
+
+    def write_line(self, line):
+        interrupted = self.timer.start("output")
+        self.writer.write_line(line)
+        self.timer.start(interrupted)
+
+    def flush(self):
+        interrupted = self.timer.start("output")
+        self.writer.flush()
+        self.timer.start(interrupted)
+
+
+def build_report(filename, timer, counters, records, **details):
+    """
+    Assembles the per-run JSON report.
+
+    Returns:
+    dict: File, run details, phase seconds (the event loop excludes the
+          output written during it), heap counters and record counts.
+    """
+    actions = {}
+    for record in records:
+        actions[record[0]] = actions.get(record[0], 0) + 1
+    report = {"file": filename}
+    report.update(details)
+    report["records"] = len(records)
+    report["actions"] = actions
+    report["phases"] = dict(timer.phases)
+    report["heap"] = counters.as_dict() if counters is not None else None
+    return report
+
+
+def write_report(report, destination):
+    """Writes a report as JSON to a path or an open file."""
+    if hasattr(destination, "write"):
+        json.dump(report, destination, indent=2)
+        destination.write("\n")
+        return
+    with open(destination, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
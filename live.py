@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import sys
+import time as clock
+
+from heap_helperfunctions import IndexedHeap
+from input import check_time, hhmm_to_minutes, minutes_to_hhmm, parse_line
+from schedule_cache import load_records
+from simulation import DEFAULT_POLICY, BufferedWriter, format_record, print_summary, process_next
+
+# Wall-clock seconds between the clock task's wake-ups
+TICK_SECONDS = 0.05
+
+# Bytes read from a client per batch; every complete line in a batch is
+# applied before the replies are written back in one go
+READ_SIZE = 1 << 16
+
+
+class LiveSimulation:
+    """
+    Simulation engine that accepts updates while it runs.
+
+    The queue is an IndexedHeap, whose ``pos`` map finds a queued trip's heap
+    slot directly. A boarding rewrites the record in place (passengers are
+    not part of the key), a new time is one sift, a new trip a push and a
+    cancellation a remove: O(log n) each, with no rebuild. Trip ids are
+    payload ids: schedule rows, then added trips in the order they came
+    (see ScheduleIndex).
+
+    advance() processes events exactly as simulation() does. Updates land
+    between events and may not reach back before the simulation clock
+    ``now``, so the departure order stays the one a heap of the final
+    records would give.
+
+    Parameters:
+    records (iterable): Bus records (bus_number, location, time, passengers, capacity),
+                        time in absolute minutes.
+    policy (simulation.Policy): Operating policy, as for simulation().
+    out (BufferedWriter or None): Where each record is written as it happens.
+    """
+
+    def __init__(self, records=(), policy=DEFAULT_POLICY, out=None):
+        self.heap = IndexedHeap(list(records))
+        self.policy = policy
+        self.out = out
+        self.delay_count = [0] * len(self.heap.payloads)   # trip id -> delays so far
+        self.records = []
+        self.now = None         # simulation clock: every trip up to it is processed
+        self.rejected = []      # (command, reason) for updates that could not apply
+
+    def _queued(self, trip):
+        if not self.heap.queued(trip):
+            raise KeyError(f"trip {trip} is not queued")
+        return self.heap.payloads[trip]
+
+    def _check_time(self, time):
+        if self.now is not None and time <= self.now:
+            raise ValueError(f"time {time} is not after the simulation clock ({self.now})")
+
+    def board(self, trip, passengers):
+        """
+        Adds boarding passengers to a queued trip (negative for alighting,
+        never below zero).
+
+        Returns:
+        tuple: The trip's updated record.
+        """
+        bus_number, location, time, current, capacity = self._queued(trip)
+        record = (bus_number, location, time, max(0, current + passengers), capacity)
+        self.heap.payloads[trip] = record
+        return record
+
+    def reschedule(self, trip, time):
+        """Moves a queued trip to a new time, in absolute minutes; returns its record."""
+        bus_number, location, _, passengers, capacity = self._queued(trip)
+        self._check_time(time)
+        record = (bus_number, location, time, passengers, capacity)
+        self.heap.update(trip, record)
+        return record
+
+    def add_trip(self, record):
+        """Queues a new trip and returns its trip id."""
+        self._check_time(record[2])
+        trip = self.heap.push(record)
+        self.delay_count.append(0)
+        return trip
+
+    def cancel(self, trip):
+        """Withdraws a queued trip without recording it; returns its record."""
+        self._queued(trip)
+        return self.heap.remove(trip)
+
+    def step(self):
+        """
+        Processes the earliest queued trip, as one iteration of simulation().
+
+        Returns:
+        tuple: The structured record.
+        """
+        _, record, _ = process_next(self.heap, self.delay_count, self.policy)
+        self.records.append(record)
+        if self.out is not None:
+            self.out.write_line(format_record(record, self.policy.max_delays))
+        return record
+
+    def advance(self, until=None):
+        """
+        Processes every trip due at or before ``until`` (absolute minutes;
+        everything if None) and moves the clock there.
+
+        Returns:
+        int: Number of events processed.
+        """
+        heap = self.heap
+        done = len(self.records)
+        while heap and (until is None or heap.peek()[2] <= until):
+            self.step()
+        if until is not None and (self.now is None or until > self.now):
+            self.now = until
+        elif until is None and self.records:
+            self.now = self.records[-1][3]
+        if self.out is not None:
+            self.out.flush()
+        return len(self.records) - done
+
+    def execute(self, command):
+        """
+        Applies one command tuple:
+
+            ("BOARD", trip, passengers)    ("TIME", trip, minutes)
+            ("TRIP", record)               ("CANCEL", trip)
+            ("ADVANCE", minutes or None)
+
+        Returns:
+        The result of the matching method.
+
+        Raises:
+        KeyError, ValueError: If the command does not apply.
+        """
+        name = command[0]
+        if name == "BOARD":
+            return self.board(command[1], command[2])
+        if name == "TIME":
+            return self.reschedule(command[1], command[2])
+        if name == "TRIP":
+            return self.add_trip(command[1])
+        if name == "CANCEL":
+            return self.cancel(command[1])
+        if name == "ADVANCE":
+            return self.advance(command[1])
+        raise ValueError(f"unknown command {name!r}")
+
+
+def _parse_time(field):
+    """Parses an HHMM protocol field into absolute minutes, checked as schedule times are."""
+    time = int(field)
+    reason = check_time(time)
+    if reason is not None:
+        raise ValueError(reason)
+    return hhmm_to_minutes(time)
+
+
+def parse_command(line):
+    """
+    Parses one line of the socket protocol into a command tuple. Times are
+    HHMM, as in schedule files:
+
+        BOARD <trip> <passengers>     TIME <trip> <HHMM>
+        TRIP <bus_number> <city_code> <HHMM> <passengers> <capacity>
+        CANCEL <trip>                 ADVANCE [<HHMM>]
+
+    Raises:
+    ValueError: If the line is malformed or a time is invalid (see
+                input.check_time).
+    """
+    fields = line.split()
+    if not fields:
+        raise ValueError("empty command")
+    name = fields[0].upper()
+    if name == "TRIP" and len(fields) > 1:
+        bus_number, city_code, time, passengers, capacity = parse_line(" ".join(fields[1:]))
+        return ("TRIP", (bus_number, city_code, hhmm_to_minutes(time), passengers, capacity))
+    if name == "ADVANCE" and len(fields) in (1, 2):
+        return ("ADVANCE", _parse_time(fields[1]) if len(fields) == 2 else None)
+    if name == "BOARD" and len(fields) == 3:
+        return ("BOARD", int(fields[1]), int(fields[2]))
+    if name == "TIME" and len(fields) == 3:
+        return ("TIME", int(fields[1]), _parse_time(fields[2]))
+    if name == "CANCEL" and len(fields) == 2:
+        return ("CANCEL", int(fields[1]))
+    raise ValueError(f"malformed command: {line.strip()!r}")
+
+
+def _reason(error):
+    """The message of a rejected command (KeyError would repr() it)."""
+    return error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+
+
+def _reply(live, line):
+    """
+    Runs one protocol line, as received (bytes), and returns the reply line.
+    Bytes that are not UTF-8 are replaced, so they fail as a malformed command.
+    """
+    try:
+        result = live.execute(parse_command(line.decode(errors="replace")))
+    except (KeyError, ValueError) as e:
+        return f"ERROR {_reason(e)}\n"
+    if isinstance(result, tuple):
+        bus_number, city_code, time, passengers, capacity = result
+        return f"OK {bus_number} {city_code} {minutes_to_hhmm(time)} {passengers} {capacity}\n"
+    return f"OK {result}\n"
+
+
+async def handle_client(live, reader, writer):
+    """
+    Serves one socket client: newline-separated commands, one reply line
+    each ("OK ..." or "ERROR ..."), in order.
+    """
+    pending = b""
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            writer.write("".join(_reply(live, line) for line in lines if line.strip()).encode())
+            await writer.drain()
+        if pending.strip():
+            writer.write(_reply(live, pending).encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def ingest(live, updates):
+    """
+    Applies command tuples from an in-process asyncio.Queue until it yields
+    None. Commands that do not apply are kept in ``live.rejected``.
+    """
+    while True:
+        command = await updates.get()
+        while True:
+            if command is None:
+                return
+            try:
+                live.execute(command)
+            except (KeyError, ValueError) as e:
+                live.rejected.append((command, _reason(e)))
+            try:
+                command = updates.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+
+
+async def run_clock(live, minutes_per_second):
+    """
+    Advances the simulation clock in real time, ``minutes_per_second``
+    simulated minutes per second, until no trips are left.
+    """
+    if live.now is None:
+        if not live.heap:
+            return
+        live.now = live.heap.peek()[2] - 1
+    start, started = live.now, clock.perf_counter()
+    while live.heap:
+        await asyncio.sleep(TICK_SECONDS)
+        live.advance(start + int((clock.perf_counter() - started) * minutes_per_second))
+
+
+async def serve(live, host="127.0.0.1", port=None, updates=None, minutes_per_second=None, ready=None):
+    """
+    Runs the live front end until every trip is processed.
+
+    Parameters:
+    live (LiveSimulation): The engine. Every source of updates runs on this
+                           event loop, so updates and events never interleave
+                           mid-step.
+    host (str): Interface for the socket server.
+    port (int or None): TCP port for the socket protocol (see parse_command);
+                        0 picks a free one; None runs no server.
+    updates (asyncio.Queue or None): In-process source of command tuples (see ingest).
+    minutes_per_second (float or None): Real-time clock speed. With None the
+                                        clock only moves on ADVANCE commands.
+    ready (callable or None): Called with the server's port once it listens.
+
+    Returns:
+    list of tuples: The structured records, as simulation() returns them.
+
+    Raises:
+    ValueError: If there is no server, no update queue and no clock, as
+                nothing could then ever move the simulation forward.
+    """
+    if port is None and updates is None and minutes_per_second is None:
+        raise ValueError("serve() needs a port, an update queue or a clock speed")
+    server = None
+    tasks = []
+    clients = set()     # handle_client tasks of connected clients
+
+    async def connected(reader, writer):
+        task = asyncio.current_task()
+        clients.add(task)
+        try:
+            await handle_client(live, reader, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            clients.discard(task)
+
+    if port is not None:
+        server = await asyncio.start_server(connected, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+    if updates is not None:
+        tasks.append(asyncio.create_task(ingest(live, updates)))
+    try:
+        if minutes_per_second is not None:
+            await run_clock(live, minutes_per_second)
+        else:
+            while live.heap or live.now is None:
+                await asyncio.sleep(TICK_SECONDS)
+    finally:
+        if server is not None:
+            server.close()
+        # Clients still connected are closed here: cancelling their tasks
+        # runs handle_client's cleanup before the loop goes away
+        tasks.extend(clients)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if server is not None:
+            await server.wait_closed()
+    return live.records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a simulation that accepts live updates.")
+    parser.add_argument("schedule")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, metavar="MINUTES_PER_SECOND",
+                        help="advance the clock in real time; otherwise only ADVANCE moves it")
+    args = parser.parse_args(argv)
+
+    out = BufferedWriter(sys.stdout)
+    live = LiveSimulation(load_records(args.schedule), out=out)
+    ready = lambda port: print(f"Listening on {args.host}:{port}", file=sys.stderr)
+    records = asyncio.run(serve(live, args.host, args.port, minutes_per_second=args.speed, ready=ready))
+    print_summary(records, out)
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
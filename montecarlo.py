@@ -0,0 +1,309 @@
+import argparse
+import csv
+import json
+
+from input import minutes_to_hhmm
+from schedule_cache import load_schedule
+from simulation import DEFAULT_POLICY
+
+# Load factors are tallied in fixed bins per bus, so per-route distributions
+# are exact sums of per-bus ones; anything above MAX_LOAD_FACTOR lands in
+# the last bin
+LOAD_BINS = 100
+MAX_LOAD_FACTOR = 2.0
+
+# Quantiles reported for the final load factor
+QUANTILES = (0.05, 0.5, 0.95)
+
+# Replications x buses cells simulated per batch, bounding memory
+CHUNK_CELLS = 1 << 22
+
+
+class GrowthArrivals:
+    """
+    The deterministic model simulation() uses: each delay adds
+    ceil(growth * passengers), whatever the route or time.
+    """
+
+    def __init__(self, growth=DEFAULT_POLICY.growth):
+        self.growth = growth
+
+    def sample(self, rng, passengers, location, time, minutes, locations):
+        import numpy as np
+
+        return np.ceil(self.growth * passengers).astype(np.int64)
+
+
+class PoissonArrivals:
+    """
+    Passengers boarding a delayed bus arrive as a Poisson process, with a
+    rate per route and hour of day.
+
+    Parameters:
+    rates (dict): City code -> passengers per minute, either one rate or
+                  24 hourly rates (hour 0 first).
+    default (float or sequence): Rate(s) for routes missing from ``rates``.
+    """
+
+    def __init__(self, rates=None, default=0.0):
+        self.rates = dict(rates or {})
+        self.default = default
+        self._table = None
+
+    def table(self, locations):
+        """Returns the (locations x 24) array of rates per minute."""
+        import numpy as np
+
+        if self._table is None or self._table[0] != tuple(locations):
+            table = np.empty((len(locations), 24))
+            for i, city_code in enumerate(locations):
+                table[i] = self.rates.get(city_code, self.default)
+            self._table = (tuple(locations), table)
+        return self._table[1]
+
+    def sample(self, rng, passengers, location, time, minutes, locations):
+        """
+        Draws the passengers added during one delay.
+
+        Parameters:
+        rng (numpy.random.Generator): Source of randomness.
+        passengers (array): Current load, replications x buses.
+        location (array): Location id of each bus.
+        time (array): Absolute minute each bus's delay starts.
+        minutes (int): Length of the delay.
+        locations (list of str): City code of each location id.
+
+        Returns:
+        array: Passengers added, shaped like ``passengers``.
+        """
+        expected = self.table(locations)[location, (time // 60) % 24] * minutes
+        return rng.poisson(expected, size=passengers.shape)
+
+
+def _simulate(np, rng, passengers, capacity, location, time, locations, replications, policy, model):
+    """
+    Simulates one batch of replications of every bus.
+
+    Returns:
+    tuple: (delays, cancelled, load_factor), each replications x buses:
+           delays taken, whether the bus was cancelled, and its load factor
+           at its last event (departure or cancellation).
+    """
+    steps = policy.max_delays + 1
+    limit = policy.threshold * capacity
+    load = np.repeat(passengers[None, :], replications, axis=0)
+    final = load.copy()
+    waiting = np.ones(load.shape, dtype=bool)
+    delays = np.zeros(load.shape, dtype=np.int64)
+    for k in range(steps):
+        low = load < limit
+        if k == steps - 1:
+            cancelled = waiting & low
+            final = np.where(waiting, load, final)
+            break
+        delayed = waiting & low
+        final = np.where(waiting & ~low, load, final)
+        delays += delayed
+        waiting = delayed
+        added = model.sample(rng, load, location, time + policy.delay_minutes * k,
+                             policy.delay_minutes, locations)
+        load = np.where(waiting, load + added, load)
+    return delays, cancelled, final / capacity
+
+
+def monte_carlo(filename, replications=1000, model=None, policy=DEFAULT_POLICY, seed=0):
+    """
+    Runs many replications of a schedule at once as NumPy arrays.
+
+    A bus's fate depends only on its own load, so each batch of
+    replications is a (replications x buses) array stepped once per delay,
+    with no heap. Results are reproducible for a given seed.
+
+    Parameters:
+    filename (str): Path to the schedule file.
+    replications (int): Number of replications.
+    model (GrowthArrivals, PoissonArrivals or None): Arrival model; None
+                                                     uses policy.growth.
+    policy (simulation.Policy): Operating policy, as for simulation().
+    seed (int): Seed of the random generator.
+
+    Returns:
+    dict: ``replications``, ``locations`` (city codes) and per-bus arrays:
+          ``bus_number``, ``location`` (ids), ``time``,
+          ``delay_histogram`` (buses x max_delays + 1 counts),
+          ``cancelled`` (counts), ``load_sum``, ``load_sum_squares`` and
+          ``load_histogram`` (buses x LOAD_BINS counts). See bus_table()
+          and route_table() for the derived distributions.
+    """
+    import numpy as np
+
+    if model is None:
+        model = GrowthArrivals(policy.growth)
+    schedule = load_schedule(filename)
+    n = len(schedule)
+    passengers = np.asarray(schedule.passengers, dtype=np.int64)
+    capacity = np.asarray(schedule.capacity, dtype=np.int64)
+    location = np.asarray(schedule.location, dtype=np.int64)
+    time = np.asarray(schedule.time, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+
+    steps = policy.max_delays + 1
+    result = {
+        "replications": replications,
+        "locations": list(schedule.locations),
+        "bus_number": np.asarray(schedule.bus_number, dtype=np.int64),
+        "location": location,
+        "time": time,
+        "delay_histogram": np.zeros((n, steps), dtype=np.int64),
+        "cancelled": np.zeros(n, dtype=np.int64),
+        "load_sum": np.zeros(n),
+        "load_sum_squares": np.zeros(n),
+        "load_histogram": np.zeros((n, LOAD_BINS), dtype=np.int64),
+    }
+    if n == 0:
+        return result
+    batch = max(1, CHUNK_CELLS // n)
+    bus_offset = np.arange(n) * LOAD_BINS
+    for start in range(0, replications, batch):
+        size = min(batch, replications - start)
+        delays, cancelled, load_factor = _simulate(np, rng, passengers, capacity, location, time,
+                                                   result["locations"], size, policy, model)
+        for d in range(steps):
+            result["delay_histogram"][:, d] += np.count_nonzero(delays == d, axis=0)
+        result["cancelled"] += np.count_nonzero(cancelled, axis=0)
+        result["load_sum"] += load_factor.sum(axis=0)
+        result["load_sum_squares"] += (load_factor * load_factor).sum(axis=0)
+        bins = np.minimum((load_factor * (LOAD_BINS / MAX_LOAD_FACTOR)).astype(np.int64), LOAD_BINS - 1)
+        result["load_histogram"] += np.bincount((bins + bus_offset).ravel(),
+                                                minlength=n * LOAD_BINS).reshape(n, LOAD_BINS)
+    return result
+
+
+def _quantiles(np, histogram, quantiles):
+    """Interpolates quantiles of the load factor from per-row bin counts."""
+    width = MAX_LOAD_FACTOR / LOAD_BINS
+    total = histogram.sum(axis=1)
+    cumulative = histogram.cumsum(axis=1)
+    rows = np.arange(len(histogram))
+    columns = []
+    for q in quantiles:
+        target = q * total
+        index = np.minimum(np.count_nonzero(cumulative < target[:, None], axis=1), LOAD_BINS - 1)
+        before = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0)
+        count = np.maximum(histogram[rows, index], 1)
+        columns.append((index + (target - before) / count) * width)
+    return columns
+
+
+def _table(np, delay_histogram, cancelled, load_sum, load_sum_squares, load_histogram):
+    """Distribution columns shared by bus_table and route_table."""
+    runs = np.maximum(delay_histogram.sum(axis=1), 1)
+    mean = load_sum / runs
+    columns = {"runs": delay_histogram.sum(axis=1),
+               "mean_delays": delay_histogram @ np.arange(delay_histogram.shape[1]) / runs}
+    for d in range(delay_histogram.shape[1]):
+        columns[f"p_delays_{d}"] = delay_histogram[:, d] / runs
+    columns["cancel_probability"] = cancelled / runs
+    columns["mean_load_factor"] = mean
+    columns["std_load_factor"] = np.sqrt(np.maximum(load_sum_squares / runs - mean * mean, 0.0))
+    for q, column in zip(QUANTILES, _quantiles(np, load_histogram, QUANTILES)):
+        columns[f"p{round(q * 100)}_load_factor"] = column
+    return columns
+
+
+def bus_table(result):
+    """
+    Per-bus distributions from monte_carlo().
+
+    Returns:
+    list of dict: One row per schedule row: bus_number, location, time
+                  (HHMM), runs, mean_delays, p_delays_0.. (probability of
+                  each delay count), cancel_probability, mean and standard
+                  deviation of the final load factor and its QUANTILES.
+    """
+    import numpy as np
+
+    columns = _table(np, result["delay_histogram"], result["cancelled"],
+                     result["load_sum"], result["load_sum_squares"], result["load_histogram"])
+    names = result["locations"]
+    rows = []
+    for i, (bus_number, location, time) in enumerate(zip(result["bus_number"].tolist(),
+                                                         result["location"].tolist(),
+                                                         result["time"].tolist())):
+        row = {"bus_number": bus_number, "location": names[location], "time": minutes_to_hhmm(time)}
+        row.update((name, column[i].item()) for name, column in columns.items())
+        rows.append(row)
+    return rows
+
+
+def route_table(result):
+    """
+    Per-route distributions from monte_carlo(): the per-bus counts summed
+    over every bus to the same location.
+
+    Returns:
+    list of dict: One row per location, with ``buses`` and the columns of bus_table().
+    """
+    import numpy as np
+
+    location = result["location"]
+    names = result["locations"]
+    summed = []
+    for name in ("delay_histogram", "cancelled", "load_sum", "load_sum_squares", "load_histogram"):
+        values = result[name]
+        total = np.zeros((len(names),) + values.shape[1:], dtype=values.dtype)
+        np.add.at(total, location, values)
+        summed.append(total)
+    columns = _table(np, *summed)
+    buses = np.bincount(location, minlength=len(names))
+    rows = []
+    for i, city_code in enumerate(names):
+        row = {"location": city_code, "buses": buses[i].item()}
+        row.update((name, column[i].item()) for name, column in columns.items())
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, path):
+    """Writes bus_table() or route_table() rows as CSV."""
+    with open(path, "w", newline="") as f:
+        if rows:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo distributions of delays, cancellations and loads.")
+    parser.add_argument("schedule")
+    parser.add_argument("--replications", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float,
+                        help="Poisson arrivals per minute on every route (default: deterministic growth)")
+    parser.add_argument("--rates", metavar="JSON",
+                        help="Poisson rates per route: {city_code: rate or [24 hourly rates]}")
+    parser.add_argument("--buses", metavar="CSV", help="write the per-bus table")
+    parser.add_argument("--routes", metavar="CSV", help="write the per-route table")
+    args = parser.parse_args(argv)
+
+    model = None
+    if args.rate is not None or args.rates:
+        rates = {}
+        if args.rates:
+            with open(args.rates) as f:
+                rates = json.load(f)
+        model = PoissonArrivals(rates, args.rate or 0.0)
+    result = monte_carlo(args.schedule, args.replications, model, seed=args.seed)
+    routes = route_table(result)
+    if args.buses:
+        write_table(bus_table(result), args.buses)
+    if args.routes:
+        write_table(routes, args.routes)
+    print(f"{'route':<8} {'buses':>6} {'delays':>7} {'cancel':>7} {'load p5':>8} {'p50':>6} {'p95':>6}")
+    for row in routes:
+        print(f"{row['location']:<8} {row['buses']:>6} {row['mean_delays']:7.3f} {row['cancel_probability']:7.3f} "
+              f"{row['p5_load_factor']:8.2f} {row['p50_load_factor']:6.2f} {row['p95_load_factor']:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
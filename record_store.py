@@ -0,0 +1,145 @@
+from array import array
+from bisect import bisect_right
+
+from bus_columns import LocationTable
+from simulation import RECORD_FIELDS
+
+ACTIONS = ("DEPARTED", "DELAYED", "CANCELLED")
+
+
+class RecordStore:
+    """
+    Columnar store of the simulation's structured records.
+
+    Each field of (action, bus_number, location, time, passengers, capacity)
+    is a typed array; actions are stored as indexes into ACTIONS and
+    locations as ids into ``locations``, a LocationTable that may be shared
+    with the bus columns of the run. Filtering and sorting work on the
+    columns and hand back row numbers, so a view over a large run never
+    copies the records themselves.
+    """
+
+    def __init__(self, records=(), locations=None):
+        self.action = array("b")
+        self.bus_number = array("q")
+        self.location = array("i")
+        self.time = array("q")
+        self.passengers = array("q")
+        self.capacity = array("q")
+        self.locations = locations if locations is not None else LocationTable()
+        self._action_ids = {name: i for i, name in enumerate(ACTIONS)}
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, i):
+        return (ACTIONS[self.action[i]], self.bus_number[i], self.locations.codes[self.location[i]],
+                self.time[i], self.passengers[i], self.capacity[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def location_id(self, city_code):
+        """Returns the id of a city code, adding it to the location table if new."""
+        return self.locations.intern(city_code)
+
+    def append(self, record):
+        """Adds one (action, bus_number, location, time, passengers, capacity) record."""
+        action, bus_number, city_code, time, passengers, capacity = record
+        self.action.append(self._action_ids[action])
+        self.bus_number.append(bus_number)
+        self.location.append(self.location_id(city_code))
+        self.time.append(time)
+        self.passengers.append(passengers)
+        self.capacity.append(capacity)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def select(self, actions=None, locations=None, start=None, end=None, first=0):
+        """
+        Finds the records matching every given filter.
+
+        Parameters:
+        actions (iterable of str or None): Actions to keep; all if None.
+        locations (iterable of str or None): City codes to keep; all if None.
+        start (int or None): Earliest time to keep, in absolute minutes.
+        end (int or None): Latest time to keep, in absolute minutes.
+        first (int): Only look at rows from this one on (to extend an
+                     earlier selection as records arrive).
+
+        Returns:
+        list of int: Matching row numbers, in record order.
+        """
+        rows = range(first, len(self))
+        if actions is not None:
+            codes = {self._action_ids[name] for name in actions}
+            action = self.action
+            rows = [i for i in rows if action[i] in codes]
+        if locations is not None:
+            known = self.locations.ids
+            ids = {known[name] for name in locations if name in known}
+            location = self.location
+            rows = [i for i in rows if location[i] in ids]
+        if start is not None or end is not None:
+            time = self.time
+            low = start if start is not None else -1 << 63
+            high = end if end is not None else (1 << 63) - 1
+            rows = [i for i in rows if low <= time[i] <= high]
+        return list(rows)
+
+    def sort_key(self, field):
+        """
+        Returns a row -> key function that orders rows by one of
+        RECORD_FIELDS (actions and locations by name).
+        """
+        if field not in RECORD_FIELDS:
+            raise ValueError(f"unknown record field {field!r}; expected one of {RECORD_FIELDS}")
+        column = getattr(self, field)
+        if field == "action":
+            names = ACTIONS
+        elif field == "location":
+            names = self.locations.codes
+        else:
+            return column.__getitem__
+        return lambda i: names[column[i]]
+
+    def sort(self, rows, field, reverse=False):
+        """Sorts row numbers in place by a field; ties keep their order."""
+        rows.sort(key=self.sort_key(field), reverse=reverse)
+        return rows
+
+    def merge(self, rows, new_rows, field, reverse=False):
+        """
+        Merges row numbers into rows already sorted by a field, in place,
+        as sort() would order them all: new_rows must come after every row
+        in ``rows``, so on ties they go after the old ones.
+
+        Only new_rows are sorted; each finds its place by binary search
+        and the old rows are copied over once, in slices, so a few records
+        added to a large sorted view cost one pass instead of a full sort.
+        """
+        key = self.sort_key(field)
+        self.sort(new_rows, field, reverse)
+        merged = []
+        start = 0
+        for row in new_rows:
+            value = key(row)
+            if reverse:
+                low, high = start, len(rows)
+                while low < high:
+                    middle = (low + high) // 2
+                    if key(rows[middle]) < value:
+                        high = middle
+                    else:
+                        low = middle + 1
+            else:
+                low = bisect_right(rows, value, start, key=key)
+            merged.extend(rows[start:low])
+            merged.append(row)
+            start = low
+        merged.extend(rows[start:])
+        rows[:] = merged
+        return rows
@@ -0,0 +1,227 @@
+import argparse
+import sqlite3
+
+from input import hhmm_to_minutes, read
+from schedule_cache import file_digest
+from simulation import DEFAULT_POLICY, RECORD_FIELDS, SILENT, simulation
+
+DEFAULT_PATH = "runs.sqlite"
+
+# Times are absolute minutes in both tables, as in simulation()'s records.
+# A schedule is stored once per content digest, however often it is run.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    schedule_id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    digest TEXT NOT NULL UNIQUE,
+    loaded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS trips (
+    schedule_id INTEGER NOT NULL REFERENCES schedules,
+    row INTEGER NOT NULL,
+    bus_number INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    passengers INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    PRIMARY KEY (schedule_id, row)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    schedule_id INTEGER NOT NULL REFERENCES schedules,
+    started_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    threshold REAL NOT NULL,
+    max_delays INTEGER NOT NULL,
+    delay_minutes INTEGER NOT NULL,
+    growth REAL NOT NULL,
+    events INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    run_id INTEGER NOT NULL REFERENCES runs,
+    seq INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    bus_number INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    passengers INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    PRIMARY KEY (run_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_location ON events (location, run_id);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE INDEX IF NOT EXISTS runs_schedule ON runs (schedule_id);
+"""
+
+# Columns of route_summary() rows
+ROUTE_FIELDS = ("location", "runs", "trips", "delays", "cancelled", "cancel_rate")
+
+
+class RunStore:
+    """
+    SQLite history of schedules and the events of every run.
+
+    One connection is opened per store and reused by every call. Each run
+    is written in a single transaction with executemany, and the events
+    table is indexed by run (its primary key), location and time, so
+    queries across runs never touch the schedule files again.
+
+    Parameters:
+    path (str): Database file; created with the schema if missing.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _schedule_id(self, filename, quarantine=None):
+        """Stores a schedule read with input.read unless its contents are already stored."""
+        digest = file_digest(filename)
+        row = self.connection.execute("SELECT schedule_id FROM schedules WHERE digest = ?", (digest,)).fetchone()
+        if row is not None:
+            return row[0]
+        schedule_id = self.connection.execute("INSERT INTO schedules (filename, digest) VALUES (?, ?)",
+                                              (filename, digest)).lastrowid
+        self.connection.executemany(
+            "INSERT INTO trips VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((schedule_id, row, bus_number, city_code, hhmm_to_minutes(time), passengers, capacity)
+             for row, (bus_number, city_code, time, passengers, capacity)
+             in enumerate(read(filename, [] if quarantine is None else quarantine))))
+        return schedule_id
+
+    def add_schedule(self, filename, quarantine=None):
+        """
+        Stores a schedule's rows.
+
+        Returns:
+        int: The schedule's id (the existing one if the same contents were
+             stored before).
+        """
+        with self.connection:
+            return self._schedule_id(filename, quarantine)
+
+    def add_run(self, filename, records, policy=DEFAULT_POLICY):
+        """
+        Stores the records of one run of a schedule, in one transaction.
+
+        Parameters:
+        filename (str): The schedule that was run.
+        records (iterable): Structured records, as simulation() returns them.
+        policy (simulation.Policy): The policy the run used.
+
+        Returns:
+        int: The new run's id.
+        """
+        with self.connection:
+            schedule_id = self._schedule_id(filename)
+            run_id = self.connection.execute(
+                "INSERT INTO runs (schedule_id, threshold, max_delays, delay_minutes, growth, events)"
+                " VALUES (?, ?, ?, ?, ?, 0)",
+                (schedule_id, policy.threshold, policy.max_delays, policy.delay_minutes, policy.growth)).lastrowid
+            cursor = self.connection.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, seq) + tuple(record) for seq, record in enumerate(records)))
+            self.connection.execute("UPDATE runs SET events = ? WHERE run_id = ?", (cursor.rowcount, run_id))
+        return run_id
+
+    def record(self, filename, policy=DEFAULT_POLICY, scheduler="heap"):
+        """
+        Simulates a schedule without output and stores the run.
+
+        Returns:
+        int: The new run's id.
+        """
+        return self.add_run(filename, simulation(filename, SILENT, scheduler=scheduler, policy=policy), policy)
+
+    def runs(self, last=None):
+        """
+        Lists stored runs, newest first.
+
+        Returns:
+        list of dict: run_id, filename, started_at, the policy fields and events.
+        """
+        cursor = self.connection.execute(
+            "SELECT run_id, filename, started_at, threshold, max_delays, delay_minutes, growth, events"
+            " FROM runs JOIN schedules USING (schedule_id) ORDER BY run_id DESC LIMIT ?",
+            (-1 if last is None else last,))
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def events(self, run_id, location=None, start=None, end=None):
+        """
+        Returns a run's records in order, optionally only those to one
+        location or with start <= time < end (absolute minutes).
+        """
+        query = "SELECT " + ", ".join(RECORD_FIELDS) + " FROM events WHERE run_id = ?"
+        parameters = [run_id]
+        if location is not None:
+            query += " AND location = ?"
+            parameters.append(location)
+        if start is not None:
+            query += " AND time >= ?"
+            parameters.append(start)
+        if end is not None:
+            query += " AND time < ?"
+            parameters.append(end)
+        return self.connection.execute(query + " ORDER BY seq", parameters).fetchall()
+
+    def route_summary(self, last=None):
+        """
+        Per-route totals across the last ``last`` runs (every run if None).
+
+        Every trip ends in one DEPARTED or CANCELLED event, so those count
+        the trips.
+
+        Returns:
+        list of dict: One row per location, keyed by ROUTE_FIELDS.
+        """
+        cursor = self.connection.execute(
+            "SELECT location, COUNT(DISTINCT run_id), SUM(action != 'DELAYED'), SUM(action = 'DELAYED'),"
+            " SUM(action = 'CANCELLED') FROM events"
+            " WHERE run_id IN (SELECT run_id FROM runs ORDER BY run_id DESC LIMIT ?)"
+            " GROUP BY location ORDER BY location",
+            (-1 if last is None else last,))
+        return [dict(zip(ROUTE_FIELDS, (location, runs, trips, delays, cancelled,
+                                         cancelled / trips if trips else 0.0)))
+                for location, runs, trips, delays, cancelled in cursor]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store simulation runs in SQLite and query their history.")
+    parser.add_argument("--db", default=DEFAULT_PATH, help="database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("record", help="simulate schedules and store the runs")
+    command.add_argument("schedules", nargs="+")
+    command = commands.add_parser("runs", help="list stored runs")
+    command.add_argument("--last", type=int)
+    command = commands.add_parser("routes", help="cancellation rate per route")
+    command.add_argument("--last", type=int, help="only the last N runs")
+    args = parser.parse_args(argv)
+
+    with RunStore(args.db) as store:
+        if args.command == "record":
+            for filename in args.schedules:
+                print(f"run {store.record(filename)}: {filename}")
+        elif args.command == "runs":
+            for run in store.runs(args.last):
+                print(f"{run['run_id']:>5} {run['started_at']} {run['filename']} ({run['events']} events)")
+        else:
+            print(f"{'route':<8} {'runs':>5} {'trips':>8} {'delays':>8} {'cancelled':>9} {'rate':>6}")
+            for row in store.route_summary(args.last):
+                print(f"{row['location']:<8} {row['runs']:>5} {row['trips']:>8} {row['delays']:>8} "
+                      f"{row['cancelled']:>9} {row['cancel_rate']:6.3f}")
+
+
+if __name__ == "__main__":
+    main()
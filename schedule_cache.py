@@ -0,0 +1,302 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from input import hhmm_to_minutes, minutes_to_hhmm, read, read_columns, report_quarantine
+
+MAGIC = b"BUSCACHE"
+VERSION = 2
+SUFFIX = ".busc"
+
+COLUMNS = ("bus_number", "location", "time", "passengers", "capacity")
+
+# Candidate column typecodes, narrowest first
+_TYPECODES = ("i", "q")
+_ALIGN = 8
+
+
+def cache_path(filename):
+    """Returns the path of the compiled cache that sits next to a schedule file."""
+    return filename + SUFFIX
+
+
+# Bytes hashed per read where hashlib.file_digest (Python 3.11+) is missing
+_HASH_BLOCK = 1 << 20
+
+
+def file_digest(filename):
+    """Returns the BLAKE2b hex digest of a file's contents."""
+    import hashlib
+
+    with open(filename, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "blake2b").hexdigest()
+        digest = hashlib.blake2b()
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+        return digest.hexdigest()
+
+
+class Schedule:
+    """
+    Columnar view of a compiled schedule.
+
+    Each column is a typed memoryview straight over the memory-mapped cache
+    file, so opening costs no parsing and the pages are shared between
+    processes that open the same schedule. ``time`` is in absolute minutes
+    after midnight of day 0; ``location`` holds ids into ``locations``.
+    """
+
+    def __init__(self, columns, locations, quarantine, buffer=None):
+        self.columns = columns
+        self.locations = locations
+        self.quarantine = quarantine
+        self._buffer = buffer  # keeps the mmap alive while views exist
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.columns["time"])
+
+    def records(self):
+        """
+        Returns the schedule as bus record tuples for the simulation engine.
+
+        Returns:
+        list of tuples: (bus_number, city_code, time, passengers, capacity),
+                        time in absolute minutes.
+        """
+        locations = self.locations
+        return [(bus_number, locations[location], time, passengers, capacity)
+                for bus_number, location, time, passengers, capacity
+                in zip(*(self.columns[name] for name in COLUMNS))]
+
+    def hhmm_records(self):
+        """Returns the schedule as input.read would, with HHMM times."""
+        return [(bus_number, city_code, minutes_to_hhmm(time), passengers, capacity)
+                for bus_number, city_code, time, passengers, capacity in self.records()]
+
+
+def _narrowest(values):
+    """Picks the narrowest typecode able to hold every value."""
+    if len(values) == 0:
+        return _TYPECODES[0]
+    low, high = min(values), max(values)
+    for code in _TYPECODES:
+        limit = 1 << (8 * array(code).itemsize - 1)
+        if -limit <= low and high < limit:
+            return code
+    raise OverflowError("schedule value does not fit in 64 bits")
+
+
+def _parse_columns(filename, quarantine):
+    """
+    Parses a text schedule into columns of raw bytes.
+
+    Returns:
+    tuple: ({name: (typecode, bytes)}, locations), times in minutes.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is None:
+        records = read(filename, quarantine)
+        locations = []
+        index = {}
+        columns = {name: [] for name in COLUMNS}
+        for bus_number, city_code, time, passengers, capacity in records:
+            if city_code not in index:
+                index[city_code] = len(locations)
+                locations.append(city_code)
+            columns["bus_number"].append(bus_number)
+            columns["location"].append(index[city_code])
+            columns["time"].append(hhmm_to_minutes(time))
+            columns["passengers"].append(passengers)
+            columns["capacity"].append(capacity)
+        packed = {}
+        for name in COLUMNS:
+            code = _narrowest(columns[name])
+            packed[name] = (code, array(code, columns[name]).tobytes())
+        return packed, locations
+    parsed = read_columns(filename, quarantine)
+    parsed["time"] = (parsed["time"] // 100) * 60 + parsed["time"] % 100
+    packed = {}
+    for name in COLUMNS:
+        column = parsed[name]
+        code = _narrowest((column.min(), column.max()) if len(column) else ())
+        packed[name] = (code, column.astype(np.dtype(code)).tobytes())
+    return packed, parsed["locations"]
+
+
+def compile_schedule(filename, quarantine=None):
+    """
+    Parses a text schedule and writes its compiled cache next to it.
+
+    The cache is written to a temporary file and renamed into place, so a
+    reader never sees a half-written cache.
+
+    Parameters:
+    filename (str): Path to the text schedule.
+    quarantine (list or None): Receives malformed lines (see input.read).
+
+    Returns:
+    Schedule: The freshly compiled schedule, loaded from the cache file
+              (or from memory if the cache could not be written).
+    """
+    report = quarantine is None
+    if report:
+        quarantine = []
+    stat = os.stat(filename)
+    digest = file_digest(filename)
+    packed, locations = _parse_columns(filename, quarantine)
+    if report:
+        report_quarantine(filename, quarantine)
+
+    code, data = packed["time"]
+    header = {
+        "version": VERSION,
+        "byteorder": sys.byteorder,
+        "count": len(data) // array(code).itemsize,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "digest": digest,
+        "locations": locations,
+        "quarantine": quarantine,
+        "columns": [[name, packed[name][0]] for name in COLUMNS],
+    }
+    import json
+
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b" " * (-(len(MAGIC) + 8 + len(header_bytes)) % _ALIGN)
+
+    path = cache_path(filename)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for name in COLUMNS:
+                data = packed[name][1]
+                f.write(data)
+                f.write(b"\0" * (-len(data) % _ALIGN))
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        path = None
+    schedule = open_cache(path) if path else None
+    if schedule is None:
+        columns = {name: memoryview(data).cast(code) for name, (code, data) in packed.items()}
+        schedule = Schedule(columns, locations, quarantine)
+    return schedule
+
+
+def open_cache(path, filename=None, verify=False):
+    """
+    Memory-maps a compiled cache file.
+
+    Parameters:
+    path (str): Path to the ``.busc`` file.
+    filename (str or None): If given, the cache is only returned when it
+                            still describes this source file: same size,
+                            and a matching mtime is trusted without reading
+                            the source, while a changed one is settled by
+                            comparing the content hash.
+    verify (bool): Always compare the content hash, even when the mtime and
+                   size match.
+
+    Returns:
+    Schedule or None: None if the cache is missing, unreadable or stale.
+    """
+    import json
+
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if buf[:len(MAGIC)] != MAGIC:
+            return None
+        (header_length,) = struct.unpack_from("<Q", buf, len(MAGIC))
+        offset = len(MAGIC) + 8
+        header = json.loads(buf[offset:offset + header_length])
+        offset += header_length
+        if header["version"] != VERSION or header["byteorder"] != sys.byteorder:
+            return None
+        if filename is not None:
+            stat = os.stat(filename)
+            if stat.st_size != header["size"]:
+                return None
+            if (verify or stat.st_mtime_ns != header["mtime_ns"]) and file_digest(filename) != header["digest"]:
+                return None
+        count = header["count"]
+        view = memoryview(buf)
+        columns = {}
+        for name, typecode in header["columns"]:
+            nbytes = count * array(typecode).itemsize
+            columns[name] = view[offset:offset + nbytes].cast(typecode)
+            offset += nbytes + (-nbytes % _ALIGN)
+    except (ValueError, KeyError, TypeError, struct.error, OSError):
+        return None
+    return Schedule(columns, header["locations"], header["quarantine"], buf)
+
+
+def load_schedule(filename, quarantine=None, verify=False):
+    """
+    Loads a schedule through its compiled cache, rebuilding the cache when
+    the source changed. Reopening an untouched schedule only stats it; the
+    source is hashed when its mtime or size moved (see open_cache).
+
+    Parameters:
+    filename (str): Path to the text schedule.
+    quarantine (list or None): Receives the malformed lines recorded for the
+                               schedule; if None they are reported on stderr.
+    verify (bool): Hash the source even when its mtime and size match, for
+                   files edited by tools that preserve mtimes.
+
+    Returns:
+    Schedule: Columnar, memory-mapped view of the schedule.
+    """
+    schedule = open_cache(cache_path(filename), filename, verify)
+    if schedule is None:
+        return compile_schedule(filename, quarantine)
+    stored = [tuple(entry) for entry in schedule.quarantine]
+    if quarantine is None:
+        report_quarantine(filename, stored)
+    else:
+        quarantine.extend(stored)
+    return schedule
+
+
+def load_records(filename, quarantine=None):
+    """
+    Reads bus records through the compiled cache.
+
+    Unlike input.read, times are converted once here to absolute minutes,
+    which is what the simulation engines work in.
+
+    Returns:
+    list of tuples: (bus_number, city_code, time, passengers, capacity)
+    """
+    return load_schedule(filename, quarantine).records()
+
+
+def load_columns(filename, quarantine=None, locations=None):
+    """
+    Reads bus records through the compiled cache into typed columns, for
+    fleets too large to hold as one tuple per bus.
+
+    Parameters:
+    locations (LocationTable or None): Shared table to intern city codes in.
+
+    Returns:
+    BusColumns: The records, times in absolute minutes.
+    """
+    from bus_columns import BusColumns
+
+    return BusColumns.from_schedule(load_schedule(filename, quarantine), locations)
@@ -0,0 +1,94 @@
+from bisect import bisect_left, insort
+
+from heap_helperfunctions import _ID_BITS, _ID_MASK
+
+
+class ScheduleIndex:
+    """
+    Secondary indexes over the trips of a schedule, kept in step with a run.
+
+    Every schedule row is a trip with its own trip id: its row number, which
+    is also its payload id in IndexedHeap and CalendarQueue, so two rows
+    that share a bus number stay distinct. Pending trips are indexed by
+    location as sorted lists of packed (time, trip id) keys, the same
+    packing the queues use, so a time-window query costs two bisections plus
+    the matches. ``by_bus`` maps a bus number to its trips in schedule order.
+
+    simulation(..., index=...) loads the schedule and calls update() and
+    remove() as buses are delayed and leave the queue.
+
+    Parameters:
+    records (iterable): Bus records (bus_number, location, time, passengers, capacity),
+                        time in absolute minutes.
+    """
+
+    def __init__(self, records=()):
+        self.load(records)
+
+    def load(self, records):
+        """Indexes ``records`` as trips 0..n-1, replacing the current contents."""
+        self.records = list(records)        # trip id -> current record
+        self.pending = bytearray(b"\x01") * len(self.records)
+        self.size = len(self.records)
+        self.by_location = {}               # city code -> sorted keys of pending trips
+        self.by_bus = {}                    # bus number -> trip ids
+        for trip, (bus_number, location, time, _, _) in enumerate(self.records):
+            self.by_location.setdefault(location, []).append((time << _ID_BITS) | trip)
+            self.by_bus.setdefault(bus_number, []).append(trip)
+        for keys in self.by_location.values():
+            keys.sort()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, trip):
+        return 0 <= trip < len(self.pending) and bool(self.pending[trip])
+
+    def _unlink(self, trip):
+        """Drops a pending trip's key from its location index."""
+        if trip not in self:
+            raise KeyError(f"trip {trip} is not pending")
+        _, location, time, _, _ = self.records[trip]
+        keys = self.by_location[location]
+        i = bisect_left(keys, (time << _ID_BITS) | trip)
+        del keys[i]
+
+    def update(self, trip, record):
+        """
+        Re-indexes a pending trip whose record changed (a delay), keeping
+        its trip id.
+        """
+        self._unlink(trip)
+        self.records[trip] = record
+        insort(self.by_location.setdefault(record[1], []), (record[2] << _ID_BITS) | trip)
+
+    def remove(self, trip):
+        """Marks a trip as no longer pending (departed or cancelled)."""
+        self._unlink(trip)
+        self.pending[trip] = 0
+        self.size -= 1
+
+    def trips(self, bus_number, pending_only=False):
+        """Returns the trip ids of a bus number, in schedule order."""
+        trips = self.by_bus.get(bus_number, [])
+        if pending_only:
+            return [trip for trip in trips if self.pending[trip]]
+        return list(trips)
+
+    def window(self, location, start=None, end=None):
+        """
+        Finds the pending trips to a location in a time window.
+
+        Parameters:
+        location (str): City code.
+        start (int or None): Earliest time, in absolute minutes; open if None.
+        end (int or None): Latest time, in absolute minutes; open if None.
+
+        Returns:
+        list of tuples: (trip id, record) pairs in queue order (time, then trip id).
+        """
+        keys = self.by_location.get(location, [])
+        low = 0 if start is None else bisect_left(keys, start << _ID_BITS)
+        high = len(keys) if end is None else bisect_left(keys, (end + 1) << _ID_BITS)
+        records = self.records
+        return [(key & _ID_MASK, records[key & _ID_MASK]) for key in keys[low:high]]
@@ -0,0 +1,179 @@
+import argparse
+import heapq
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from heap_helperfunctions import IndexedHeap
+from schedule_cache import load_schedule
+from simulation import DELAYED, DEFAULT_POLICY, BufferedWriter, format_record, print_summary, process_next
+
+# An event's merge key packs (time it was processed, schedule row), the
+# order the single-heap engine pops events in
+ROW_BITS = 32
+ROW_MASK = (1 << ROW_BITS) - 1
+
+ACTIONS = ("DEPARTED", "DELAYED", "CANCELLED")
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+PARTITIONS = ("location", "trip")
+
+# Routes are cut into pieces of at most 1/PIECES_PER_SHARE of a fair share,
+# so packing pieces onto the least loaded shard overshoots by at most that
+PIECES_PER_SHARE = 4
+
+
+def partition(schedule, shards, by="location"):
+    """
+    Splits a schedule's rows into shards.
+
+    By "location", routes are packed onto shards largest first, each onto
+    the least loaded shard. A route larger than a piece (a fair share
+    n / shards over PIECES_PER_SHARE) is first cut into pieces by trip id
+    (its rows dealt round-robin), so a dominant city such as LHE is spread
+    over several shards instead of holding up the whole run. By "trip",
+    rows are dealt to shards by trip id (schedule row) alone.
+
+    Parameters:
+    schedule (schedule_cache.Schedule): The schedule to split.
+    shards (int): Number of shards wanted.
+    by (str): "location" or "trip".
+
+    Returns:
+    list of array: Rows of each non-empty shard, in schedule order.
+    """
+    if by not in PARTITIONS:
+        raise ValueError(f"unknown partition {by!r}; expected one of {PARTITIONS}")
+    if shards < 1:
+        raise ValueError(f"shards must be at least 1, got {shards}")
+    n = len(schedule)
+    rows = [array("q") for _ in range(shards)]
+    if by == "trip":
+        for row in range(n):
+            rows[row % shards].append(row)
+        return [shard for shard in rows if shard]
+
+    counts = [0] * len(schedule.locations)
+    for location in schedule.location:
+        counts[location] += 1
+    piece = max(1, -(-n // (shards * PIECES_PER_SHARE)))
+    pieces = [max(1, -(-count // piece)) for count in counts]
+    loads = [(0, shard) for shard in range(shards)]
+    assigned = {}
+    order = sorted(((counts[location] / pieces[location], location, part)
+                    for location in range(len(counts)) for part in range(pieces[location])), reverse=True)
+    for size, location, part in order:
+        load, shard = heapq.heappop(loads)
+        assigned[location, part] = shard
+        heapq.heappush(loads, (load + size, shard))
+    seen = [0] * len(counts)
+    for row, location in enumerate(schedule.location):
+        rows[assigned[location, seen[location] % pieces[location]]].append(row)
+        seen[location] += 1
+    return [shard for shard in rows if shard]
+
+
+def run_shard(task):
+    """
+    Runs the heap engine over one shard's rows.
+
+    Parameters:
+    task (tuple): (filename, rows, policy).
+
+    Returns:
+    tuple: Per-event arrays in processing order: merge keys, actions
+           (indexes into ACTIONS), times shown in the records and passengers.
+    """
+    filename, rows, policy = task
+    schedule = load_schedule(filename, quarantine=[])
+    time, passengers, capacity = schedule.time, schedule.passengers, schedule.capacity
+    # Rows are in schedule order, so ties between them break as in the full run
+    buses = IndexedHeap([(row, None, time[row], passengers[row], capacity[row]) for row in rows])
+    delay_count = [0] * len(rows)
+    keys, actions, times, loads = array("q"), array("b"), array("q"), array("q")
+
+    delay_minutes = policy.delay_minutes
+    while buses:
+        _, (action, row, _, shown, passengers, _), _ = process_next(buses, delay_count, policy)
+        # A delayed record shows the new time; the merge key uses the old one
+        time = shown - delay_minutes if action == DELAYED else shown
+        keys.append((time << ROW_BITS) | row)
+        actions.append(_ACTION_CODES[action])
+        times.append(shown)
+        loads.append(passengers)
+    return keys, actions, times, loads
+
+
+def merge_shards(schedule, results):
+    """
+    K-way merges per-shard events into one stream ordered as the single-heap
+    engine would process them.
+
+    Yields:
+    tuple: Structured records, as simulation() returns them.
+    """
+    bus_number, location, capacity = schedule.bus_number, schedule.location, schedule.capacity
+    locations = schedule.locations
+    streams = [zip(keys, actions, times, loads) for keys, actions, times, loads in results]
+    for key, action, time, passengers in heapq.merge(*streams):
+        row = key & ROW_MASK
+        yield (ACTIONS[action], bus_number[row], locations[location[row]], time, passengers, capacity[row])
+
+
+def sharded_simulation(filename, shards=None, by="location", policy=DEFAULT_POLICY):
+    """
+    Simulates a schedule with its rows split across worker processes.
+
+    Buses never interact, so each shard runs its own heap, and merging the
+    shards' events by (time, schedule row) gives exactly the records of
+    simulation(). Workers open the schedule's memory-mapped cache, so only
+    row numbers and event columns cross process boundaries.
+
+    Parameters:
+    filename (str): Path to the schedule file.
+    shards (int or None): Worker processes; defaults to the CPU count.
+    by (str): How rows are split: "location" or "trip" (see partition).
+    policy (simulation.Policy): Operating policy, as for simulation().
+
+    Returns:
+    list of tuples: (action, bus_number, location, time, passengers, capacity)
+                    in processing order, as simulation() returns them.
+
+    Raises:
+    ValueError: If shards is less than 1.
+    """
+    if shards is None:
+        shards = os.cpu_count() or 1
+    elif shards < 1:
+        raise ValueError(f"shards must be at least 1, got {shards}")
+    schedule = load_schedule(filename)  # compile the cache once, before the workers start
+    tasks = [(filename, rows, policy) for rows in partition(schedule, shards, by)]
+    if len(tasks) <= 1:
+        results = [run_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+            results = list(executor.map(run_shard, tasks))
+    return list(merge_shards(schedule, results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a schedule split across worker processes.")
+    parser.add_argument("schedule")
+    parser.add_argument("--shards", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--by", choices=PARTITIONS, default="location")
+    parser.add_argument("--output", choices=("silent", "events", "summary"), default="summary")
+    args = parser.parse_args(argv)
+
+    records = sharded_simulation(args.schedule, args.shards, args.by)
+    out = BufferedWriter(sys.stdout)
+    if args.output == "events":
+        for record in records:
+            out.write_line(format_record(record))
+    elif args.output == "summary":
+        print_summary(records, out)
+    out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,343 @@
-from input import read
+from schedule_cache import load_columns, load_records
 import math
-from heap_helperfunctions import insert_min, delete_min, min_heapify, heapify_up
+import sys
+import heap_helperfunctions
+# build_min_heap is re-exported: it is the one bulk loader the CLI and GUI share
+from heap_helperfunctions import IndexedHeap, build_min_heap, delete_min, delay_min
+from calendar_queue import CalendarQueue
+from input import minutes_to_hhmm
 
-def time_add_30(time):
+DELAY_MINUTES = 30
+
+# Event schedulers simulation() can run on; all pop in the same order.
+# "compact" is the heap over typed columns (see bus_columns.py).
+SCHEDULERS = {"heap": IndexedHeap, "calendar": CalendarQueue, "compact": IndexedHeap}
+
+
+class Policy:
     """
-    Adds 30 minutes to a time in HHMM format and returns the updated time.
+    Operating policy applied to every bus.
 
     Parameters:
-    time (int): Time in HHMM format (e.g., 1345 for 1:45 PM).
+    threshold (float): Minimum load factor (passengers / capacity) to depart.
+    max_delays (int): Delays allowed before a bus below threshold is cancelled.
+    delay_minutes (int): How far each delay moves a bus.
+    growth (float): Fraction of the current passengers added while delayed,
+                    rounded up.
+    """
+
+    def __init__(self, threshold=0.7, max_delays=2, delay_minutes=DELAY_MINUTES, growth=0.2):
+        self.threshold = threshold
+        self.max_delays = max_delays
+        self.delay_minutes = delay_minutes
+        self.growth = growth
+
+    def passengers_increase(self, passengers):
+        """Returns the passenger count after one delay."""
+        return passengers + math.ceil(self.growth * passengers)
+
+    def as_dict(self):
+        return {"threshold": self.threshold, "max_delays": self.max_delays,
+                "delay_minutes": self.delay_minutes, "growth": self.growth}
+
+    def __repr__(self):
+        return (f"Policy(threshold={self.threshold}, max_delays={self.max_delays}, "
+                f"delay_minutes={self.delay_minutes}, growth={self.growth})")
+
+
+DEFAULT_POLICY = Policy()
+
+# What decide() can do with the bus at the front of the queue
+DEPARTED, DELAYED, CANCELLED = "DEPARTED", "DELAYED", "CANCELLED"
+
+
+def decide(bus, delays, policy=DEFAULT_POLICY):
+    """
+    Decides what happens to the bus at the front of the queue. Every engine
+    goes through here, so they all apply the policy the same way.
+
+    Parameters:
+    bus (tuple): (bus_number, location, time, passengers, capacity).
+    delays (int): How many times this trip has been delayed so far.
+    policy (Policy): Operating policy.
 
     Returns:
-    int: Updated time in HHMM format after adding 30 minutes.
+    str: DEPARTED if the bus is full enough, otherwise DELAYED, or
+         CANCELLED once it has used up policy.max_delays delays.
+    """
+    if bus[3] >= policy.threshold * bus[4]:
+        return DEPARTED
+    if delays >= policy.max_delays:
+        return CANCELLED
+    return DELAYED
+
+
+def process_next(buses, delay_count, policy=DEFAULT_POLICY):
+    """
+    Processes the bus at the front of the queue: decides what happens to it,
+    then re-queues it later (DELAYED) or removes it (DEPARTED or CANCELLED).
+    This is one iteration of every heap-based engine's loop.
+
+    Parameters:
+    buses (IndexedHeap or CalendarQueue): Non-empty queue of bus records.
+    delay_count (list of int): Delays so far by trip id; the entry for a
+                               delayed trip is incremented.
+    policy (Policy): Operating policy.
+
+    Returns:
+    tuple: (trip, record, new_passengers) - the trip id processed, its
+           structured record, and the passengers it was re-queued with
+           (None unless it was delayed).
+    """
+    bus = buses.peek()
+    trip = buses.peek_id()
+    bus_number, location, time, passengers, capacity = bus
+    action = decide(bus, delay_count[trip], policy)
+    if action == DELAYED:
+        # Not enough passengers — delay the bus
+        delay_count[trip] += 1
+        new_time = time + policy.delay_minutes
+        new_passengers = policy.passengers_increase(passengers)
+        delay_min(buses, new_time, new_passengers)
+        return trip, (action, bus_number, location, new_time, passengers, capacity), new_passengers
+    # Bus departs, or is cancelled after max_delays delays
+    delete_min(buses)
+    return trip, (action, bus_number, location, time, passengers, capacity), None
+
+
+# Output levels for simulation()
+SILENT = "silent"      # print nothing
+EVENTS = "events"      # print each record as it happens
+SUMMARY = "summary"    # print only the final records
+TRACE = "trace"        # print events, the heap after every event and the summary
+OUTPUT_LEVELS = (SILENT, EVENTS, SUMMARY, TRACE)
+
+# Fields of a structured record returned by simulation()
+RECORD_FIELDS = ("action", "bus_number", "location", "time", "passengers", "capacity")
+
+
+class BufferedWriter:
     """
-    hours = time // 100
-    minutes = time % 100
-    minutes += 30
-    if minutes >= 60:
-        minutes -= 60
-        hours += 1
-    if hours >= 24:
-        hours -= 24
-    return hours * 100 + minutes
-
-def passengers_increase(passengers):
-    increase = 0.2*(passengers)
-    new = passengers + math.ceil(increase)
-    return new
-
-
-def build_min_heap(heap):
+    Collects output lines and writes them to a stream in large blocks.
+
+    Parameters:
+    stream (file-like): Destination with a write() method.
+    block_size (int): Number of characters buffered before a write.
+    """
+
+    def __init__(self, stream, block_size=1 << 16):
+        self.stream = stream
+        self.block_size = block_size
+        self.lines = []
+        self.size = 0
+
+    def write_line(self, line):
+        """Queues one line of output, flushing once a block is full."""
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Writes all queued lines to the stream."""
+        if self.lines:
+            self.lines.append("")
+            self.stream.write("\n".join(self.lines))
+            self.lines = []
+            self.size = 0
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+
+def format_record(record, max_delays=DEFAULT_POLICY.max_delays):
     """
-    Converts a list into a valid min-heap using successive insertions.
+    Formats a structured record as the line printed for it.
 
     Parameters:
-    heap (list): A list of bus records where each record is a tuple:
-                 (bus_number, location, time, passengers, capacity).
+    record (tuple): (action, bus_number, location, time, passengers, capacity),
+                    where time is in absolute minutes and is the new time
+                    for a DELAYED record.
+    max_delays (int): Delay limit quoted in CANCELLED records.
 
     Returns:
-    None: The input list is transformed into a min-heap in-place.
+    str: The human-readable record, with the time in HHMM (hours past 23
+         for later days).
     """
-    temp = []
-    for bus in heap:
-        insert_min(temp, bus)
-    heap.clear()
-    heap.extend(temp)
+    action, bus_number, location, time, passengers, capacity = record
+    time = minutes_to_hhmm(time)
+    if action == "DEPARTED":
+        return f"Bus {bus_number} to {location} DEPARTED at {time} (Passengers: {passengers}, Capacity: {capacity})"
+    if action == "DELAYED":
+        return f"Bus {bus_number} to {location} DELAYED to {time} (Passengers: {passengers}, Capacity: {capacity})"
+    return f"Bus {bus_number} to {location} at {time} CANCELLED after {max_delays} delays."
 
 
-def print_heap(heap):
+def print_heap(heap, out=None):
     """
     Prints the current state of the heap in a readable vertical format.
 
     Parameters:
     heap (list): The current min-heap of buses.
+    out (BufferedWriter or None): Where to write; stdout if None.
 
     Returns:
     None
     """
-    print("\nCurrent Heap:")
-    for bus in heap:
-        print(bus)
-    print()
+    if out is None:
+        out = BufferedWriter(sys.stdout)
+        print_heap(heap, out)
+        out.flush()
+        return
+    out.write_line("\nCurrent Heap:")
+    for bus_number, location, time, passengers, capacity in heap:
+        out.write_line(str((bus_number, location, minutes_to_hhmm(time), passengers, capacity)))
+    out.write_line("")
+
+
+def print_summary(records, out, policy=DEFAULT_POLICY):
+    """Writes the end-of-run summary listing every record."""
+    out.write_line("\nSimulation complete.")
+    out.write_line("\n=== FINAL RECORDS ===")
+    for record in records:
+        out.write_line(format_record(record, policy.max_delays))
 
 
-def simulation(filename):
+def simulation(filename, output=TRACE, stream=None, scheduler="heap", policy=DEFAULT_POLICY,
+               report=None, event_log=None, index=None):
     """
     Simulates the operation of a bus scheduling system using a min-heap.
     
     Each bus is processed based on its scheduled time. Buses with low occupancy
     (< 70%) are delayed by 30 minutes up to 2 times. On the third occurrence,
-    they are canceled. Otherwise, buses depart as scheduled.
+    they are canceled. Otherwise, buses depart as scheduled. These numbers
+    and the passenger growth while delayed come from ``policy``.
 
     Parameters:
     filename (str): Path to the file containing bus schedule data.
                     Each entry should be a tuple:
                     (bus_number, location, time, passengers, capacity)
+    output (str): How much to print: SILENT, EVENTS, SUMMARY or TRACE
+                  (every event plus the heap after it; the original output).
+    stream (file-like or None): Where output goes; stdout if None. Output is
+                                buffered and written in large blocks.
+    scheduler (str): "heap" for the binary heap, "calendar" for a
+                     calendar queue bucketed by 30-minute slot, which suits
+                     long multi-day schedules, or "compact" for the binary
+                     heap over typed columns, for fleets in the millions.
+    policy (Policy): Operating policy; DEFAULT_POLICY is the one described above.
+    report (str, file-like or None): If given, the run is instrumented and a
+                                     JSON report is written there: seconds
+                                     spent loading, building, in the event
+                                     loop and writing output, plus heap
+                                     helper counters (see instrument.py).
+    event_log (str, binary file or None): If given, every event is recorded
+                                          there as a compact binary log with
+                                          periodic queue snapshots, for
+                                          seeking and replay (see event_log.py).
+    index (ScheduleIndex or None): If given, loaded with the schedule and kept
+                                   up to date as buses are delayed and leave
+                                   the queue (see schedule_index.py).
 
     Returns:
-    None: Outputs simulation results to the console.
+    list of tuples: The actions taken, in processing order, each as
+                    (action, bus_number, location, time, passengers, capacity)
+                    with action one of "DEPARTED", "DELAYED" or "CANCELLED"
+                    and time in absolute minutes (see format_record).
     """
-    # Step 1: Read data from file
-    buses = read(filename)  # Expected format: (bus_number, location, time, passengers, capacity)
+    if scheduler not in SCHEDULERS:
+        raise ValueError(f"unknown scheduler {scheduler!r}; expected one of {tuple(SCHEDULERS)}")
+    if output not in OUTPUT_LEVELS:
+        raise ValueError(f"unknown output level {output!r}; expected one of {OUTPUT_LEVELS}")
+    out = BufferedWriter(stream if stream is not None else sys.stdout)
+    show_events = output in (EVENTS, TRACE)
+    show_heap = output == TRACE
+
+    timer = counters = None
+    if report is not None:
+        from instrument import PhaseTimer, TimedWriter
+
+        timer = PhaseTimer()
+        out = TimedWriter(out, timer)
+        timer.start("load")
+
+    # Step 1: Read data from file, with times converted to absolute minutes
+    if scheduler == "compact":
+        buses = load_columns(filename)
+    else:
+        buses = load_records(filename)  # Expected format: (bus_number, location, time, passengers, capacity)
+
+    if timer:
+        timer.start("build")
+    if index is not None:
+        index.load(buses)
 
     # Step 2: Build a min-heap based on time (3rd element of tuple)
-    build_min_heap(buses)
+    buses = SCHEDULERS[scheduler](buses)
+    if timer:
+        counters = heap_helperfunctions.count(buses)
 
-    # Dictionary to track how many times a bus has been delayed
-    delay_count = {}
+    # How many times each trip has been delayed, by trip id (schedule row),
+    # so rows that share a bus number are counted separately
+    delay_count = [0] * len(buses)
 
     # Record of actions taken on each bus
     records = []
 
-    print_heap(buses)
-
-    # Step 3: Simulation loop
-    while buses:
-        current_bus = buses[0]  # Peek at the first bus in the heap (earliest scheduled)
-        bus_number, location, time, passengers, capacity = current_bus
-
-        if passengers < 0.7 * capacity:
-            # Not enough passengers — consider delay or cancellation
-            delay_count[bus_number] = delay_count.get(bus_number, 0) + 1
-
-            if delay_count[bus_number] > 2:
-                # Cancel bus after 2 delays
-                delete_min(buses)
-                msg = f"Bus {bus_number} to {location} at {time} CANCELLED after 2 delays."
-                print(msg)
-                records.append(msg)
-            else:
-                # Delay bus by 30 minutes
-                new_time = time_add_30(time)
-                new_passengers = passengers_increase(passengers)
-                delayed_bus = (bus_number, location, new_time, new_passengers, capacity)
-
-                delete_min(buses)
-                insert_min(buses, delayed_bus)
-
-                msg = f"Bus {bus_number} to {location} DELAYED to {new_time} (Passengers: {passengers}, Capacity: {capacity})"
-                print(msg)
-                records.append(msg)
-
-        else:
-            # Bus has enough passengers — depart
-            delete_min(buses)
-            msg = f"Bus {bus_number} to {location} DEPARTED at {time} (Passengers: {passengers}, Capacity: {capacity})"
-            print(msg)
-            records.append(msg)
-
-        print_heap(buses)
+    max_delays = policy.max_delays
+
+    recorder = None
+    try:
+        if event_log is not None:
+            from event_log import EventLogWriter
+
+            recorder = EventLogWriter(event_log)
+            recorder.keyframe(buses)
+
+        if show_heap:
+            print_heap(buses, out)
 
+        if timer:
+            timer.start("loop")
+        # Step 3: Simulation loop
+        while buses:
+            # Process the earliest scheduled bus
+            trip, record, new_passengers = process_next(buses, delay_count, policy)
+
+            records.append(record)
+            if index is not None:
+                if new_passengers is not None:
+                    _, bus_number, location, new_time, _, capacity = record
+                    index.update(trip, (bus_number, location, new_time, new_passengers, capacity))
+                else:
+                    index.remove(trip)
+            if recorder is not None:
+                recorder.event(record, buses, new_passengers)
+            if show_events:
+                out.write_line(format_record(record, max_delays))
+            if show_heap:
+                print_heap(buses, out)
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    if timer:
+        timer.start("output")
     # Output final summary
-    print("\nSimulation complete.")
-    print("\n=== FINAL RECORDS ===")
-    for record in records:
-        print(record)
+    if output in (SUMMARY, TRACE):
+        print_summary(records, out, policy)
+    out.flush()
+
+    if timer:
+        from instrument import build_report, write_report
+
+        timer.stop()
+        write_report(build_report(filename, timer, counters, records, scheduler=scheduler,
+                                  output=output, policy=policy.as_dict()), report)
+
+    return records
 
 
-# Run the simulation
-simulation("BUS.txt")
-simulation("BUS2.txt")
+if __name__ == "__main__":
+    # Run the simulation
+    simulation("BUS.txt")
+    simulation("BUS2.txt")
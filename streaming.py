@@ -0,0 +1,190 @@
+import argparse
+import heapq
+import os
+import struct
+import sys
+import tempfile
+
+from bus_columns import LocationTable
+from input import hhmm_to_minutes, iter_chunks
+from simulation import DELAYED, DEFAULT_POLICY, BufferedWriter, decide, format_record
+
+# Rows held in memory per sorted run when unsorted input is spilled to disk
+RUN_ROWS = 1 << 20
+
+# Spilled row: time (minutes), row, bus_number, location id, passengers, capacity
+_SPILL = struct.Struct("<qqqiqq")
+_READ_ROWS = 4096
+
+
+def iter_rows(filename, quarantine=None):
+    """
+    Streams a schedule as (time, row, bus_number, city_code, passengers,
+    capacity) tuples in file order, times in absolute minutes and row the
+    trip id simulation() gives the record.
+    """
+    row = 0
+    for chunk in iter_chunks(filename, quarantine=quarantine):
+        for bus_number, city_code, time, passengers, capacity in chunk:
+            yield hhmm_to_minutes(time), row, bus_number, city_code, passengers, capacity
+            row += 1
+
+
+def is_time_sorted(filename):
+    """Returns True if the schedule's times never decrease (one streaming pass)."""
+    previous = None
+    for time, *_ in iter_rows(filename, quarantine=[]):
+        if previous is not None and time < previous:
+            return False
+        previous = time
+    return True
+
+
+def _spill(rows, locations, directory):
+    """Sorts one run of rows and writes it to a temporary file; returns the path."""
+    rows.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for time, row, bus_number, city_code, passengers, capacity in rows:
+            f.write(_SPILL.pack(time, row, bus_number, locations.intern(city_code), passengers, capacity))
+    return path
+
+
+def _read_run(path, locations):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(_SPILL.size * _READ_ROWS)
+            if not block:
+                return
+            for time, row, bus_number, location, passengers, capacity in _SPILL.iter_unpack(block):
+                yield time, row, bus_number, locations.codes[location], passengers, capacity
+
+
+def external_sort(filename, run_rows=RUN_ROWS, directory=None, quarantine=None):
+    """
+    Streams a schedule's rows sorted by (time, row), holding at most
+    run_rows of them in memory.
+
+    Rows are read in runs of run_rows, each run is sorted and spilled to a
+    temporary file, and the runs are k-way merged back with heapq.merge.
+    The files are removed once the merge finishes or is abandoned.
+
+    Parameters:
+    filename (str): Path to the schedule file.
+    run_rows (int): Rows per sorted run.
+    directory (str or None): Where runs are spilled; the system temporary
+                             directory if None.
+    quarantine (list or None): Receives malformed lines (see input.read).
+
+    Yields:
+    tuple: (time, row, bus_number, city_code, passengers, capacity)
+    """
+    locations = LocationTable()
+    paths = []
+    try:
+        run = []
+        for row in iter_rows(filename, quarantine):
+            run.append(row)
+            if len(run) >= run_rows:
+                paths.append(_spill(run, locations, directory))
+                run = []
+        if not paths:
+            # Everything fit in one run: no need to touch the disk
+            run.sort()
+            yield from run
+            return
+        if run:
+            paths.append(_spill(run, locations, directory))
+        yield from heapq.merge(*(_read_run(path, locations) for path in paths))
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
+def stream_simulation(filename, sink, policy=DEFAULT_POLICY, presorted=None, run_rows=RUN_ROWS,
+                      directory=None, quarantine=None):
+    """
+    Simulates a schedule in memory proportional to its busiest window
+    rather than to the file.
+
+    Rows are pulled lazily in time order and admitted to a heap just before
+    they are due. A bus leaves the heap within max_delays * delay_minutes of
+    its scheduled time, so the heap only ever holds buses scheduled in that
+    window. The heap is only popped while its top comes before the next
+    unread row in (time, row) order, so every event is final when it is
+    emitted and events come out exactly as simulation() would produce them.
+
+    Parameters:
+    filename (str): Path to the schedule file.
+    sink (callable): Called with each structured record as it becomes final.
+    policy (simulation.Policy): Operating policy, as for simulation().
+    presorted (bool or None): Whether the file is sorted by time; if None, a
+                              first streaming pass checks. Unsorted files go
+                              through external_sort().
+    run_rows (int): Rows per sorted run for external_sort().
+    directory (str or None): Where external_sort() spills runs.
+    quarantine (list or None): Receives malformed lines (see input.read).
+
+    Returns:
+    dict: ``events`` emitted, ``rows`` read and ``peak_window`` (most buses
+          in the heap at once).
+    """
+    if presorted is None:
+        presorted = is_time_sorted(filename)
+    if presorted:
+        rows = iter_rows(filename, quarantine)
+    else:
+        rows = external_sort(filename, run_rows, directory, quarantine)
+
+    delay_minutes = policy.delay_minutes
+
+    # Entries: [time, row, delays, passengers, bus_number, location, capacity]
+    heap = []
+    events = admitted = peak = 0
+    pending = next(rows, None)
+    while heap or pending is not None:
+        if pending is not None and (not heap or (pending[0], pending[1]) < (heap[0][0], heap[0][1])):
+            time, row, bus_number, location, passengers, capacity = pending
+            heapq.heappush(heap, [time, row, 0, passengers, bus_number, location, capacity])
+            admitted += 1
+            peak = max(peak, len(heap))
+            pending = next(rows, None)
+            continue
+        entry = heap[0]
+        time, _, delays, passengers, bus_number, location, capacity = entry
+        action = decide((bus_number, location, time, passengers, capacity), delays, policy)
+        if action == DELAYED:
+            entry[0] = time + delay_minutes
+            entry[2] = delays + 1
+            entry[3] = policy.passengers_increase(passengers)
+            heapq.heapreplace(heap, entry)
+            record = (action, bus_number, location, time + delay_minutes, passengers, capacity)
+        else:
+            heapq.heappop(heap)
+            record = (action, bus_number, location, time, passengers, capacity)
+        sink(record)
+        events += 1
+    return {"events": events, "rows": admitted, "peak_window": peak}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a schedule of any size in bounded memory.")
+    parser.add_argument("schedule")
+    parser.add_argument("--sorted", dest="presorted", action="store_true", default=None,
+                        help="trust that the schedule is sorted by time (skips the check)")
+    parser.add_argument("--unsorted", dest="presorted", action="store_false",
+                        help="always sort the schedule on disk first")
+    parser.add_argument("--run-rows", type=int, default=RUN_ROWS, help="rows per sorted run when sorting")
+    parser.add_argument("--spill-dir", help="directory for sorted runs (default: system temp)")
+    args = parser.parse_args(argv)
+
+    out = BufferedWriter(sys.stdout)
+    stats = stream_simulation(args.schedule, lambda record: out.write_line(format_record(record)),
+                              presorted=args.presorted, run_rows=args.run_rows, directory=args.spill_dir)
+    out.flush()
+    print(f"{stats['events']} events from {stats['rows']} rows; at most {stats['peak_window']} buses held",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import csv
+import itertools
+import os
+import time as clock
+from concurrent.futures import ProcessPoolExecutor
+
+from heap_helperfunctions import IndexedHeap
+from schedule_cache import load_schedule
+from simulation import Policy, process_next
+
+# Columns of the result table, in order
+METRICS = ("schedule", "threshold", "max_delays", "delay_minutes", "growth",
+           "buses", "departed", "cancelled", "delays", "cancel_rate",
+           "mean_delay_minutes", "mean_load_factor", "seconds")
+
+# Schedules loaded by this worker process: filename -> Schedule
+_schedules = {}
+# Bus records of those schedules, for the heap engine: filename -> list
+_records = {}
+
+
+def policy_grid(threshold=(0.7,), max_delays=(2,), delay_minutes=(30,), growth=(0.2,)):
+    """
+    Builds every combination of the given policy settings.
+
+    Returns:
+    list of Policy: One policy per combination.
+    """
+    return [Policy(*values) for values in itertools.product(threshold, max_delays, delay_minutes, growth)]
+
+
+def _schedule(filename):
+    """Loads a schedule once per worker process (memory-mapped cache)."""
+    schedule = _schedules.get(filename)
+    if schedule is None:
+        schedule = _schedules[filename] = load_schedule(filename, quarantine=[])
+    return schedule
+
+
+def _heap_records(filename, policy):
+    """
+    Runs the heap engine on a copy of the worker's records for a schedule,
+    parsed once per worker however many policies are run on it.
+
+    Returns:
+    list of tuples: Structured records, as simulation() returns them.
+    """
+    records = _records.get(filename)
+    if records is None:
+        records = _records[filename] = _schedule(filename).records()
+    buses = IndexedHeap(list(records))
+    delay_count = [0] * len(buses)
+    events = []
+    while buses:
+        events.append(process_next(buses, delay_count, policy)[1])
+    return events
+
+
+def _summarize_events(np, events, schedule, policy):
+    """Summary metrics from the analytic engine's event arrays."""
+    from analytic import ACTION_CANCELLED, ACTION_DELAYED, ACTION_DEPARTED
+
+    action = events["action"]
+    departed = action == ACTION_DEPARTED
+    buses = len(schedule)
+    delays = int(np.count_nonzero(action == ACTION_DELAYED))
+    cancelled = int(np.count_nonzero(action == ACTION_CANCELLED))
+    load = events["passengers"][departed] / events["capacity"][departed]
+    return {
+        "buses": buses,
+        "departed": int(np.count_nonzero(departed)),
+        "cancelled": cancelled,
+        "delays": delays,
+        "cancel_rate": cancelled / buses if buses else 0.0,
+        "mean_delay_minutes": delays * policy.delay_minutes / buses if buses else 0.0,
+        "mean_load_factor": float(load.mean()) if len(load) else 0.0,
+    }
+
+
+def summarize(records, policy):
+    """
+    Summary metrics for one run from simulation()'s structured records.
+
+    Returns:
+    dict: buses, departed, cancelled, delays, cancel_rate,
+          mean_delay_minutes and mean_load_factor.
+    """
+    departed = cancelled = delays = 0
+    load_total = 0.0
+    for action, _, _, _, passengers, capacity in records:
+        if action == "DELAYED":
+            delays += 1
+        elif action == "CANCELLED":
+            cancelled += 1
+        else:
+            departed += 1
+            load_total += passengers / capacity
+    buses = departed + cancelled
+    return {
+        "buses": buses,
+        "departed": departed,
+        "cancelled": cancelled,
+        "delays": delays,
+        "cancel_rate": cancelled / buses if buses else 0.0,
+        "mean_delay_minutes": delays * policy.delay_minutes / buses if buses else 0.0,
+        "mean_load_factor": load_total / departed if departed else 0.0,
+    }
+
+
+def run_one(filename, policy, engine="heap"):
+    """
+    Runs one (schedule, policy) pair and returns its row of the result table.
+
+    Parameters:
+    filename (str): Path to the schedule file.
+    policy (Policy): Operating policy to evaluate.
+    engine (str): "heap" (the simulation() loop over records loaded once
+                  per worker) or "analytic" (vectorized, needs NumPy).
+
+    Returns:
+    dict: One row keyed by METRICS.
+    """
+    start = clock.perf_counter()
+    if engine == "analytic":
+        import numpy as np
+        from analytic import outcomes
+
+        schedule = _schedule(filename)
+        events = outcomes(schedule.time, schedule.passengers, schedule.capacity, policy)
+        row = _summarize_events(np, events, schedule, policy)
+    elif engine == "heap":
+        row = summarize(_heap_records(filename, policy), policy)
+    else:
+        raise ValueError(f"unknown engine {engine!r}; expected 'analytic' or 'heap'")
+    row["seconds"] = clock.perf_counter() - start
+    row["schedule"] = filename
+    row.update(policy.as_dict())
+    return {name: row[name] for name in METRICS}
+
+
+def _run_task(task):
+    return run_one(*task)
+
+
+def run_sweep(schedules, policies, engine="heap", workers=None):
+    """
+    Evaluates every (schedule, policy) pair over a process pool.
+
+    Tasks are ordered schedule by schedule and handed out in chunks, so each
+    worker tends to stay on one schedule, and a worker loads any schedule
+    only once (through the memory-mapped cache, whose pages are shared
+    between workers).
+
+    Parameters:
+    schedules (list of str): Schedule files.
+    policies (list of Policy): Policies to evaluate on every schedule.
+    engine (str): "heap" or "analytic" (see run_one).
+    workers (int or None): Process count; defaults to the CPU count.
+
+    Returns:
+    list of dict: One row per (schedule, policy) pair, in input order.
+    """
+    schedules = list(schedules)
+    for filename in schedules:
+        load_schedule(filename)  # compile caches once, before the workers start
+    tasks = [(filename, policy, engine) for filename in schedules for policy in policies]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        return [_run_task(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_task, tasks, chunksize=chunksize))
+
+
+def write_table(rows, path):
+    """Writes sweep results as CSV with one column per metric."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=METRICS)
+        writer.writeheader()
+        writer.writerows(rows)
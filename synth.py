@@ -0,0 +1,119 @@
+import argparse
+
+# Real city codes used first, then synthetic ones (L08, L09, ...)
+CITY_CODES = ("LHE", "ISB", "HYD", "MUL", "SIA", "SUK", "QUE", "PES", "GUJ", "NAW")
+
+TIME_DISTRIBUTIONS = ("uniform", "peaks")
+OCCUPANCY_DISTRIBUTIONS = ("uniform", "beta")
+
+# Rows generated and written per block, to keep memory flat
+BLOCK_ROWS = 1 << 20
+
+
+def location_codes(count):
+    """Returns ``count`` distinct city codes."""
+    codes = list(CITY_CODES[:count])
+    codes.extend(f"L{i:02d}" for i in range(len(codes), count))
+    return codes
+
+
+def _times(rng, size, distribution, days):
+    """Draws departure times in absolute minutes."""
+    import numpy as np
+
+    day = rng.integers(0, days, size) * 24 * 60
+    if distribution == "uniform":
+        return day + rng.integers(0, 24 * 60, size)
+    # "peaks": morning and evening rush hours over a thin all-day background
+    which = rng.choice(3, size, p=(0.4, 0.4, 0.2))
+    centre = np.choose(which, (8 * 60, 17 * 60 + 30, 12 * 60))
+    spread = np.choose(which, (60, 75, 300))
+    minutes = np.rint(rng.normal(centre, spread)).astype(np.int64)
+    return day + np.clip(minutes, 0, 24 * 60 - 1)
+
+
+def _load_factors(rng, size, distribution, beta):
+    """Draws occupancy as a fraction of capacity."""
+    if distribution == "uniform":
+        return rng.uniform(0.0, 1.1, size)
+    return rng.beta(beta[0], beta[1], size) * 1.1
+
+
+def generate_schedule(path, size, seed=0, locations=10, time_distribution="uniform",
+                      occupancy="uniform", beta=(4.0, 2.0), capacity=(12, 60), days=1,
+                      sort=False):
+    """
+    Writes a deterministic synthetic schedule in the format input.read expects.
+
+    The same arguments always produce the same file. Bus numbers are
+    1..size, so the schedule suits every engine.
+
+    Parameters:
+    path (str): Output file.
+    size (int): Number of buses.
+    seed (int): Random seed.
+    locations (int): Number of distinct city codes.
+    time_distribution (str): "uniform" over the day or "peaks" (rush hours).
+    occupancy (str): "uniform" load factor in [0, 1.1) or "beta" with ``beta``.
+    beta (tuple): (a, b) parameters of the beta occupancy distribution.
+    capacity (tuple): Inclusive (low, high) range of bus capacities.
+    days (int): Number of days the departures spread over (HHMM past 2359).
+    sort (bool): Write buses in time order (e.g. for the sorted-input fast path).
+
+    Returns:
+    None
+    """
+    import numpy as np
+
+    if time_distribution not in TIME_DISTRIBUTIONS:
+        raise ValueError(f"unknown time distribution {time_distribution!r}")
+    if occupancy not in OCCUPANCY_DISTRIBUTIONS:
+        raise ValueError(f"unknown occupancy distribution {occupancy!r}")
+    codes = np.array(location_codes(locations))
+    rng = np.random.default_rng(seed)
+    order = None
+    if sort:
+        # Sorting needs every time up front; draw them from their own stream
+        order_rng = np.random.default_rng([seed, 1])
+        all_times = _times(order_rng, size, time_distribution, days)
+        order = np.argsort(all_times, kind="stable")
+        all_times = all_times[order]
+
+    with open(path, "w") as f:
+        for start in range(0, size, BLOCK_ROWS):
+            rows = min(BLOCK_ROWS, size - start)
+            if sort:
+                times = all_times[start:start + rows]
+                bus_numbers = order[start:start + rows] + 1
+            else:
+                times = _times(rng, rows, time_distribution, days)
+                bus_numbers = np.arange(start + 1, start + rows + 1)
+            cities = codes[rng.integers(0, locations, rows)]
+            caps = rng.integers(capacity[0], capacity[1] + 1, rows)
+            load = _load_factors(rng, rows, occupancy, beta)
+            passengers = np.minimum(np.rint(load * caps).astype(np.int64), caps)
+            hhmm = (times // 60) * 100 + times % 60
+            f.write("".join(
+                f"{bus} {city} {time:04d} {p} {c}\n"
+                for bus, city, time, p, c in zip(bus_numbers.tolist(), cities.tolist(), hhmm.tolist(),
+                                                 passengers.tolist(), caps.tolist())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic bus schedule.")
+    parser.add_argument("path")
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--locations", type=int, default=10)
+    parser.add_argument("--times", choices=TIME_DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--occupancy", choices=OCCUPANCY_DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--sort", action="store_true")
+    args = parser.parse_args(argv)
+    generate_schedule(args.path, args.size, seed=args.seed, locations=args.locations,
+                      time_distribution=args.times, occupancy=args.occupancy,
+                      days=args.days, sort=args.sort)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import pytest
+
+from analytic import analytic_simulation, verify_against_heap
+from simulation import SILENT, simulation
+
+pytest.importorskip("numpy")
+
+
+def test_analytic_matches_heap(schedule, policy):
+    assert analytic_simulation(schedule, policy) == simulation(schedule, SILENT, policy=policy)
+
+
+def test_verify_against_heap_passes(schedule):
+    verify_against_heap(schedule)
@@ -0,0 +1,21 @@
+from bus_columns import BusColumns, LocationTable
+from schedule_cache import load_columns, load_records
+from simulation import SILENT, simulation
+
+
+def test_compact_matches_heap(schedule, policy):
+    expected = simulation(schedule, SILENT, policy=policy)
+    assert simulation(schedule, SILENT, scheduler="compact", policy=policy) == expected
+
+
+def test_columns_hold_the_records(schedule):
+    columns = load_columns(schedule, [])
+    assert isinstance(columns, BusColumns)
+    assert list(columns) == load_records(schedule, [])
+
+
+def test_location_table_interns_once():
+    table = LocationTable()
+    assert table.intern("LHE") == table.intern("LHE") == 0
+    assert table.intern("ISB") == 1
+    assert table.codes == ["LHE", "ISB"]
@@ -0,0 +1,61 @@
+import heapq
+import random
+
+import pytest
+
+from calendar_queue import CalendarQueue
+from simulation import SILENT, simulation
+
+
+def test_calendar_matches_heap(schedule, policy):
+    expected = simulation(schedule, SILENT, policy=policy)
+    assert simulation(schedule, SILENT, scheduler="calendar", policy=policy) == expected
+
+
+def _drain(queue):
+    times = []
+    while queue:
+        times.append(queue.pop()[2])
+    return times
+
+
+def test_times_far_past_the_ring():
+    # Eight buckets, with times hundreds of turns of the ring apart
+    records = [(i, "LHE", time, 0, 1) for i, time in enumerate([5, 1 << 29, 40, 30 * 8 * 1000 + 7, 5, 200000])]
+    queue = CalendarQueue(records, buckets=8)
+    assert len(queue.buckets) == 8
+    assert _drain(queue) == sorted(record[2] for record in records)
+
+
+def test_far_future_time_keeps_buckets_bounded():
+    records = [(i, "LHE", i, 0, 1) for i in range(100)] + [(100, "LHE", (1 << 30) - 1, 0, 1)]
+    queue = CalendarQueue(records)
+    assert len(queue.buckets) <= 128
+    assert _drain(queue) == sorted(record[2] for record in records)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_heapq_under_mixed_operations(seed):
+    rng = random.Random(seed)
+    spread = rng.choice([10, 5000, 10**6])
+    records = [(i, "X", rng.randint(0, spread), 0, 1) for i in range(rng.randint(0, 100))]
+    queue = CalendarQueue(records, buckets=rng.choice([None, 1, 2, 8]))
+    reference = [(record[2], pid) for pid, record in enumerate(records)]
+    heapq.heapify(reference)
+    for _ in range(400):
+        operation = rng.random()
+        if operation < 0.2 or not reference:
+            time = rng.randint(0, spread * 2)
+            pid = queue.push((0, "X", time, 0, 1))
+            heapq.heappush(reference, (time, pid))
+        elif operation < 0.6:
+            assert queue.peek_id() == heapq.heappop(reference)[1]
+            queue.pop()
+        else:
+            time, pid = reference[0]
+            assert queue.peek_id() == pid
+            time += rng.choice([0, 1, 30, 500, 10**5])
+            queue.replace_top((0, "X", time, 0, 1))
+            heapq.heapreplace(reference, (time, pid))
+        assert len(queue) == len(reference)
+    assert [key for key, _ in queue.entries()] == [(time << 32) | pid for time, pid in sorted(reference)]
@@ -0,0 +1,38 @@
+import random
+
+from event_log import EventLog
+from live import LiveSimulation
+from schedule_cache import load_records
+from simulation import SILENT, simulation
+
+
+def test_event_log_replays_run(schedule, tmp_path):
+    log_path = tmp_path / "run.buslog"
+    records = simulation(schedule, SILENT, event_log=str(log_path))
+    log = EventLog(str(log_path))
+    assert log.records() == records
+
+    # The queue after every event, from the engine itself
+    live = LiveSimulation(load_records(schedule))
+    queues = [sorted(live.heap.entries())]
+    while live.heap:
+        live.step()
+        queues.append(sorted(live.heap.entries()))
+    assert live.records == records
+
+    positions = list(range(len(queues)))
+    random.Random(0).shuffle(positions)
+    for position in positions[:50] + [0, len(records)]:
+        assert sorted(log.heap_at(position).entries()) == queues[position]
+
+
+def test_event_log_holds_large_counts(tmp_path):
+    # Passengers and capacities past 2**31 parse fine, so the log must hold them
+    path = tmp_path / "large.txt"
+    path.write_text("1 LHE 0600 3000000000 4000000000\n2 ISB 0600 10 5000000000\n")
+    log_path = tmp_path / "large.buslog"
+    records = simulation(str(path), SILENT, event_log=str(log_path))
+    log = EventLog(str(log_path))
+    assert log.records() == records
+    assert (1, "LHE", 360, 3000000000, 4000000000) in log.heap_at(0).payloads
+    assert max(log.new_passengers) > 2 ** 31
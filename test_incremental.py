@@ -0,0 +1,70 @@
+import random
+from pathlib import Path
+
+import pytest
+
+from incremental import IncrementalSimulation, trip_events
+from simulation import SILENT, simulation
+
+pytest.importorskip("numpy")
+
+
+def _edit(lines, rng):
+    lines = list(lines)
+    for _ in range(rng.randint(1, 5)):
+        i = rng.randrange(len(lines))
+        kind = rng.choice(["change", "insert", "delete", "move"])
+        if kind == "change":
+            fields = lines[i].split()
+            fields[rng.choice([2, 3, 4])] = str(rng.choice([600, 1230, 15, 40, 2]))
+            lines[i] = " ".join(fields)
+        elif kind == "insert":
+            lines.insert(i, f"{rng.randint(1, 9)} {rng.choice(['LHE', 'ISB'])} 0{rng.randint(6, 9)}15 "
+                            f"{rng.randint(0, 40)} {rng.randint(20, 40)}")
+        elif kind == "delete" and len(lines) > 1:
+            del lines[i]
+        else:
+            lines.insert(rng.randrange(len(lines)), lines.pop(i))
+    return lines
+
+
+def test_incremental_matches_full_run(schedule, tmp_path):
+    inc = IncrementalSimulation(schedule)
+    assert inc.records() == simulation(schedule, SILENT)
+
+    rng = random.Random(1)
+    lines = Path(schedule).read_text().splitlines()
+    for version in range(8):
+        lines = _edit(lines, rng)
+        path = tmp_path / f"edited{version}.txt"
+        path.write_text("\n".join(lines) + "\n")
+        inc.update(str(path))
+        assert inc.records() == simulation(str(path), SILENT), f"edit {version}"
+
+
+def test_delta_turns_old_records_into_new(schedule, tmp_path):
+    inc = IncrementalSimulation(schedule)
+    old = inc.records()
+    lines = _edit(Path(schedule).read_text().splitlines(), random.Random(2))
+    path = tmp_path / "edited.txt"
+    path.write_text("\n".join(lines) + "\n")
+    delta = inc.update(str(path))
+    removed = {position for position, _ in delta.removed}
+    assert all(old[position] == record for position, record in delta.removed)
+    kept = iter(record for position, record in enumerate(old) if position not in removed)
+    added = dict(delta.added)
+    new = inc.records()
+    assert [added[position] if position in added else next(kept) for position in range(len(new))] == new
+
+
+def test_unchanged_file_gives_empty_delta(schedule):
+    inc = IncrementalSimulation(schedule)
+    assert not inc.update(schedule)
+
+
+def test_trip_events_match_simulation(tmp_path, policy):
+    path = tmp_path / "one.txt"
+    for passengers in (0, 5, 7, 10):
+        path.write_text(f"1 LHE 1000 {passengers} 10\n")
+        events = [record for _, record in trip_events((1, "LHE", 600, passengers, 10), 0, policy)]
+        assert events == simulation(str(path), SILENT, policy=policy)
@@ -0,0 +1,66 @@
+import pytest
+
+from input import MAX_CODE_LENGTH, read, read_columns
+
+MALFORMED = """\
+1 LHE 0600 10 20
+
+2 MÜNCHEN 0700 5 9
+3 ÜÜÜÜÜÜÜÜÜ 0700 5 9
+4 LHE 0799 1 2
+5 LHE 0600 -1 2
+6 LHE 0600 1 0
+7 LHE 0600 1
+8 LHE 0600 1 2 3
+x LHE 0600 1 2
+9 LHE 0600 1234567890123456789 2
+10 LHE 99999999999 1 2
+11 ABCDEFGHIJKLMNOPQ 0600 1 2
+12 KHI 0600 3000000000 3000000000
+"""
+
+
+def _rows(columns):
+    locations = columns["locations"]
+    return list(zip(columns["bus_number"].tolist(), (locations[i] for i in columns["location"].tolist()),
+                    columns["time"].tolist(), columns["passengers"].tolist(), columns["capacity"].tolist()))
+
+
+def test_read_columns_matches_read(schedule):
+    pytest.importorskip("numpy")
+    assert _rows(read_columns(schedule, [])) == read(schedule, [])
+
+
+def test_malformed_rows_are_quarantined(tmp_path):
+    path = tmp_path / "malformed.txt"
+    path.write_text(MALFORMED)
+    quarantine = []
+    records = read(str(path), quarantine)
+    assert records == [(1, "LHE", 600, 10, 20), (2, "MÜNCHEN", 700, 5, 9),
+                       (12, "KHI", 600, 3000000000, 3000000000)]
+    assert [line for line, _, _ in quarantine] == list(range(4, 14))
+    reasons = dict((line, reason) for line, _, reason in quarantine)
+    assert reasons[4] == reasons[13] == f"city_code longer than {MAX_CODE_LENGTH} bytes"
+    assert reasons[5] == "invalid HHMM time 799"
+    assert reasons[8] == "expected 5 fields, found 4"
+
+
+def test_readers_agree_on_malformed_rows(tmp_path):
+    pytest.importorskip("numpy")
+    path = tmp_path / "malformed.txt"
+    path.write_text(MALFORMED)
+    expected, actual = [], []
+    records = read(str(path), expected)
+    assert _rows(read_columns(str(path), actual)) == records
+    assert actual == expected
+
+
+def test_non_ascii_codes_measured_in_bytes(tmp_path):
+    pytest.importorskip("numpy")
+    # 8 characters but 16 bytes fits; 9 characters (18 bytes) does not
+    path = tmp_path / "codes.txt"
+    path.write_text("1 ÄÄÄÄÄÄÄÄ 0600 1 1\n2 ÄÄÄÄÄÄÄÄÄ 0600 1 1\n")
+    for reader in (read, lambda name, quarantine: _rows(read_columns(name, quarantine))):
+        quarantine = []
+        assert reader(str(path), quarantine) == [(1, "ÄÄÄÄÄÄÄÄ", 600, 1, 1)]
+        assert [line for line, _, _ in quarantine] == [2]
@@ -0,0 +1,150 @@
+import asyncio
+import random
+
+import pytest
+
+from input import minutes_to_hhmm
+from live import LiveSimulation, parse_command, serve
+from schedule_cache import load_records
+from simulation import SILENT, simulation
+
+
+def _write_schedule(path, records):
+    with open(path, "w") as f:
+        for bus_number, location, time, passengers, capacity in records:
+            f.write(f"{bus_number} {location} {minutes_to_hhmm(time):04d} {passengers} {capacity}\n")
+    return str(path)
+
+
+def _updates(records, after, seed):
+    """
+    Random updates to trips scheduled after ``after`` (not yet processed),
+    as command tuples, with the schedule they should end up simulating
+    (None for a cancelled trip).
+    """
+    rng = random.Random(seed)
+    final = list(records)
+    commands = []
+    for trip in rng.sample(range(len(records)), len(records) // 3):
+        bus_number, location, time, passengers, capacity = final[trip]
+        if time <= after:
+            continue
+        kind = rng.randrange(3)
+        if kind == 0:
+            passengers = max(0, passengers + rng.randint(-20, 20))
+            commands.append(("BOARD", trip, passengers - final[trip][3]))
+        elif kind == 1:
+            time = after + rng.randint(1, 600)
+            commands.append(("TIME", trip, time))
+        else:
+            commands.append(("CANCEL", trip))
+            final[trip] = None
+            continue
+        final[trip] = (bus_number, location, time, passengers, capacity)
+    for _ in range(5):
+        record = (rng.randint(1, 99), "NEW", after + rng.randint(1, 600), rng.randint(0, 40), 40)
+        commands.append(("TRIP", record))
+        final.append(record)
+    return commands, [record for record in final if record is not None]
+
+
+def _midpoint(records):
+    times = sorted(record[2] for record in records)
+    return times[len(times) // 2]
+
+
+def _serve_queue(live, commands):
+    async def run():
+        updates = asyncio.Queue()
+        for command in commands:
+            updates.put_nowait(command)
+        updates.put_nowait(None)
+        return await serve(live, updates=updates)
+
+    return asyncio.run(run())
+
+
+def test_queue_updates_match_final_schedule(schedule, tmp_path):
+    records = load_records(schedule)
+    after = _midpoint(records)
+    commands, final = _updates(records, after, seed=len(records))
+    live = LiveSimulation(records)
+    result = _serve_queue(live, [("ADVANCE", after)] + commands + [("ADVANCE", None)])
+    assert live.rejected == []
+    assert result == simulation(_write_schedule(tmp_path / "final.txt", final), SILENT)
+
+
+def test_queue_rejects_updates_before_now(schedule):
+    records = load_records(schedule)
+    after = _midpoint(records)
+    live = LiveSimulation(records)
+    earlier = ("TRIP", (1, "OLD", after, 5, 10))
+    reschedule = ("TIME", len(records) - 1, after - 1)
+    result = _serve_queue(live, [("ADVANCE", after), earlier, reschedule, ("ADVANCE", None)])
+    assert [command for command, _ in live.rejected] == [earlier, reschedule]
+    assert result == simulation(schedule, SILENT)
+
+
+def test_queue_applies_updates_in_order():
+    records = [(1, "LHE", 600, 5, 10), (2, "ISB", 610, 5, 10)]
+    live = LiveSimulation(records)
+    commands = [("BOARD", 0, 3), ("TIME", 0, 620), ("CANCEL", 0), ("BOARD", 0, 1), ("ADVANCE", None)]
+    result = _serve_queue(live, commands)
+    assert [command for command, _ in live.rejected] == [("BOARD", 0, 1)]
+    assert [record[1] for record in result] == [2, 2, 2]
+
+
+@pytest.mark.parametrize("line", ["TIME 0 0799", "TIME 0 -100", "ADVANCE 0860", "ADVANCE -5",
+                                  f"ADVANCE {10 ** 12}", "TIME 0 x", "BOARD 0"])
+def test_parse_command_rejects(line):
+    with pytest.raises(ValueError):
+        parse_command(line)
+
+
+def test_parse_command_times():
+    assert parse_command("TIME 3 2430") == ("TIME", 3, 24 * 60 + 30)
+    assert parse_command("advance 0830") == ("ADVANCE", 8 * 60 + 30)
+    assert parse_command("ADVANCE") == ("ADVANCE", None)
+
+
+def test_serve_needs_a_source():
+    with pytest.raises(ValueError):
+        asyncio.run(serve(LiveSimulation([(1, "LHE", 600, 5, 10)])))
+
+
+def test_socket_protocol(schedule, tmp_path):
+    records = load_records(schedule)
+    after = _midpoint(records)
+    commands, final = _updates(records, after, seed=7)
+    lines = [f"ADVANCE {minutes_to_hhmm(after)}"]
+    for command in commands:
+        if command[0] == "TRIP":
+            bus_number, location, time, passengers, capacity = command[1]
+            lines.append(f"TRIP {bus_number} {location} {minutes_to_hhmm(time)} {passengers} {capacity}")
+        elif command[0] == "TIME":
+            lines.append(f"TIME {command[1]} {minutes_to_hhmm(command[2])}")
+        else:
+            lines.append(" ".join(map(str, command)))
+    bad = [f"TIME 0 {minutes_to_hhmm(after)}", "TIME 0 0799", "BOARD x 1", "\xff"]
+    live = LiveSimulation(records)
+
+    async def run():
+        port = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(serve(live, port=0, ready=port.set_result))
+        reader, writer = await asyncio.open_connection("127.0.0.1", await port)
+        replies = []
+        # Everything but the last ADVANCE in one write, split mid-line
+        data = "\n".join(lines + bad).encode() + b"\n"
+        writer.write(data[:len(data) // 2])
+        await writer.drain()
+        writer.write(data[len(data) // 2:])
+        for _ in lines + bad:
+            replies.append((await reader.readline()).decode())
+        writer.write(b"ADVANCE\n")
+        replies.append((await reader.readline()).decode())
+        writer.close()
+        return replies, await server
+
+    replies, result = asyncio.run(run())
+    assert [reply.split()[0] for reply in replies] == ["OK"] * len(lines) + ["ERROR"] * len(bad) + ["OK"]
+    assert result == simulation(_write_schedule(tmp_path / "final.txt", final), SILENT)
@@ -0,0 +1,38 @@
+import pytest
+
+from montecarlo import PoissonArrivals, monte_carlo
+from simulation import SILENT, simulation
+
+np = pytest.importorskip("numpy")
+
+MODEL = PoissonArrivals({"LHE": 0.3}, default=0.1)
+
+
+def _assert_same(a, b):
+    assert a.keys() == b.keys()
+    for name in a:
+        if isinstance(a[name], np.ndarray):
+            np.testing.assert_array_equal(a[name], b[name])
+        else:
+            assert a[name] == b[name]
+
+
+def test_fixed_seed_is_reproducible(schedule):
+    first = monte_carlo(schedule, 50, MODEL, seed=7)
+    _assert_same(first, monte_carlo(schedule, 50, MODEL, seed=7))
+
+
+def test_seeds_differ(schedule):
+    a = monte_carlo(schedule, 50, MODEL, seed=1)
+    b = monte_carlo(schedule, 50, MODEL, seed=2)
+    if a["delay_histogram"][:, 1:].any():
+        assert not np.array_equal(a["load_sum"], b["load_sum"])
+
+
+def test_growth_model_matches_heap(schedule, policy):
+    # With the deterministic model every replication is the heap engine's run
+    result = monte_carlo(schedule, 3, policy=policy)
+    records = simulation(schedule, SILENT, policy=policy)
+    delays = int((result["delay_histogram"] * np.arange(policy.max_delays + 1)).sum())
+    assert delays == 3 * sum(record[0] == "DELAYED" for record in records)
+    assert int(result["cancelled"].sum()) == 3 * sum(record[0] == "CANCELLED" for record in records)
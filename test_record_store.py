@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+from record_store import RecordStore
+from simulation import RECORD_FIELDS, SILENT, simulation
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("field", RECORD_FIELDS)
+def test_merge_matches_full_sort(schedule, field, reverse):
+    records = simulation(schedule, SILENT)
+    store = RecordStore()
+    rows = []
+    rng = random.Random(0)
+    while len(store) < len(records):
+        first = len(store)
+        store.extend(records[first:first + rng.choice([1, 3, 50])])
+        store.merge(rows, list(range(first, len(store))), field, reverse)
+        assert rows == store.sort(list(range(len(store))), field, reverse)
+
+
+def test_merge_filtered_view(schedule):
+    records = simulation(schedule, SILENT)
+    split = len(records) // 2
+    store = RecordStore(records[:split])
+    rows = store.sort(store.select(actions=("DELAYED",)), "location")
+    store.extend(records[split:])
+    store.merge(rows, store.select(actions=("DELAYED",), first=split), "location")
+    assert rows == store.sort(store.select(actions=("DELAYED",)), "location")
+    assert [store[row] for row in store.select(actions=("DELAYED",))] == [r for r in records if r[0] == "DELAYED"]
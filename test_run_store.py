@@ -0,0 +1,49 @@
+from collections import Counter
+
+import pytest
+
+from run_store import ROUTE_FIELDS, RunStore
+from simulation import SILENT, Policy, simulation
+
+
+@pytest.fixture
+def store(tmp_path):
+    with RunStore(str(tmp_path / "runs.sqlite")) as store:
+        yield store
+
+
+def _expected_routes(runs):
+    trips, delays, cancelled, seen = Counter(), Counter(), Counter(), {}
+    for run, records in enumerate(runs):
+        for action, _, location, _, _, _ in records:
+            seen.setdefault(location, set()).add(run)
+            if action == "DELAYED":
+                delays[location] += 1
+            else:
+                trips[location] += 1
+                cancelled[location] += action == "CANCELLED"
+    return [dict(zip(ROUTE_FIELDS, (location, len(seen[location]), trips[location], delays[location],
+                                    cancelled[location], cancelled[location] / trips[location])))
+            for location in sorted(seen)]
+
+
+def test_route_summary_matches_records(store, schedule):
+    policies = [Policy(), Policy(0.9, 1)]
+    runs = [simulation(schedule, SILENT, policy=policy) for policy in policies]
+    for policy in policies:
+        store.record(schedule, policy)
+    assert store.route_summary() == pytest.approx(_expected_routes(runs))
+    assert store.route_summary(last=1) == pytest.approx(_expected_routes(runs[1:]))
+
+
+def test_runs_and_events_round_trip(store, schedule):
+    records = simulation(schedule, SILENT)
+    run_id = store.record(schedule)
+    assert store.events(run_id) == records
+    assert store.runs()[0]["events"] == len(records)
+    location = records[0][2]
+    assert store.events(run_id, location=location) == [r for r in records if r[2] == location]
+
+
+def test_schedule_stored_once(store, schedule):
+    assert store.add_schedule(schedule) == store.add_schedule(schedule)
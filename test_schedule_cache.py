@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import schedule_cache
+from schedule_cache import cache_path, load_records, load_schedule
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "schedule.txt"
+    path.write_text("1 LHE 0600 10 20\n2 ISB 0700 5 9\n")
+    return str(path)
+
+
+def _never(*args):
+    raise AssertionError("the cache should have been used as is")
+
+
+def test_cache_is_written_and_reused(source, monkeypatch):
+    assert load_records(source) == [(1, "LHE", 360, 10, 20), (2, "ISB", 420, 5, 9)]
+    assert os.path.exists(cache_path(source))
+    # An untouched source is neither re-parsed nor hashed
+    monkeypatch.setattr(schedule_cache, "compile_schedule", _never)
+    monkeypatch.setattr(schedule_cache, "file_digest", _never)
+    assert load_records(source) == [(1, "LHE", 360, 10, 20), (2, "ISB", 420, 5, 9)]
+
+
+def test_cache_rebuilt_when_size_changes(source):
+    load_schedule(source)
+    with open(source, "a") as f:
+        f.write("3 KHI 0800 1 1\n")
+    assert len(load_schedule(source)) == 3
+
+
+def test_touched_source_is_checked_by_hash(source, monkeypatch):
+    load_schedule(source)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(schedule_cache, "compile_schedule", _never)
+    assert len(load_schedule(source)) == 2
+
+
+def test_same_size_edit_caught_by_mtime_or_verify(source):
+    load_schedule(source)
+    stat = os.stat(source)
+    with open(source, "w") as f:
+        f.write("1 LHE 0600 10 20\n2 ISB 0900 5 9\n")
+    # A new mtime sends the load to the content hash
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_records(source)[1][2] == 540
+
+    # An edit that keeps size and mtime is only seen with verify
+    stat = os.stat(source)
+    with open(source, "w") as f:
+        f.write("1 LHE 0600 10 20\n2 ISB 1000 5 9\n")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_records(source)[1][2] == 540
+    assert load_schedule(source, verify=True).records()[1][2] == 600
+
+
+def test_file_digest_without_hashlib_file_digest(source, monkeypatch):
+    import hashlib
+
+    expected = schedule_cache.file_digest(source)
+    monkeypatch.delattr(hashlib, "file_digest", raising=False)
+    assert schedule_cache.file_digest(source) == expected
@@ -0,0 +1,64 @@
+import random
+
+from schedule_cache import load_records
+from schedule_index import ScheduleIndex
+from simulation import SILENT, simulation
+
+
+def _brute_window(index, location, start, end):
+    return sorted(((trip, record) for trip, record in enumerate(index.records)
+                   if trip in index and record[1] == location
+                   and (start is None or record[2] >= start) and (end is None or record[2] <= end)),
+                  key=lambda pair: (pair[1][2], pair[0]))
+
+
+def _check_windows(index, rng):
+    locations = sorted({record[1] for record in index.records})
+    times = [record[2] for record in index.records]
+    for _ in range(5):
+        location = rng.choice(locations)
+        start = rng.choice([None, rng.randint(min(times) - 30, max(times) + 30)])
+        end = rng.choice([None, rng.randint(min(times) - 30, max(times) + 30)])
+        assert index.window(location, start, end) == _brute_window(index, location, start, end)
+
+
+class CheckedIndex(ScheduleIndex):
+    """Compares window() with a scan every few changes simulation() makes."""
+
+    rng = random.Random(0)
+    changes = 0
+
+    def _changed(self):
+        self.changes += 1
+        if self.changes % 37 == 1:
+            _check_windows(self, self.rng)
+
+    def update(self, trip, record):
+        super().update(trip, record)
+        self._changed()
+
+    def remove(self, trip):
+        super().remove(trip)
+        self._changed()
+
+
+def test_window_on_loaded_schedule(schedule):
+    index = ScheduleIndex(load_records(schedule))
+    _check_windows(index, random.Random(1))
+    location = index.records[0][1]
+    assert index.window(location) == _brute_window(index, location, None, None)
+    assert index.window("NOWHERE") == []
+
+
+def test_window_follows_a_run(schedule):
+    index = CheckedIndex()
+    simulation(schedule, SILENT, index=index)
+    assert len(index) == 0
+    assert all(index.window(location) == [] for location in index.by_location)
+
+
+def test_trips_by_bus_number(schedule):
+    records = load_records(schedule)
+    index = ScheduleIndex(records)
+    bus_number = records[0][0]
+    assert index.trips(bus_number) == [trip for trip, record in enumerate(records) if record[0] == bus_number]
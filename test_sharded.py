@@ -0,0 +1,22 @@
+import pytest
+
+from schedule_cache import load_schedule
+from sharded import partition, sharded_simulation
+from simulation import SILENT, simulation
+
+
+@pytest.mark.parametrize("shards", [1, 3])
+def test_matches_heap(schedule, shards, policy):
+    assert sharded_simulation(schedule, shards=shards, policy=policy) == simulation(schedule, SILENT, policy=policy)
+
+
+def test_trip_partition_matches_heap(schedule):
+    assert sharded_simulation(schedule, shards=2, by="trip") == simulation(schedule, SILENT)
+
+
+@pytest.mark.parametrize("shards", [0, -1, -4])
+def test_rejects_fewer_than_one_shard(schedule, shards):
+    with pytest.raises(ValueError):
+        sharded_simulation(schedule, shards=shards)
+    with pytest.raises(ValueError):
+        partition(load_schedule(schedule, []), shards)
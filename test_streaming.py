@@ -0,0 +1,35 @@
+import os
+
+from schedule_cache import load_records
+from simulation import SILENT, simulation
+from streaming import external_sort, is_time_sorted, iter_rows, stream_simulation
+
+
+def test_matches_heap(schedule, policy, tmp_path):
+    spill = tmp_path / "spill"
+    spill.mkdir()
+    actual = []
+    stats = stream_simulation(schedule, actual.append, policy=policy, presorted=False, run_rows=64,
+                              directory=str(spill))
+    expected = simulation(schedule, SILENT, policy=policy)
+    assert actual == expected
+    assert stats["events"] == len(expected)
+    assert stats["rows"] == len(load_records(schedule))
+    assert os.listdir(spill) == []
+
+
+def test_sorted_schedule_is_streamed_directly(schedule, tmp_path):
+    path = tmp_path / "sorted.txt"
+    with open(schedule) as f:
+        lines = [line for line in f if line.strip()]
+    # A stable sort on the HHMM field keeps ties in file order
+    lines.sort(key=lambda line: int(line.split()[2]))
+    path.write_text("".join(lines))
+    assert is_time_sorted(str(path))
+    actual = []
+    stream_simulation(str(path), actual.append)
+    assert actual == simulation(str(path), SILENT)
+
+
+def test_external_sort_orders_rows(schedule):
+    assert list(external_sort(schedule, run_rows=7)) == sorted(iter_rows(schedule))
@@ -0,0 +1,25 @@
+import pytest
+
+from simulation import SILENT, simulation
+from sweep import METRICS, run_one, run_sweep, summarize
+
+
+def _metrics(row):
+    return {name: row[name] for name in METRICS if name != "seconds"}
+
+
+def test_heap_is_the_default_engine(schedule, policy):
+    row = run_one(schedule, policy)
+    expected = summarize(simulation(schedule, SILENT, policy=policy), policy)
+    assert {name: row[name] for name in expected} == expected
+
+
+def test_engines_agree(schedule, policy):
+    pytest.importorskip("numpy")
+    heap = _metrics(run_one(schedule, policy, engine="heap"))
+    assert _metrics(run_one(schedule, policy, engine="analytic")) == pytest.approx(heap)
+
+
+def test_sweep_rows_in_input_order(schedule, policy):
+    rows = run_sweep([schedule], [policy, policy], workers=1)
+    assert [_metrics(row) for row in rows] == [_metrics(run_one(schedule, policy))] * 2